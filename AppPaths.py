@@ -0,0 +1,26 @@
+"""
+应用数据目录模块
+
+集中管理会话、索引、诊断报告等运行时文件的存放位置。
+"""
+
+import os
+from PySide6.QtCore import QStandardPaths
+
+
+def app_data_dir(*parts):
+    """
+    获取应用数据目录（不存在时自动创建）
+
+    Args:
+        *parts (str): 数据目录下的子目录
+
+    Returns:
+        str: 目录的绝对路径
+    """
+    base = QStandardPaths.writableLocation(QStandardPaths.AppDataLocation)
+    if not base:
+        base = os.path.join(os.path.expanduser('~'), '.sql_editor')
+    path = os.path.join(base, *parts)
+    os.makedirs(path, exist_ok=True)
+    return path
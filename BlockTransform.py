@@ -0,0 +1,271 @@
+"""
+块范围编辑模块
+
+缩进、取消缩进、大小写转换、行注释切换、关键字大写等编辑操作共用的引擎：
+一次取出所选行范围的文本，在 Python 中一次性算出新文本，再只把与原文本不同的区间
+作为一次编辑（一个撤销步骤）应用到文档，最后恢复选区。
+"""
+
+import re
+from PySide6.QtGui import QTextCursor
+from TextDiff import compute_minimal_edit
+from SQLHighlighter import SQL_KEYWORDS
+
+
+INDENT_UNIT = '    '
+LINE_COMMENT = '--'
+
+# 关键字大写时跳过字符串、带引号的标识符和注释
+_TOKEN_PATTERN = re.compile(
+    r"'(?:[^']|'')*'|\"[^\"\n]*\"|--[^\n]*|(?s:/\*.*?\*/)|[A-Za-z_][A-Za-z0-9_]*")
+
+
+def selected_line_range(cursor):
+    """
+    获取选区覆盖的行范围
+
+    选区跨多行且结束在某行行首时，不包含该行。
+
+    Args:
+        cursor (QTextCursor): 光标
+
+    Returns:
+        tuple: (第一个块, 最后一个块)
+    """
+    document = cursor.document()
+    end = cursor.selectionEnd()
+    first = document.findBlock(cursor.selectionStart())
+    last = document.findBlock(end)
+    if last.blockNumber() > first.blockNumber() and end == last.position():
+        last = last.previous()
+    return first, last
+
+
+def range_text(document, start, end):
+    """
+    获取文档中 [start, end) 的纯文本，段落分隔符转换为 \\n
+
+    Args:
+        document (QTextDocument): 文档
+        start (int): 起始位置
+        end (int): 结束位置
+
+    Returns:
+        str: 文本
+    """
+    cursor = QTextCursor(document)
+    cursor.setPosition(start)
+    cursor.setPosition(end, QTextCursor.KeepAnchor)
+    return cursor.selectedText().replace('\u2029', '\n')
+
+
+def _replace_text(document, start, old_text, new_text):
+    """
+    把文档中从 start 开始的 old_text 替换为 new_text，只修改不同的部分
+
+    Returns:
+        bool: 文档是否被修改
+    """
+    edit = compute_minimal_edit(old_text, new_text)
+    if edit is None:
+        return False
+    edit_start, edit_end, replacement = edit
+    cursor = QTextCursor(document)
+    cursor.beginEditBlock()
+    cursor.setPosition(start + edit_start)
+    cursor.setPosition(start + edit_end, QTextCursor.KeepAnchor)
+    cursor.insertText(replacement)
+    cursor.endEditBlock()
+    return True
+
+
+def _set_selection(editor, anchor, position):
+    """设置编辑器选区，位置超出文档时截断"""
+    limit = editor.document().characterCount() - 1
+    cursor = editor.textCursor()
+    cursor.setPosition(max(0, min(anchor, limit)))
+    cursor.setPosition(max(0, min(position, limit)), QTextCursor.KeepAnchor)
+    editor.setTextCursor(cursor)
+
+
+def transform_lines(editor, line_transform):
+    """
+    对选区覆盖的每一行应用变换，作为一次可撤销的编辑并保持选区
+
+    选区端点按所在行的长度变化平移，位于行首的端点保持在行首。
+
+    Args:
+        editor (QPlainTextEdit): 编辑器
+        line_transform (callable): 接收行列表、返回等长新行列表的函数
+
+    Returns:
+        bool: 文档是否被修改
+    """
+    document = editor.document()
+    cursor = editor.textCursor()
+    first, last = selected_line_range(cursor)
+    start = first.position()
+    end = last.position() + last.length() - 1
+    old_text = range_text(document, start, end)
+    old_lines = old_text.split('\n')
+    new_lines = line_transform(old_lines)
+    new_text = '\n'.join(new_lines)
+    first_number = first.blockNumber()
+
+    def map_position(pos):
+        if pos > end:
+            return pos + len(new_text) - len(old_text)
+        block = document.findBlock(pos)
+        index = block.blockNumber() - first_number
+        column = pos - block.position()
+        new_line = new_lines[index]
+        if column:
+            column = min(max(0, column + len(new_line) - len(old_lines[index])), len(new_line))
+        if index == len(new_lines) - 1:
+            line_start = start + len(new_text) - len(new_line)
+        else:
+            line_start = start + sum(len(line) + 1 for line in new_lines[:index])
+        return line_start + column
+
+    # 必须在修改文档之前换算选区位置
+    anchor = map_position(cursor.anchor())
+    position = map_position(cursor.position())
+    if not _replace_text(document, start, old_text, new_text):
+        return False
+    _set_selection(editor, anchor, position)
+    return True
+
+
+def transform_selection(editor, text_transform):
+    """
+    对选中的文本应用变换，作为一次可撤销的编辑并保持选区
+
+    Args:
+        editor (QPlainTextEdit): 编辑器
+        text_transform (callable): 接收文本、返回新文本的函数
+
+    Returns:
+        bool: 文档是否被修改
+    """
+    cursor = editor.textCursor()
+    if not cursor.hasSelection():
+        return False
+    start = cursor.selectionStart()
+    old_text = range_text(editor.document(), start, cursor.selectionEnd())
+    new_text = text_transform(old_text)
+    if not _replace_text(editor.document(), start, old_text, new_text):
+        return False
+    new_end = start + len(new_text)
+    if cursor.anchor() <= cursor.position():
+        _set_selection(editor, start, new_end)
+    else:
+        _set_selection(editor, new_end, start)
+    return True
+
+
+def transform_document(editor, text_transform):
+    """
+    对整个文档应用长度不变的文本变换（例如大小写转换），光标和选区保持不变
+
+    Args:
+        editor (QPlainTextEdit): 编辑器
+        text_transform (callable): 接收文本、返回新文本的函数
+
+    Returns:
+        bool: 文档是否被修改
+    """
+    cursor = editor.textCursor()
+    anchor, position = cursor.anchor(), cursor.position()
+    old_text = editor.toPlainText()
+    if not _replace_text(editor.document(), 0, old_text, text_transform(old_text)):
+        return False
+    _set_selection(editor, anchor, position)
+    return True
+
+
+def indent_lines(lines):
+    """
+    每行开头增加一级缩进
+
+    Args:
+        lines (list): 行列表
+
+    Returns:
+        list: 新的行列表
+    """
+    return [INDENT_UNIT + line for line in lines]
+
+
+def unindent_lines(lines):
+    """
+    每行开头减少一级缩进：删除一个Tab或最多4个空格
+
+    Args:
+        lines (list): 行列表
+
+    Returns:
+        list: 新的行列表
+    """
+    result = []
+    for line in lines:
+        if line.startswith('\t'):
+            result.append(line[1:])
+        else:
+            spaces = len(line) - len(line.lstrip(' '))
+            result.append(line[min(spaces, len(INDENT_UNIT)):])
+    return result
+
+
+def toggle_line_comments(lines):
+    """
+    切换行注释
+
+    所有非空行都已注释时去掉注释标记（及其后的一个空格），
+    否则在所有非空行的最小缩进处加上 "-- "。
+
+    Args:
+        lines (list): 行列表
+
+    Returns:
+        list: 新的行列表
+    """
+    content = [line for line in lines if line.strip()]
+    if not content:
+        return lines
+
+    if all(line.lstrip().startswith(LINE_COMMENT) for line in content):
+        result = []
+        for line in lines:
+            index = line.find(LINE_COMMENT)
+            if index == -1 or line[:index].strip():
+                result.append(line)
+                continue
+            rest = line[index + len(LINE_COMMENT):]
+            if rest.startswith(' '):
+                rest = rest[1:]
+            result.append(line[:index] + rest)
+        return result
+
+    column = min(len(line) - len(line.lstrip()) for line in content)
+    marker = LINE_COMMENT + ' '
+    return [line[:column] + marker + line[column:] if line.strip() else line
+            for line in lines]
+
+
+def uppercase_keywords(text):
+    """
+    只把SQL关键字转换为大写，字符串、带引号的标识符和注释保持不变
+
+    Args:
+        text (str): SQL文本
+
+    Returns:
+        str: 转换后的文本（长度不变）
+    """
+    def replace(match):
+        token = match.group()
+        if token[0] in "'\"-/":
+            return token
+        upper = token.upper()
+        return upper if upper in SQL_KEYWORDS else token
+    return _TOKEN_PATTERN.sub(replace, text)
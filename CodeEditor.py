@@ -1,9 +1,25 @@
 from PySide6.QtWidgets import QPlainTextEdit, QWidget
-from PySide6.QtGui import QTextFormat, QPainter, QColor, QTextOption, QPen, QFont, QTextLayout, QKeyEvent, QTextCursor
-from PySide6.QtCore import Qt, QRect, QSize, QPointF
+from collections import OrderedDict
+from PySide6.QtGui import (QTextFormat, QPainter, QColor, QTextOption, QPen, QFont, QKeyEvent,
+                           QKeySequence, QPainterPath, QStaticText, QTransform)
+from PySide6.QtCore import Qt, QRect, QRectF, QSize, QPointF, QEvent, QTimer
+from SQLHighlighter import LONG_LINE_LENGTH
+from UndoMemory import UndoMemoryTracker
+from BlockTransform import (transform_lines, transform_selection, transform_document, indent_lines,
+                            unindent_lines, toggle_line_comments, uppercase_keywords)
+import PerfMonitor
+import time
 
 class PreciseWhitespaceRenderer:
-    """精确的空白字符渲染器，使用 QTextLayout 确保与文本渲染完全一致"""
+    """
+    精确的空白字符渲染器，直接使用编辑器已经排版好的块布局计算位置，确保与文本渲染完全一致
+
+    每个块的标记几何（空格点、tab箭头线段，相对块左上角）按块号缓存，
+    用块的 revision、文本哈希和字体/tab/换行设置校验，超过 MAX_CACHED_BLOCKS 时淘汰最久未用的块。
+    每一帧把所有可见块的标记合并成两条路径，只调用一次 strokePath 和一次 fillPath。
+    """
+
+    MAX_CACHED_BLOCKS = 4096
     
     def __init__(self, editor):
         """
@@ -13,455 +29,254 @@ class PreciseWhitespaceRenderer:
             editor (CodeEditor): 关联的代码编辑器实例
         """
         self.editor = editor
-        self.layout_cache = {}  # 缓存布局对象，提高性能
-        self.cache_version = 0  # 缓存版本号，用于失效检测
+        # 块号 -> (校验键, 空格点路径, tab箭头路径)
+        self.layout_cache = OrderedDict()
+        self.cache_version = 0  # 缓存版本号，字体或tab宽度变化时递增
     
     def clear_cache(self):
         """清除布局缓存"""
         self.layout_cache.clear()
         self.cache_version += 1
-    
-    def draw_block_whitespace_precise(self, painter, block, block_rect):
+
+    def invalidate_blocks(self, first, last=None):
         """
-        使用QTextDocument的原生绘制功能精确绘制空白字符
-        
+        只清除指定范围内文本块的缓存
+
         Args:
-            painter (QPainter): 绘制器
-            block (QTextBlock): 文本块
-            block_rect (QRectF): 块的矩形区域
+            first (int): 第一个失效的块号
+            last (int): 最后一个失效的块号，None 表示一直到文档末尾
         """
-        text = block.text()
-        if not text:
-            return
-        
-        # 使用最简单直接的方法：创建临时文档并绘制
-        try:
-            self._draw_whitespace_with_temp_document(painter, text, block_rect)
-        except Exception:
-            # 如果失败，使用fallback方案
-            self._draw_whitespace_fallback(painter, text, block_rect)
-    
-    def _draw_whitespace_with_temp_document(self, painter, text, block_rect):
+        for number in [number for number in self.layout_cache
+                       if number >= first and (last is None or number <= last)]:
+            del self.layout_cache[number]
+
+    def draw_visible_whitespace(self, painter, rect):
         """
-        使用临时QTextDocument获取绝对精确的字符位置
-        
+        绘制视口中与 rect 相交的所有块的空白字符
+
         Args:
-            painter (QPainter): 绘制器
-            text (str): 文本内容
-            block_rect (QRectF): 块矩形区域
+            painter (QPainter): 视口上的绘制器
+            rect (QRect): 需要重绘的区域
         """
-        from PySide6.QtGui import QTextDocument
-        
-        # 创建临时文档，使用与编辑器完全相同的设置
-        temp_doc = QTextDocument()
-        temp_doc.setDefaultFont(self.editor.font())
-        temp_doc.setPlainText(text)
-        
-        # 设置文档的默认文本选项
-        option = QTextOption()
-        option.setTabStopDistance(self.editor.tabStopDistance())
-        temp_doc.setDefaultTextOption(option)
-        
-        # 获取文档的第一个块
-        temp_block = temp_doc.firstBlock()
-        if not temp_block.isValid():
-            return
-        
-        # 创建临时布局
-        layout = temp_block.layout()
-        if layout.lineCount() == 0:
-            # 如果没有布局，强制创建
-            layout.beginLayout()
-            line = layout.createLine()
-            line.setLineWidth(10000)  # 设置足够大的宽度
-            layout.endLayout()
-        
-        if layout.lineCount() == 0:
-            return
-            
-        line = layout.lineAt(0)
-        if not line.isValid():
-            return
-        
-        fm = self.editor.fontMetrics()
-        baseline_y = block_rect.top() + fm.ascent()
-        
-        # 设置画刷和画笔
-        painter.setBrush(self.editor.whitespace_color)
-        
-        # 检查是否有空白字符需要绘制
-        has_whitespace = any(c in [' ', '\t'] for c in text)
-        drawn_any = False
-        
-        # 现在获取每个字符的精确位置
-        for i, char in enumerate(text):
-            if char in [' ', '\t']:
-                try:
-                    # 使用QTextLine的cursorToX方法获取精确位置
-                    char_x = line.cursorToX(i)
-                    next_char_x = line.cursorToX(i + 1)
-                    
-                    if char_x < 0 or next_char_x < 0 or char_x >= next_char_x:
-                        continue
-                    
-                    # 转换为实际屏幕坐标
-                    screen_x = block_rect.left() + char_x
-                    screen_next_x = block_rect.left() + next_char_x
-                    
-                    if char == ' ':
-                        # 绘制空格点
-                        center_x = screen_x + (screen_next_x - screen_x) / 2
-                        center_y = baseline_y - fm.height() / 4
-                        painter.drawEllipse(int(center_x - 1), int(center_y - 1), 2, 2)
-                        drawn_any = True
-                    
-                    elif char == '\t':
-                        # 绘制 tab 箭头，两边留出3px空隙
-                        arrow_y = baseline_y - fm.height() / 4
-                        arrow_start_x = screen_x + 3
-                        arrow_end_x = screen_next_x - 3
-                        
-                        # 确保箭头有最小长度
-                        if arrow_end_x <= arrow_start_x:
-                            arrow_end_x = arrow_start_x + 8
-                        
-                        # 绘制箭头主体
-                        painter.drawLine(int(arrow_start_x), int(arrow_y), 
-                                       int(arrow_end_x), int(arrow_y))
-                        # 绘制箭头头部
-                        painter.drawLine(int(arrow_end_x), int(arrow_y), 
-                                       int(arrow_end_x - 4), int(arrow_y - 2))
-                        painter.drawLine(int(arrow_end_x), int(arrow_y), 
-                                       int(arrow_end_x - 4), int(arrow_y + 2))
-                        drawn_any = True
-                        
-                except Exception:
-                    continue
-        
-        # 恢复画刷
-        painter.setBrush(Qt.NoBrush)
-        
-        # 如果有空白字符但没有绘制任何内容，抛出异常使用fallback
-        if has_whitespace and not drawn_any:
-            raise Exception("Failed to draw any whitespace with temp document")
-    
-    def _draw_whitespace_using_painter_metrics(self, painter, text, block_rect):
+        editor = self.editor
+        settings = (self.cache_version, editor.font().key(), editor.tabStopDistance())
+        dots = QPainterPath()
+        arrows = QPainterPath()
+
+        block = editor.firstVisibleBlock()
+        viewport_offset = editor.contentOffset()
+        while block.isValid():
+            geometry = editor.blockBoundingGeometry(block).translated(viewport_offset)
+            if geometry.top() > rect.bottom():
+                break
+            if block.isVisible() and geometry.bottom() >= rect.top():
+                markers = self._block_markers(block, settings)
+                if markers is not None:
+                    top_left = geometry.topLeft()
+                    block_dots, block_arrows = markers
+                    if not block_dots.isEmpty():
+                        dots.addPath(block_dots.translated(top_left))
+                    if not block_arrows.isEmpty():
+                        arrows.addPath(block_arrows.translated(top_left))
+            block = block.next()
+
+        if not arrows.isEmpty():
+            painter.strokePath(arrows, QPen(editor.whitespace_color, 1))
+        if not dots.isEmpty():
+            painter.fillPath(dots, editor.whitespace_color)
+
+    def _block_markers(self, block, settings):
         """
-        使用QPainter的文本度量方法获取精确位置
-        
+        获取块的空白字符标记，缓存未命中时重新计算
+
         Args:
-            painter (QPainter): 绘制器
-            text (str): 文本内容
-            block_rect (QRectF): 块矩形区域
+            block (QTextBlock): 文本块
+            settings (tuple): 字体和tab设置
+
+        Returns:
+            tuple: (空格点路径, tab箭头路径)，块中没有空白字符或尚未排版时返回None
         """
-        # 设置painter的字体与编辑器一致
-        painter.setFont(self.editor.font())
-        fm = painter.fontMetrics()
-        baseline_y = block_rect.top() + fm.ascent()
-        
-        # 设置画刷和画笔
-        painter.setBrush(self.editor.whitespace_color)
-        
-        # 创建文本选项，设置tab停止距离
-        tab_stops = int(self.editor.tabStopDistance() / fm.horizontalAdvance(' '))
-        
-        drawn_any = False
-        for i, char in enumerate(text):
-            if char in [' ', '\t']:
-                # 获取到当前字符位置的文本
-                text_to_char = text[:i]
-                text_to_next = text[:i+1]
-                
-                # 使用boundingRect获取精确宽度，设置tab展开
-                rect_to_char = fm.boundingRect(0, 0, 10000, fm.height(), 
-                                             Qt.TextExpandTabs, text_to_char, tab_stops)
-                rect_to_next = fm.boundingRect(0, 0, 10000, fm.height(), 
-                                             Qt.TextExpandTabs, text_to_next, tab_stops)
-                
-                char_x = block_rect.left() + rect_to_char.width()
-                next_char_x = block_rect.left() + rect_to_next.width()
-                
-                # 验证位置是否有效
-                if char_x >= next_char_x or char_x < block_rect.left():
-                    continue
-                
-                if char == ' ':
-                    # 绘制空格点
-                    center_x = char_x + (next_char_x - char_x) / 2
-                    center_y = baseline_y - fm.height() / 4
-                    painter.drawEllipse(int(center_x - 1), int(center_y - 1), 2, 2)
-                    drawn_any = True
-                
-                elif char == '\t':
-                    # 绘制 tab 箭头，两边留出3px空隙
-                    arrow_y = baseline_y - fm.height() / 4
-                    arrow_start_x = char_x + 3
-                    arrow_end_x = next_char_x - 3
-                    
-                    # 确保箭头有最小长度
-                    if arrow_end_x <= arrow_start_x:
-                        arrow_end_x = arrow_start_x + 8
-                    
-                    # 绘制箭头主体
-                    painter.drawLine(int(arrow_start_x), int(arrow_y), 
-                                   int(arrow_end_x), int(arrow_y))
-                    # 绘制箭头头部
-                    painter.drawLine(int(arrow_end_x), int(arrow_y), 
-                                   int(arrow_end_x - 4), int(arrow_y - 2))
-                    painter.drawLine(int(arrow_end_x), int(arrow_y), 
-                                   int(arrow_end_x - 4), int(arrow_y + 2))
-                    drawn_any = True
-        
-        # 恢复画刷
-        painter.setBrush(Qt.NoBrush)
-        
-        # 如果没有成功绘制任何字符，抛出异常使用fallback
-        if not drawn_any and any(c in [' ', '\t'] for c in text):
-            raise Exception("Failed to draw whitespace using painter metrics")
-    
-    def _draw_whitespace_using_cursor_positions(self, painter, block, text, block_rect):
+        # 超长行逐字符计算的开销太大，不绘制空白字符
+        if block.length() > LONG_LINE_LENGTH:
+            return None
+        text = block.text()
+        if ' ' not in text and '\t' not in text:
+            return None
+        layout = block.layout()
+        line_count = layout.lineCount()
+        if line_count == 0:
+            return None
+
+        # 没有自动换行的块与视口宽度无关，调整窗口大小不会让它失效
+        if line_count == 1:
+            wrap = None
+        else:
+            wrap = tuple(layout.lineAt(i).textStart() for i in range(line_count))
+        key = (block.revision(), hash(text), wrap, settings)
+
+        number = block.blockNumber()
+        entry = self.layout_cache.get(number)
+        if entry is not None and entry[0] == key:
+            self.layout_cache.move_to_end(number)
+            return entry[1], entry[2]
+
+        markers = self._compute_markers(text, layout)
+        self.layout_cache[number] = (key,) + markers
+        self.layout_cache.move_to_end(number)
+        if len(self.layout_cache) > self.MAX_CACHED_BLOCKS:
+            self.layout_cache.popitem(last=False)
+        return markers
+
+    def _compute_markers(self, text, layout):
         """
-        使用编辑器的光标位置获取精确的字符位置
-        
+        根据块布局计算空白字符标记的位置（相对块左上角）
+
         Args:
-            painter (QPainter): 绘制器
-            block (QTextBlock): 文本块
-            text (str): 文本内容
-            block_rect (QRectF): 块矩形区域
+            text (str): 块文本
+            layout (QTextLayout): 编辑器为该块排好的布局
+
+        Returns:
+            tuple: (空格点路径, tab箭头路径)，均为 QPainterPath
         """
         fm = self.editor.fontMetrics()
-        baseline_y = block_rect.top() + fm.ascent()
-        
-        # 设置画刷和画笔
-        painter.setBrush(self.editor.whitespace_color)
-        
-        # 获取块的起始位置
-        block_start = block.position()
-        drawn_any = False
-        
+        mark_offset = fm.height() / 4
+        space_width = fm.horizontalAdvance(' ')
+        dots = QPainterPath()
+        arrows = QPainterPath()
+
         for i, char in enumerate(text):
-            if char in [' ', '\t']:
-                # 创建光标到当前字符位置
-                cursor_at_char = QTextCursor(self.editor.document())
-                cursor_at_char.setPosition(block_start + i)
-                
-                # 创建光标到下一个字符位置
-                cursor_at_next = QTextCursor(self.editor.document())
-                cursor_at_next.setPosition(block_start + i + 1)
-                
-                # 获取光标矩形
-                char_rect = self.editor.cursorRect(cursor_at_char)
-                next_rect = self.editor.cursorRect(cursor_at_next)
-                
-                # 验证矩形是否有效
-                if (char_rect.isNull() or next_rect.isNull() or 
-                    char_rect.left() < 0 or next_rect.left() < 0 or
-                    char_rect.left() >= next_rect.left()):
-                    # 位置无效，跳过这个字符
-                    continue
-                
-                # 计算字符的实际屏幕位置
-                char_x = char_rect.left()
-                next_char_x = next_rect.left()
-                
-                if char == ' ':
-                    # 绘制空格点
-                    center_x = char_x + (next_char_x - char_x) / 2
-                    center_y = baseline_y - fm.height() / 4
-                    painter.drawEllipse(int(center_x - 1), int(center_y - 1), 2, 2)
-                    drawn_any = True
-                
-                elif char == '\t':
-                    # 绘制 tab 箭头，两边留出3px空隙
-                    arrow_y = baseline_y - fm.height() / 4
-                    arrow_start_x = char_x + 3
-                    arrow_end_x = next_char_x - 3
-                    
-                    # 确保箭头有最小长度
-                    if arrow_end_x <= arrow_start_x:
-                        arrow_end_x = arrow_start_x + 8
-                    
-                    # 绘制箭头主体
-                    painter.drawLine(int(arrow_start_x), int(arrow_y), 
-                                   int(arrow_end_x), int(arrow_y))
-                    # 绘制箭头头部
-                    painter.drawLine(int(arrow_end_x), int(arrow_y), 
-                                   int(arrow_end_x - 4), int(arrow_y - 2))
-                    painter.drawLine(int(arrow_end_x), int(arrow_y), 
-                                   int(arrow_end_x - 4), int(arrow_y + 2))
-                    drawn_any = True
-        
-        # 恢复画刷
-        painter.setBrush(Qt.NoBrush)
-        
-        # 如果没有成功绘制任何字符，抛出异常使用fallback
-        if not drawn_any and any(c in [' ', '\t'] for c in text):
-            raise Exception("Failed to draw whitespace using cursor positions")
-    
-    def _draw_whitespace_fallback(self, painter, text, block_rect):
+            if char != ' ' and char != '\t':
+                continue
+            line = layout.lineForTextPosition(i)
+            if not line.isValid():
+                continue
+            x = _cursor_x(line, i)
+            next_x = _cursor_x(line, i + 1)
+            if next_x <= x:
+                # 自动换行处的空白字符，下一个位置在下一行
+                next_x = x + space_width
+            y = line.y() + line.ascent() - mark_offset
+
+            if char == ' ':
+                # 空格画成2px的实心点
+                dots.addRect((x + next_x) / 2 - 1, y - 1, 2, 2)
+            else:
+                # 绘制 tab 箭头，两边留出3px空隙，确保箭头有最小长度
+                start_x = x + 3
+                end_x = max(next_x - 3, start_x + 8)
+                arrows.moveTo(start_x, y)
+                arrows.lineTo(end_x, y)
+                arrows.moveTo(end_x - 4, y - 2)
+                arrows.lineTo(end_x, y)
+                arrows.lineTo(end_x - 4, y + 2)
+        return dots, arrows
+
+
+def _cursor_x(line, position):
+    """
+    QTextLine.cursorToX 的返回值，PySide6 中该方法返回 (x, 光标位置) 元组
+
+    Args:
+        line (QTextLine): 文本行
+        position (int): 文本位置
+
+    Returns:
+        float: x 坐标
+    """
+    result = line.cursorToX(position)
+    return result[0] if isinstance(result, tuple) else result
+
+
+class GutterLane:
+    """
+    行号区域中的附加标记列（例如修改标记）
+
+    每帧只调用一次 paint，参数是行号区域本帧已经算好的可见行几何信息，
+    标记列不需要再次遍历文本块或计算块的位置。
+    """
+
+    # 标记列宽度（像素）
+    width = 4
+
+    def paint(self, painter, x, rows):
         """
-        回退方案：使用精确的字符测量绘制空白字符
-        
+        绘制标记列，子类重写；默认不绘制任何内容，只占用宽度
+
         Args:
-            painter (QPainter): 绘制器
-            text (str): 文本内容
-            block_rect (QRectF): 块矩形区域
+            painter (QPainter): 行号区域上的绘制器
+            x (int): 标记列左边的 x 坐标
+            rows (list): 可见行 [(block, top, height), ...]
         """
-        fm = self.editor.fontMetrics()
-        space_width = fm.horizontalAdvance(' ')
-        tab_width = self.editor.tabStopDistance()
-        line_height = fm.height()
-        
-        # 计算基线位置
-        baseline_y = block_rect.top() + fm.ascent()
-        
-        # 使用fontMetrics精确测量文本到每个位置的宽度
-        for i, char in enumerate(text):
-            if char in [' ', '\t']:
-                # 获取到当前字符位置的精确宽度
-                text_to_char = text[:i]
-                
-                # 使用fontMetrics测量文本宽度，这会正确处理tab
-                char_x = block_rect.left()
-                if text_to_char:
-                    # 创建临时的文本选项来处理tab
-                    option = QTextOption()
-                    option.setTabStopDistance(tab_width)
-                    
-                    # 使用boundingRect来获取精确的文本宽度
-                    temp_rect = fm.boundingRect(QRect(0, 0, 10000, line_height), 
-                                              Qt.TextExpandTabs, text_to_char, 
-                                              int(tab_width / space_width))
-                    char_x = block_rect.left() + temp_rect.width()
-                
-                # 获取下一个字符的位置
-                text_to_next = text[:i+1]
-                next_char_x = block_rect.left()
-                if text_to_next:
-                    temp_rect = fm.boundingRect(QRect(0, 0, 10000, line_height), 
-                                              Qt.TextExpandTabs, text_to_next, 
-                                              int(tab_width / space_width))
-                    next_char_x = block_rect.left() + temp_rect.width()
-                else:
-                    next_char_x = char_x + (tab_width if char == '\t' else space_width)
-                
-                if char == ' ':
-                    # 绘制空格实心点
-                    center_x = char_x + (next_char_x - char_x) / 2
-                    center_y = baseline_y - line_height / 4
-                    painter.setBrush(self.editor.whitespace_color)
-                    painter.drawEllipse(int(center_x - 1), int(center_y - 1), 2, 2)
-                    painter.setBrush(Qt.NoBrush)
-                
-                elif char == '\t':
-                    # 绘制Tab箭头，两边增加3px空隙
-                    arrow_y = baseline_y - line_height / 4
-                    arrow_start_x = char_x + 3
-                    arrow_end_x = next_char_x - 3
-                    
-                    # 确保箭头有最小长度
-                    if arrow_end_x <= arrow_start_x:
-                        arrow_end_x = arrow_start_x + 8
-                    
-                    # 绘制箭头
-                    painter.drawLine(int(arrow_start_x), int(arrow_y), int(arrow_end_x), int(arrow_y))
-                    painter.drawLine(int(arrow_end_x), int(arrow_y), int(arrow_end_x - 4), int(arrow_y - 2))
-                    painter.drawLine(int(arrow_end_x), int(arrow_y), int(arrow_end_x - 4), int(arrow_y + 2))
-    
-    def _get_or_create_layout(self, block):
+
+
+class ChangeMarkerLane(GutterLane):
+    """
+    修改标记列，标出自上次保存（或打开）以来修改过的行
+
+    文档未修改时记录当前的 document.revision()，之后 revision 更大的块就是修改过的块；
+    撤销回保存时的状态会发出 modificationChanged(False)，标记随之清除。
+    """
+
+    width = 3
+    COLOR = QColor("#6A9955")
+
+    def __init__(self, editor):
         """
-        获取或创建文本布局对象
-        
+        初始化修改标记列
+
         Args:
-            block (QTextBlock): 文本块
-            
-        Returns:
-            QTextLayout: 文本布局对象
+            editor (CodeEditor): 关联的代码编辑器实例
         """
-        block_number = block.blockNumber()
-        cache_key = (block_number, self.cache_version)
-        
-        if cache_key not in self.layout_cache:
-            self.layout_cache[cache_key] = QTextLayout()
-            
-        return self.layout_cache[cache_key]
-    
-    def _draw_whitespace_at_precise_positions(self, painter, text, layout, block_rect):
+        self.document = editor.document()
+        self.saved_revision = self.document.revision()
+        self.document.modificationChanged.connect(self._on_modification_changed)
+
+    def _on_modification_changed(self, modified):
         """
-        在精确位置绘制空白字符
-        
+        文档回到未修改状态（保存、撤销到保存点）时更新基准修订号
+
         Args:
-            painter (QPainter): 绘制器
-            text (str): 文本内容
-            layout (QTextLayout): 文本布局
-            block_rect (QRectF): 块矩形区域
+            modified (bool): 是否已修改
         """
-        if layout.lineCount() == 0:
-            raise Exception("Layout has no lines")
-            
-        line = layout.lineAt(0)
-        if not line.isValid():
-            raise Exception("Layout line is invalid")
-            
-        fm = self.editor.fontMetrics()
-        baseline_y = block_rect.top() + fm.ascent()
-        
-        # 设置画刷和画笔
-        painter.setBrush(self.editor.whitespace_color)
-        
-        # 验证能否获取位置信息
-        drawn_any = False
-        for i, char in enumerate(text):
-            if char in [' ', '\t']:
-                # 获取字符的精确 x 坐标
-                char_x = line.cursorToX(i)
-                next_char_x = line.cursorToX(i + 1)
-                
-                # 检查返回值是否有效
-                if char_x < 0 or next_char_x < 0 or char_x == next_char_x:
-                    continue
-                
-                # 转换为视口坐标
-                screen_x = block_rect.left() + char_x
-                screen_next_x = block_rect.left() + next_char_x
-                
-                if char == ' ':
-                    # 绘制空格点
-                    center_x = screen_x + (screen_next_x - screen_x) / 2
-                    center_y = baseline_y - fm.height() / 4
-                    painter.drawEllipse(int(center_x - 1), int(center_y - 1), 2, 2)
-                    drawn_any = True
-                
-                elif char == '\t':
-                    # 绘制 tab 箭头，两边留出3px空隙
-                    arrow_y = baseline_y - fm.height() / 4
-                    arrow_start_x = screen_x + 3
-                    arrow_end_x = screen_next_x - 3
-                    
-                    # 确保箭头有最小长度
-                    if arrow_end_x <= arrow_start_x:
-                        arrow_end_x = arrow_start_x + 8
-                    
-                    # 绘制箭头主体
-                    painter.drawLine(int(arrow_start_x), int(arrow_y), 
-                                   int(arrow_end_x), int(arrow_y))
-                    # 绘制箭头头部
-                    painter.drawLine(int(arrow_end_x), int(arrow_y), 
-                                   int(arrow_end_x - 4), int(arrow_y - 2))
-                    painter.drawLine(int(arrow_end_x), int(arrow_y), 
-                                   int(arrow_end_x - 4), int(arrow_y + 2))
-                    drawn_any = True
-        
-        # 恢复画刷
-        painter.setBrush(Qt.NoBrush)
-        
-        # 如果没有成功绘制任何空白字符，抛出异常以使用fallback
-        if not drawn_any and any(c in [' ', '\t'] for c in text):
-            raise Exception("Failed to draw any whitespace characters")
+        if not modified:
+            self.saved_revision = self.document.revision()
+
+    def paint(self, painter, x, rows):
+        """绘制修改过的行的标记，相邻的行合并为一个矩形"""
+        if not self.document.isModified():
+            # setPlainText 等操作不会发出 modificationChanged，在这里同步基准修订号
+            self.saved_revision = self.document.revision()
+            return
+        saved_revision = self.saved_revision
+        run_top = None
+        run_bottom = 0
+        for block, top, height in rows:
+            if block.revision() > saved_revision:
+                if run_top is None:
+                    run_top = top
+                run_bottom = top + height
+            elif run_top is not None:
+                painter.fillRect(QRectF(x, run_top, self.width, run_bottom - run_top), self.COLOR)
+                run_top = None
+        if run_top is not None:
+            painter.fillRect(QRectF(x, run_top, self.width, run_bottom - run_top), self.COLOR)
 
 
 class LineNumberArea(QWidget):
-    """行号区域小部件，用于显示代码编辑器的行号"""
+    """
+    行号区域小部件，用于显示代码编辑器的行号
+
+    行号使用预先排版好的 QStaticText 绘制并缓存；每帧只遍历一次可见块计算几何信息，
+    行号和所有附加标记列共用这份结果。
+    """
+
+    BACKGROUND_COLOR = QColor("#252526")
+    NUMBER_COLOR = QColor("#858585")
+    # 行号右侧留白和标记列与行号之间的间距
+    RIGHT_PADDING = 5
+    LANE_SPACING = 2
+    MAX_CACHED_NUMBERS = 1024
+
     def __init__(self, editor):
         """
         初始化行号区域
@@ -471,11 +286,82 @@ class LineNumberArea(QWidget):
         """
         super().__init__(editor)
         self.editor = editor
+        self.lanes = []
+        # 行号 -> (QStaticText, 宽度)，字体变化时清空
+        self._number_cache = OrderedDict()
+
+    def add_lane(self, lane):
+        """
+        添加标记列，标记列显示在行号左侧
+
+        Args:
+            lane (GutterLane): 标记列
+        """
+        self.lanes.append(lane)
+        self.editor.update_line_number_area_width()
+        self.update()
+
+    def lanes_width(self):
+        """所有标记列占用的宽度"""
+        return sum(lane.width + self.LANE_SPACING for lane in self.lanes)
+
+    def clear_cache(self):
+        """清除行号文本缓存（字体变化时调用）"""
+        self._number_cache.clear()
 
     def sizeHint(self):
         """返回推荐的尺寸"""
         return QSize(self.editor.line_number_area_width(), 0)
 
+    def visible_rows(self, rect):
+        """
+        计算与 rect 相交的可见行
+
+        Args:
+            rect (QRect): 需要重绘的区域
+
+        Returns:
+            list: [(block, top, height), ...]
+        """
+        editor = self.editor
+        rows = []
+        block = editor.firstVisibleBlock()
+        if not block.isValid():
+            return rows
+        top = editor.blockBoundingGeometry(block).translated(editor.contentOffset()).top()
+        rect_top = rect.top()
+        rect_bottom = rect.bottom()
+        while block.isValid() and top <= rect_bottom:
+            height = editor.blockBoundingRect(block).height()
+            if block.isVisible() and top + height >= rect_top:
+                rows.append((block, top, height))
+            top += height
+            block = block.next()
+        return rows
+
+    def _static_number(self, number):
+        """
+        获取行号对应的 QStaticText，缓存未命中时创建并排版
+
+        Args:
+            number (int): 行号
+
+        Returns:
+            tuple: (QStaticText, 文本宽度)
+        """
+        entry = self._number_cache.get(number)
+        if entry is not None:
+            self._number_cache.move_to_end(number)
+            return entry
+        static_text = QStaticText(str(number))
+        static_text.setTextFormat(Qt.PlainText)
+        static_text.prepare(QTransform(), self.editor.font())
+        entry = (static_text, static_text.size().width())
+        self._number_cache[number] = entry
+        if len(self._number_cache) > self.MAX_CACHED_NUMBERS:
+            self._number_cache.popitem(last=False)
+        return entry
+
     def paintEvent(self, event):
         """
         绘制事件处理
@@ -483,7 +369,36 @@ class LineNumberArea(QWidget):
         Args:
             event (QPaintEvent): 绘制事件
         """
-        self.editor.line_number_area_paint_event(event)
+        if not PerfMonitor.enabled:
+            self._paint(event)
+            return
+        started = time.perf_counter()
+        self._paint(event)
+        PerfMonitor.record("LineNumberArea.paintEvent", started)
+
+    def _paint(self, event):
+        """绘制行号区域的背景、各列和行号"""
+        rect = event.rect()
+        painter = QPainter(self)
+        try:
+            painter.fillRect(rect, self.BACKGROUND_COLOR)
+            rows = self.visible_rows(rect)
+            if not rows:
+                return
+
+            x = 0
+            for lane in self.lanes:
+                lane.paint(painter, x, rows)
+                x += lane.width + self.LANE_SPACING
+
+            painter.setFont(self.editor.font())
+            painter.setPen(self.NUMBER_COLOR)
+            right = self.width() - self.RIGHT_PADDING
+            for block, top, _ in rows:
+                static_text, text_width = self._static_number(block.blockNumber() + 1)
+                painter.drawStaticText(QPointF(right - text_width, top), static_text)
+        finally:
+            painter.end()
 
 
 class CodeEditor(QPlainTextEdit):
@@ -491,6 +406,12 @@ class CodeEditor(QPlainTextEdit):
     代码编辑器类，继承自 QPlainTextEdit，并增加了行号显示功能
     使用精确的 QTextLayout 方案解决 tab 对齐问题
     """
+
+    # 空白字符显示方式：native 由 Qt 排版时直接绘制（QTextOption.ShowTabsAndSpaces），
+    # 没有逐字符的 Python 开销，符号颜色跟随文本；overlay 在文本上叠加绘制自定义符号和颜色
+    WHITESPACE_MODE_NATIVE = 'native'
+    WHITESPACE_MODE_OVERLAY = 'overlay'
+
     def __init__(self, parent=None):
         """
         初始化代码编辑器
@@ -500,9 +421,18 @@ class CodeEditor(QPlainTextEdit):
         """
         super().__init__(parent)
         self.line_number_area = LineNumberArea(self)
+        self._line_number_width = 0
         
         # 空白字符显示状态 - 默认显示
         self.show_whitespace = True
+        self.whitespace_mode = self.WHITESPACE_MODE_NATIVE
+        
+        # 长行模式：文档包含超长行时启用，见 set_long_line_mode
+        self.long_line_mode = False
+        self._long_line_timer = QTimer(self)
+        self._long_line_timer.setSingleShot(True)
+        self._long_line_timer.setInterval(50)
+        self._long_line_timer.timeout.connect(self._update_long_line_segments)
         
         # 空白字符颜色设置
         self.whitespace_color = QColor("#6A737D")  # 深灰色
@@ -520,18 +450,73 @@ class CodeEditor(QPlainTextEdit):
         # 设置Tab宽度为4个空格
         self.setTabStopDistance(self.fontMetrics().horizontalAdvance(' ') * 4)
         
+        # 待失效的块范围 [first, last]，last 为 None 表示到文档末尾；在下一次绘制前统一处理
+        self._dirty_blocks = None
+        self._last_block_count = self.blockCount()
+        
         # 连接信号和槽
         self.blockCountChanged.connect(self.update_line_number_area_width)
         self.updateRequest.connect(self.update_line_number_area)
-        self.textChanged.connect(self._on_text_changed)
+        self.document().contentsChange.connect(self._on_contents_change)
+        
+        # 行号左侧的修改标记列，保存后需要重绘以清除标记
+        self.change_marker_lane = ChangeMarkerLane(self)
+        self.line_number_area.add_lane(self.change_marker_lane)
+        self.document().modificationChanged.connect(self.line_number_area.update)
+        
+        # 撤销内存估算，预算由主窗口统一设置
+        self.undo_tracker = UndoMemoryTracker(self.document(), parent=self)
+        
+        # 查找结果高亮：匹配位置索引（SearchIndex.MatchIndex），只绘制视口内的匹配项
+        self.search_matches = None
+        self.search_highlight_color = QColor("#FFFF00")  # 黄色背景
+        # 文档的查找索引（TextIndex.TextIndex），由查找替换对话框在查找大文档时创建，随文档一起保留
+        self.text_index = None
+
+        # 性能监视：尚未绘制的第一次按键的时间
+        self._key_pressed_at = None
         
         # 初始化时更新行号区域宽度
         self.update_line_number_area_width()
+        self._apply_whitespace_option()
         
-    def _on_text_changed(self):
-        """文本变化时的处理"""
-        # 清除布局缓存以确保重新计算
-        self.precise_renderer.clear_cache()
+    def _on_contents_change(self, position, chars_removed, chars_added):
+        """
+        文本变化时只记录受影响的块范围，连续的多次变化合并后在下一次绘制前统一处理
+
+        Args:
+            position (int): 变化开始的位置
+            chars_removed (int): 删除的字符数
+            chars_added (int): 插入的字符数
+        """
+        document = self.document()
+        first = document.findBlock(position).blockNumber()
+        block_count = document.blockCount()
+        if block_count != self._last_block_count:
+            # 行数变化后其后的块号都发生了偏移
+            last = None
+            self._last_block_count = block_count
+        else:
+            last = document.findBlock(position + chars_added).blockNumber()
+            if last < 0:
+                last = block_count - 1
+
+        if self._dirty_blocks is None:
+            self._dirty_blocks = (first, last)
+        else:
+            dirty_first, dirty_last = self._dirty_blocks
+            if dirty_last is None or last is None:
+                merged_last = None
+            else:
+                merged_last = max(dirty_last, last)
+            self._dirty_blocks = (min(dirty_first, first), merged_last)
+
+    def _flush_dirty_blocks(self):
+        """让记录的块范围对应的缓存失效"""
+        if self._dirty_blocks is not None:
+            first, last = self._dirty_blocks
+            self._dirty_blocks = None
+            self.precise_renderer.invalidate_blocks(first, last)
         
     def set_show_whitespace(self, show):
         """
@@ -541,9 +526,210 @@ class CodeEditor(QPlainTextEdit):
             show (bool): True显示空白字符，False隐藏
         """
         self.show_whitespace = show
+        self._apply_whitespace_option()
         # 刷新显示
         self.viewport().update()
     
+    def set_whitespace_mode(self, mode):
+        """
+        设置空白字符的显示方式
+        
+        Args:
+            mode (str): WHITESPACE_MODE_NATIVE 或 WHITESPACE_MODE_OVERLAY
+        """
+        if mode == self.whitespace_mode:
+            return
+        self.whitespace_mode = mode
+        self._apply_whitespace_option()
+        self.viewport().update()
+    
+    def set_long_line_mode(self, enabled):
+        """
+        启用或关闭长行模式
+
+        原生空白字符显示会让超长行的排版慢一个数量级，长行模式下改为叠加绘制（跳过超长行）；
+        超长行只高亮可见的部分，滚动后再更新高亮区间。Qt 总是对整个块排版，
+        因此长行模式保持自动换行，每次只需要绘制视口内的几行。
+
+        Args:
+            enabled (bool): 是否启用
+        """
+        if enabled == self.long_line_mode:
+            return
+        self.long_line_mode = enabled
+        if enabled:
+            self.setLineWrapMode(QPlainTextEdit.WidgetWidth)
+            self.updateRequest.connect(self._schedule_long_line_update)
+            self._schedule_long_line_update()
+        else:
+            self.updateRequest.disconnect(self._schedule_long_line_update)
+            self._long_line_timer.stop()
+        self._apply_whitespace_option()
+        self.viewport().update()
+    
+    def set_search_matches(self, matches):
+        """
+        设置需要高亮的查找结果
+
+        高亮在绘制文本之前直接画在视口上，不修改文档格式，也不创建 ExtraSelection；
+        每次绘制只二分查找视口内各块范围内的匹配项，耗时与匹配总数无关。
+
+        Args:
+            matches (MatchIndex): 匹配位置索引
+        """
+        self.search_matches = matches
+        self.viewport().update()
+    
+    def clear_search_matches(self):
+        """清除查找结果高亮"""
+        if self.search_matches is not None:
+            self.search_matches = None
+            self.viewport().update()
+    
+    def _draw_search_highlights(self, event):
+        """
+        绘制视口内匹配项的背景
+
+        Args:
+            event (QPaintEvent): 绘制事件
+        """
+        matches = self.search_matches
+        painter = QPainter(self.viewport())
+        color = self.search_highlight_color
+        rect = event.rect()
+        viewport_height = self.viewport().height()
+        offset = self.contentOffset()
+        block = self.firstVisibleBlock()
+        while block.isValid():
+            geometry = self.blockBoundingGeometry(block).translated(offset)
+            if geometry.top() > rect.bottom():
+                break
+            if block.isVisible() and geometry.bottom() >= rect.top():
+                block_start = block.position()
+                text_end = block.length() - 1
+                if text_end > LONG_LINE_LENGTH:
+                    visible = self._visible_text_range(block, geometry.top(), viewport_height)
+                    first, last = (0, 0) if visible is None else matches.range_between(
+                        block_start + visible[0], block_start + visible[1])
+                else:
+                    first, last = matches.range_between(block_start, block_start + text_end)
+                layout = block.layout()
+                origin = geometry.topLeft()
+                for i in range(first, last):
+                    start, end = matches.span(i)
+                    self._fill_text_range(painter, layout, origin, color,
+                                          max(0, start - block_start), min(text_end, end - block_start))
+            block = block.next()
+        painter.end()
+    
+    def _fill_text_range(self, painter, layout, origin, color, start, end):
+        """
+        填充块内 [start, end) 文本所占的区域，跨多个换行时逐行填充
+
+        Args:
+            painter (QPainter): 绘制器
+            layout (QTextLayout): 块的排版
+            origin (QPointF): 块在视口中的左上角
+            color (QColor): 填充颜色
+            start (int): 块内起始位置
+            end (int): 块内结束位置
+        """
+        line = layout.lineForTextPosition(start)
+        while line.isValid():
+            line_start = line.textStart()
+            line_end = line_start + line.textLength()
+            x1 = _cursor_x(line, max(start, line_start))
+            x2 = _cursor_x(line, min(end, line_end))
+            painter.fillRect(QRectF(origin.x() + x1, origin.y() + line.y(), x2 - x1, line.height()), color)
+            if end <= line_end or line.lineNumber() + 1 >= layout.lineCount():
+                break
+            line = layout.lineAt(line.lineNumber() + 1)
+    
+    def _overlay_whitespace(self):
+        """返回是否需要叠加绘制空白字符"""
+        return self.show_whitespace and (self.long_line_mode or
+                                         self.whitespace_mode == self.WHITESPACE_MODE_OVERLAY)
+    
+    def _schedule_long_line_update(self, *args):
+        """视口内容变化后推迟更新超长行的高亮区间"""
+        if not self._long_line_timer.isActive():
+            self._long_line_timer.start()
+    
+    def _update_long_line_segments(self):
+        """
+        计算视口内每个超长行可见的文本区间，超出已高亮的区间时通知高亮器
+        """
+        highlighters = [child for child in self.document().children()
+                        if hasattr(child, 'set_visible_range')]
+        if not highlighters:
+            return
+        viewport_height = self.viewport().height()
+        block = self.firstVisibleBlock()
+        offset = self.contentOffset()
+        while block.isValid():
+            top = self.blockBoundingGeometry(block).translated(offset).top()
+            if top > viewport_height:
+                break
+            if block.length() > LONG_LINE_LENGTH:
+                visible = self._visible_text_range(block, top, viewport_height)
+                if visible is not None:
+                    for highlighter in highlighters:
+                        highlighted = highlighter.highlighted_range(block)
+                        if (highlighted is None or visible[0] < highlighted[0]
+                                or visible[1] > highlighted[1]):
+                            highlighter.set_visible_range(block, *visible)
+            block = block.next()
+    
+    def _visible_text_range(self, block, top, viewport_height):
+        """
+        用二分查找求块中位于视口内的行对应的文本区间
+
+        Args:
+            block (QTextBlock): 文本块
+            top (float): 块在视口中的顶部坐标
+            viewport_height (int): 视口高度
+
+        Returns:
+            tuple: (起始位置, 结束位置)，块尚未排版时返回 None
+        """
+        layout = block.layout()
+        count = layout.lineCount()
+        if count == 0:
+            return None
+        visible_top = max(0.0, -top)
+        visible_bottom = viewport_height - top
+
+        def first_line_below(y):
+            lo, hi = 0, count
+            while lo < hi:
+                mid = (lo + hi) // 2
+                line = layout.lineAt(mid)
+                if line.y() + line.height() <= y:
+                    lo = mid + 1
+                else:
+                    hi = mid
+            return min(lo, count - 1)
+
+        first_line = layout.lineAt(first_line_below(visible_top))
+        last_line = layout.lineAt(first_line_below(visible_bottom))
+        return first_line.textStart(), last_line.textStart() + last_line.textLength()
+    
+    def _apply_whitespace_option(self):
+        """根据显示状态和方式设置文档的 ShowTabsAndSpaces 排版选项"""
+        document = self.document()
+        option = document.defaultTextOption()
+        flags = option.flags()
+        native = (self.show_whitespace and not self.long_line_mode
+                  and self.whitespace_mode == self.WHITESPACE_MODE_NATIVE)
+        if native:
+            new_flags = flags | QTextOption.ShowTabsAndSpaces
+        else:
+            new_flags = flags & ~QTextOption.ShowTabsAndSpaces
+        if new_flags != flags:
+            # 修改默认选项会让文档重新排版，只在实际变化时设置
+            option.setFlags(new_flags)
+            document.setDefaultTextOption(option)
+    
     def set_whitespace_color(self, color):
         """
         设置空白字符的颜色
@@ -552,7 +738,7 @@ class CodeEditor(QPlainTextEdit):
             color (QColor): 空白字符的颜色
         """
         self.whitespace_color = color
-        if self.show_whitespace:
+        if self._overlay_whitespace():
             self.viewport().update()
         
     def is_whitespace_visible(self):
@@ -571,102 +757,51 @@ class CodeEditor(QPlainTextEdit):
         Args:
             event (QPaintEvent): 绘制事件
         """
+        if not PerfMonitor.enabled:
+            self._paint(event)
+            return
+        started = time.perf_counter()
+        self._paint(event)
+        PerfMonitor.record("CodeEditor.paintEvent", started)
+        # 按键之后的第一次绘制完成，记录按键到绘制的延迟
+        if self._key_pressed_at is not None:
+            PerfMonitor.record("CodeEditor.keystroke_to_paint", self._key_pressed_at)
+            self._key_pressed_at = None
+
+    def _paint(self, event):
+        """绘制查找结果背景、正常文本和叠加的空白字符"""
+        # 处理自上一帧以来累积的文本变化
+        self._flush_dirty_blocks()
+        
+        # 查找结果的背景画在文本之下
+        if self.search_matches is not None:
+            self._draw_search_highlights(event)
+        
         # 先调用父类的paintEvent绘制正常文本（包括选择高亮等）
         super().paintEvent(event)
         
-        # 如果需要显示空白字符，则在上面叠加绘制
-        if self.show_whitespace:
+        # 叠加方式（以及长行模式）下在上面绘制空白字符，原生方式已由 Qt 在排版时绘制
+        if self._overlay_whitespace():
+            if not PerfMonitor.enabled:
+                self._draw_whitespace_overlay(event)
+                return
+            started = time.perf_counter()
             self._draw_whitespace_overlay(event)
+            PerfMonitor.record("CodeEditor.whitespace_overlay", started)
     
     def _draw_whitespace_overlay(self, event):
         """
-        在已绘制的文本上叠加空白字符，使用精确的逐字符位置计算
+        在已绘制的文本上叠加空白字符，位置和标记由精确渲染器缓存并批量绘制
         
         Args:
             event (QPaintEvent): 绘制事件
         """
         painter = QPainter(self.viewport())
         try:
-            painter.setPen(self.whitespace_color)
-            
-            # 获取可见区域的文本块
-            block = self.firstVisibleBlock()
-            viewport_offset = self.contentOffset()
-            
-            while block.isValid():
-                block_geometry = self.blockBoundingGeometry(block)
-                offset = block_geometry.translated(viewport_offset)
-                
-                # 检查块是否在可见区域内
-                if offset.top() > event.rect().bottom():
-                    break
-                    
-                if offset.bottom() >= event.rect().top():
-                    self._draw_block_whitespace_overlay(painter, block, offset)
-                
-                block = block.next()
+            self.precise_renderer.draw_visible_whitespace(painter, event.rect())
         finally:
             painter.end()
     
-    def _draw_block_whitespace_overlay(self, painter, block, block_rect):
-        """
-        为单个文本块绘制空白字符叠加，使用与之前完美方案相同的逐字符计算
-        
-        Args:
-            painter (QPainter): 绘制器
-            block (QTextBlock): 文本块
-            block_rect (QRectF): 块矩形区域
-        """
-        text = block.text()
-        if not text:
-            return
-        
-        # 设置字体（与编辑器保持一致）
-        painter.setFont(self.font())
-        fm = painter.fontMetrics()
-        
-        # 计算基线位置
-        baseline_y = block_rect.top() + fm.ascent()
-        
-        # 使用与之前完美方案相同的逐字符位置计算
-        x = block_rect.left()
-        
-        for i, char in enumerate(text):
-            if char == ' ':
-                # 在空格位置绘制点
-                center_x = x + fm.horizontalAdvance(' ') / 2
-                center_y = baseline_y - fm.height() / 4
-                painter.drawEllipse(int(center_x - 1), int(center_y - 1), 2, 2)
-                x += fm.horizontalAdvance(' ')
-                
-            elif char == '\t':
-                # 计算tab的结束位置
-                tab_width = self.tabStopDistance()
-                current_offset = x - block_rect.left()
-                next_tab_stop = ((current_offset // tab_width) + 1) * tab_width
-                new_x = block_rect.left() + next_tab_stop
-                
-                # 绘制tab箭头
-                arrow_y = baseline_y - fm.height() / 4
-                arrow_start_x = x + 3
-                arrow_end_x = new_x - 3
-                
-                if arrow_end_x > arrow_start_x:
-                    # 绘制箭头主体
-                    painter.drawLine(int(arrow_start_x), int(arrow_y), 
-                                   int(arrow_end_x), int(arrow_y))
-                    # 绘制箭头头部
-                    painter.drawLine(int(arrow_end_x), int(arrow_y), 
-                                   int(arrow_end_x - 4), int(arrow_y - 2))
-                    painter.drawLine(int(arrow_end_x), int(arrow_y), 
-                                   int(arrow_end_x - 4), int(arrow_y + 2))
-                
-                x = new_x
-                
-            else:
-                # 普通字符，只计算宽度不绘制
-                x += fm.horizontalAdvance(char)
-    
     def _draw_block_text_with_whitespace(self, painter, block, block_rect, event):
         """
         绘制文本块，同时在精确位置绘制空白字符
@@ -743,30 +878,7 @@ class CodeEditor(QPlainTextEdit):
         Args:
             event (QPaintEvent): 绘制事件
         """
-        painter = QPainter(self.viewport())
-        try:
-            painter.setPen(QPen(self.whitespace_color))
-            
-            # 获取可见的文本块
-            block = self.firstVisibleBlock()
-            viewport_offset = self.contentOffset()
-            
-            while block.isValid():
-                # 获取块的几何信息
-                block_geometry = self.blockBoundingGeometry(block)
-                offset = block_geometry.translated(viewport_offset)
-                
-                # 检查块是否在可见区域内
-                if offset.top() > event.rect().bottom():
-                    break
-                if offset.bottom() >= event.rect().top():
-                    # 使用精确渲染器绘制空白字符
-                    self.precise_renderer.draw_block_whitespace_precise(painter, block, offset)
-                
-                block = block.next()
-        finally:
-            # 确保 QPainter 正确结束
-            painter.end()
+        self._draw_whitespace_overlay(event)
     
     def setFont(self, font):
         """
@@ -798,13 +910,23 @@ class CodeEditor(QPlainTextEdit):
         """计算行号区域的宽度"""
         # 获取最大行号的位数
         digits = len(str(max(1, self.blockCount())))
-        # 计算宽度，包括一些额外的边距
-        space = 10 + self.fontMetrics().horizontalAdvance('9') * digits
+        # 计算宽度，包括标记列和一些额外的边距
+        space = (10 + self.fontMetrics().horizontalAdvance('9') * digits
+                 + self.line_number_area.lanes_width())
         return space
 
-    def update_line_number_area_width(self):
-        """更新行号区域的宽度，并设置编辑器的左边距"""
-        self.setViewportMargins(self.line_number_area_width(), 0, 0, 0)
+    def update_line_number_area_width(self, *args):
+        """
+        更新行号区域的宽度，并设置编辑器的左边距
+
+        只在宽度实际变化时（行号位数、字体或标记列变化）才重新设置边距。
+        """
+        width = self.line_number_area_width()
+        if width != self._line_number_width:
+            self._line_number_width = width
+            self.setViewportMargins(width, 0, 0, 0)
+            cr = self.contentsRect()
+            self.line_number_area.setGeometry(QRect(cr.left(), cr.top(), width, cr.height()))
 
     def update_line_number_area(self, rect, dy):
         """
@@ -818,8 +940,17 @@ class CodeEditor(QPlainTextEdit):
             self.line_number_area.scroll(0, dy)
         else:
             self.line_number_area.update(0, rect.y(), self.line_number_area.width(), rect.height())
+
+    def changeEvent(self, event):
+        """
+        字体变化（包括样式表设置的字体）时重新计算行号区域
         
-        if rect.contains(self.viewport().rect()):
+        Args:
+            event (QEvent): 状态变化事件
+        """
+        super().changeEvent(event)
+        if event.type() == QEvent.FontChange:
+            self.line_number_area.clear_cache()
             self.update_line_number_area_width()
 
     def resizeEvent(self, event):
@@ -831,10 +962,7 @@ class CodeEditor(QPlainTextEdit):
         """
         super().resizeEvent(event)
         cr = self.contentsRect()
-        self.line_number_area.setGeometry(QRect(cr.left(), cr.top(), self.line_number_area_width(), cr.height()))
-        # 窗口大小变化时清除缓存
-        if hasattr(self, 'precise_renderer'):
-            self.precise_renderer.clear_cache()
+        self.line_number_area.setGeometry(QRect(cr.left(), cr.top(), self._line_number_width, cr.height()))
 
     def line_number_area_paint_event(self, event):
         """
@@ -843,26 +971,7 @@ class CodeEditor(QPlainTextEdit):
         Args:
             event (QPaintEvent): 绘制事件
         """
-        painter = QPainter(self.line_number_area)
-        painter.fillRect(event.rect(), QColor("#252526"))  # 设置背景色
-        
-        block = self.firstVisibleBlock()
-        block_number = block.blockNumber()
-        top = self.blockBoundingGeometry(block).translated(self.contentOffset()).top()
-        bottom = top + self.blockBoundingGeometry(block).height()
-
-        # 遍历所有可见的文本块并绘制行号
-        while block.isValid() and top <= event.rect().bottom():
-            if block.isVisible() and bottom >= event.rect().top():
-                number = str(block_number + 1)
-                painter.setPen(QColor("#858585"))  # 设置行号颜色
-                painter.drawText(0, int(top), self.line_number_area.width() - 5, self.fontMetrics().height(),
-                               Qt.AlignRight, number)
-            
-            block = block.next()
-            top = bottom
-            bottom = top + self.blockBoundingGeometry(block).height()
-            block_number += 1
+        self.line_number_area.paintEvent(event)
     
     def keyPressEvent(self, event):
         """
@@ -871,6 +980,10 @@ class CodeEditor(QPlainTextEdit):
         Args:
             event (QKeyEvent): 键盘事件
         """
+        # 性能监视打开时从按键开始计时，在下一次绘制完成时结束
+        if PerfMonitor.enabled and self._key_pressed_at is None:
+            self._key_pressed_at = time.perf_counter()
+
         # 处理 Tab/Shift+Tab 缩进
         if event.key() == Qt.Key_Tab or event.key() == Qt.Key_Backtab:
             # Qt.Key_Backtab 是 Shift+Tab 的另一种表示
@@ -901,120 +1014,85 @@ class CodeEditor(QPlainTextEdit):
             event.accept()
             return
         
+        # 处理 Ctrl+/ (切换行注释)
+        elif (event.key() == Qt.Key_Slash and
+              event.modifiers() == Qt.ControlModifier):
+            self.toggle_line_comment()
+            event.accept()
+            return
+        
+        # 处理 Ctrl+Shift+K (关键字大写)
+        elif (event.key() == Qt.Key_K and
+              event.modifiers() == (Qt.ControlModifier | Qt.ShiftModifier)):
+            self.uppercase_keywords()
+            event.accept()
+            return
+        
+        # 撤销/重做走重写的方法，以便撤销内存估算跳过这些变化
+        elif event.matches(QKeySequence.Undo):
+            self.undo()
+            event.accept()
+            return
+        
+        elif event.matches(QKeySequence.Redo):
+            self.redo()
+            event.accept()
+            return
+        
         # 其他按键交给父类处理
         super().keyPressEvent(event)
     
+    def undo(self):
+        """撤销，期间的文档变化不计入撤销内存"""
+        self.undo_tracker.begin_undo_redo()
+        try:
+            super().undo()
+        finally:
+            self.undo_tracker.end_undo_redo()
+    
+    def redo(self):
+        """重做，期间的文档变化不计入撤销内存"""
+        self.undo_tracker.begin_undo_redo()
+        try:
+            super().redo()
+        finally:
+            self.undo_tracker.end_undo_redo()
+    
     def indent_selection(self):
         """
         对选中的行增加缩进（在每行开头添加4个空格）
         """
-        cursor = self.textCursor()
-        cursor.beginEditBlock()
-        
-        # 获取选中区域的起始和结束位置
-        start = cursor.selectionStart()
-        end = cursor.selectionEnd()
-        
-        # 移动到选中区域的开始行
-        cursor.setPosition(start)
-        cursor.movePosition(QTextCursor.StartOfBlock)
-        
-        # 记录处理前的选中区域
-        first_block_pos = cursor.position()
-        
-        # 处理每一行
-        while cursor.position() <= end and not cursor.atEnd():
-            # 在行首插入4个空格
-            cursor.insertText("    ")
-            # 更新结束位置（因为插入了字符）
-            end += 4
-            
-            # 移动到下一行
-            if not cursor.movePosition(QTextCursor.NextBlock):
-                break
-        
-        # 恢复选中状态
-        cursor.setPosition(first_block_pos)
-        cursor.setPosition(end, QTextCursor.KeepAnchor)
-        
-        cursor.endEditBlock()
-        self.setTextCursor(cursor)
+        transform_lines(self, indent_lines)
     
     def unindent_selection(self):
         """
         对选中的行减少缩进（删除每行开头的最多4个空格或1个Tab）
         """
-        cursor = self.textCursor()
-        cursor.beginEditBlock()
-        
-        # 获取选中区域的起始和结束位置
-        start = cursor.selectionStart()
-        end = cursor.selectionEnd()
-        
-        # 移动到选中区域的开始行
-        cursor.setPosition(start)
-        cursor.movePosition(QTextCursor.StartOfBlock)
-        
-        # 记录处理前的选中区域
-        first_block_pos = cursor.position()
-        
-        # 处理每一行
-        while cursor.position() <= end and not cursor.atEnd():
-            # 保存当前位置
-            current_pos = cursor.position()
-            
-            # 获取当前行的文本
-            cursor.movePosition(QTextCursor.EndOfBlock, QTextCursor.KeepAnchor)
-            line_text = cursor.selectedText()
-            cursor.setPosition(current_pos)  # 回到行首
-            
-            # 计算要删除的字符数
-            chars_to_remove = 0
-            
-            # 如果行首是Tab，删除一个Tab
-            if line_text and line_text[0] == '\t':
-                chars_to_remove = 1
-            else:
-                # 否则删除最多4个空格
-                for i, char in enumerate(line_text):
-                    if char == ' ' and i < 4:
-                        chars_to_remove += 1
-                    else:
-                        break
-            
-            # 删除字符
-            if chars_to_remove > 0:
-                cursor.movePosition(QTextCursor.NextCharacter, QTextCursor.KeepAnchor, chars_to_remove)
-                cursor.removeSelectedText()
-                # 更新结束位置
-                end -= chars_to_remove
-            
-            # 移动到下一行
-            cursor.movePosition(QTextCursor.StartOfBlock)
-            if not cursor.movePosition(QTextCursor.NextBlock):
-                break
-        
-        # 恢复选中状态
-        cursor.setPosition(first_block_pos)
-        cursor.setPosition(max(first_block_pos, end), QTextCursor.KeepAnchor)
-        
-        cursor.endEditBlock()
-        self.setTextCursor(cursor)
+        transform_lines(self, unindent_lines)
     
     def convert_selection_to_upper(self):
         """
         将选中的文本转换为大写
         """
-        cursor = self.textCursor()
-        if cursor.hasSelection():
-            selected_text = cursor.selectedText()
-            cursor.insertText(selected_text.upper())
+        transform_selection(self, str.upper)
     
     def convert_selection_to_lower(self):
         """
         将选中的文本转换为小写
         """
-        cursor = self.textCursor()
-        if cursor.hasSelection():
-            selected_text = cursor.selectedText()
-            cursor.insertText(selected_text.lower())
\ No newline at end of file
+        transform_selection(self, str.lower)
+    
+    def toggle_line_comment(self):
+        """
+        切换选中行（没有选中时为当前行）的 -- 行注释
+        """
+        transform_lines(self, toggle_line_comments)
+    
+    def uppercase_keywords(self):
+        """
+        将选中行中的SQL关键字转换为大写，没有选中时处理整个文档
+        """
+        if self.textCursor().hasSelection():
+            transform_lines(self, lambda lines: uppercase_keywords('\n'.join(lines)).split('\n'))
+        else:
+            transform_document(self, uppercase_keywords)
@@ -0,0 +1,65 @@
+"""
+文件编码处理模块
+
+统一负责磁盘文件的读取与编码识别，打开文件、会话恢复等功能共用同一套解码策略。
+"""
+
+import os
+
+
+def decode_bytes(raw_data):
+    """
+    按照分步解码策略将字节内容解码为文本
+
+    优先尝试 UTF-8，失败后使用 chardet 检测编码，检测不到时回退到 GB18030。
+
+    Args:
+        raw_data (bytes): 文件的原始字节内容
+
+    Returns:
+        tuple: (解码后的文本, 使用的编码名称)
+    """
+    try:
+        return raw_data.decode('utf-8'), 'utf-8'
+    except UnicodeDecodeError:
+        # chardet 导入较慢，只在需要检测编码时才导入，不影响程序启动
+        import chardet
+        detected = chardet.detect(raw_data)
+        encoding = detected['encoding'] or 'gb18030'
+        try:
+            return raw_data.decode(encoding, errors='replace'), encoding
+        except LookupError:
+            # chardet 返回了 Python 不认识的编码名称
+            return raw_data.decode('gb18030', errors='replace'), 'gb18030'
+
+
+def read_text_file(file_path):
+    """
+    读取文本文件并自动识别编码
+
+    Args:
+        file_path (str): 文件路径
+
+    Returns:
+        tuple: (文件文本, 使用的编码名称)
+    """
+    with open(file_path, 'rb') as f:
+        raw_data = f.read()
+    return decode_bytes(raw_data)
+
+
+def file_signature(file_path):
+    """
+    获取文件的修改时间和大小，用于判断磁盘上的文件是否变化
+
+    Args:
+        file_path (str): 文件路径
+
+    Returns:
+        tuple: (修改时间纳秒, 文件大小)，文件不存在时返回None
+    """
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
@@ -0,0 +1,141 @@
+"""
+文件监视模块
+
+监视已打开文件在磁盘上的变化，合并短时间内的连续变化事件，并在后台线程中读取新内容、
+计算与编辑器文本的差异。
+"""
+
+import os
+import threading
+from PySide6.QtCore import QObject, QTimer, QFileSystemWatcher, Signal
+from FileCodec import read_text_file
+from TextDiff import compute_line_edits, normalize_newlines
+
+
+class FileWatcher(QObject):
+    """
+    文件监视器
+
+    同一文件在 DEBOUNCE_MS 内的多次变化只发出一次 file_changed 信号。
+    """
+
+    # 文件内容变化（已去抖）
+    file_changed = Signal(str)
+
+    DEBOUNCE_MS = 300
+
+    def __init__(self, parent=None):
+        """
+        初始化文件监视器
+
+        Args:
+            parent (QObject): 父对象
+        """
+        super().__init__(parent)
+        self.watcher = QFileSystemWatcher(self)
+        self.watcher.fileChanged.connect(self._on_file_changed)
+        self.paths = set()
+        self._timers = {}
+
+    def set_paths(self, paths):
+        """
+        设置需要监视的文件集合
+
+        已在集合中但丢失了监视的文件（例如被删除后又重新创建，且晚于去抖时间）在这里重新添加。
+
+        Args:
+            paths (iterable): 文件路径
+        """
+        paths = {os.path.abspath(path) for path in paths}
+        removed = self.paths - paths
+        watched = set(self.watcher.files())
+        if removed:
+            self.watcher.removePaths([path for path in removed if path in watched])
+            for path in removed:
+                timer = self._timers.pop(path, None)
+                if timer is not None:
+                    timer.stop()
+                    timer.deleteLater()
+        missing = [path for path in paths if path not in watched and os.path.exists(path)]
+        if missing:
+            self.watcher.addPaths(missing)
+        self.paths = paths
+
+    def _on_file_changed(self, path):
+        """
+        文件变化时重新开始该文件的去抖计时
+
+        Args:
+            path (str): 变化的文件路径
+        """
+        path = os.path.abspath(path)
+        if path not in self.paths:
+            return
+        timer = self._timers.get(path)
+        if timer is None:
+            timer = QTimer(self)
+            timer.setSingleShot(True)
+            timer.setInterval(self.DEBOUNCE_MS)
+            timer.timeout.connect(lambda: self._emit_change(path))
+            self._timers[path] = timer
+        timer.start()
+
+    def _emit_change(self, path):
+        """
+        去抖结束后发出变化信号
+
+        git checkout 等工具通过替换文件写入，QFileSystemWatcher 会丢失对该路径的监视，
+        这里重新添加。
+
+        Args:
+            path (str): 文件路径
+        """
+        if path not in self.paths:
+            return
+        if os.path.exists(path) and path not in self.watcher.files():
+            self.watcher.addPath(path)
+        self.file_changed.emit(path)
+
+
+class ReloadTask(QObject):
+    """
+    后台重新加载任务
+
+    在工作线程中读取并解码文件，计算与编辑器文本快照之间的按行差异，
+    完成后在主线程发出 finished 信号。
+    """
+
+    # 参数为结果字典：path, text, encoding, edits, revision, error
+    finished = Signal(object)
+
+    def __init__(self, path, old_text, revision, parent=None):
+        """
+        初始化重新加载任务
+
+        Args:
+            path (str): 文件路径
+            old_text (str): 编辑器当前文本的快照
+            revision (int): 快照对应的文档修订号，用于判断应用时文档是否已变化
+            parent (QObject): 父对象
+        """
+        super().__init__(parent)
+        self.path = path
+        self.old_text = old_text
+        self.revision = revision
+
+    def start(self):
+        """在后台线程中开始执行"""
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def _run(self):
+        """读取文件并计算差异"""
+        result = {'path': self.path, 'revision': self.revision, 'error': None}
+        try:
+            text, encoding = read_text_file(self.path)
+            text = normalize_newlines(text)
+            result.update(text=text, encoding=encoding,
+                          edits=compute_line_edits(self.old_text, text))
+        except Exception as e:
+            result['error'] = str(e)
+        self.old_text = None
+        self.finished.emit(result)
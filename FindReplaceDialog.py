@@ -3,11 +3,19 @@
 """
 
 import re
+import time
 from PySide6.QtWidgets import (QDialog, QVBoxLayout, QGroupBox, QGridLayout, 
                                QLabel, QLineEdit, QCheckBox, QHBoxLayout, 
-                               QPushButton)
-from PySide6.QtGui import QTextCharFormat, QColor, QTextCursor, QTextDocument
-from PySide6.QtCore import Qt
+                               QPushButton, QTreeView)
+from PySide6.QtGui import QTextCursor
+from PySide6.QtCore import Qt, QTimer, Signal
+from SearchIndex import (MatchIndex, ReplaceTask, SearchTask, compile_search_pattern,
+                         is_line_local, required_literals)
+from RegexSandbox import RegexSandboxError
+from TextIndex import TextIndex, find_in_regions
+from SearchResults import SearchResultsModel, TabSearchResult
+from TextDiff import OrderedEdits
+import PerfMonitor
 
 
 class FindReplaceDialog(QDialog):
@@ -15,21 +23,85 @@ class FindReplaceDialog(QDialog):
     查找替换对话框类
     
     提供查找、替换、正则表达式、实时高亮等功能。
+    实时高亮在输入停止 SEARCH_DELAY_MS 后于后台线程中查找，查找内容变化时取消上一次查找，
+    匹配项分批显示，匹配数量随查找进度更新。
+    勾选“在所有打开的标签页中查找”后，对每个标签页的文本快照执行后台查找，同时最多执行
+    MAX_TAB_SEARCHES 个，结果按标签页分组显示；全部替换逐个标签页执行，每个文档分别作为一次可撤销的编辑。
+    当前文档的全部替换在后台计算替换内容，主线程每次只用 REPLACE_SLICE_MS 毫秒按顺序应用一批，
+    整个替换是一次可撤销的编辑；替换期间显示进度，可以停止（停止后撤销已应用的部分）。
+    大文档第一次查找时在后台建立 TextIndex，之后的查找先用索引筛选出候选文本块，
+    候选文本不多时直接在主线程中得到全部匹配项，不再扫描整个文档。
+    提供 regex_sandbox 时，正则表达式模式下的查找和替换都在工作进程中执行，
+    表达式执行过慢时停止并提示，而不会卡住整个程序。
     """
     
-    def __init__(self, parent=None, text_editor=None):
+    # 激活了其他标签页中的结果，参数为该标签页（TabEditor），由主窗口切换到该标签页
+    result_activated = Signal(object)
+    
+    SEARCH_DELAY_MS = 200
+    # 单次变化超过该字符数（例如重新加载、全部替换）时重新完整查找，而不是增量更新
+    INCREMENTAL_LIMIT = 100000
+    # 索引筛选出的候选文本不超过该字符数时直接在主线程中查找，否则仍在后台查找整个文档
+    INDEX_SYNC_LIMIT = 1000000
+    # 全部替换时每次事件循环中应用替换的时间（毫秒）
+    REPLACE_SLICE_MS = 15
+    # 在所有标签页中查找时同时执行的后台查找数，其余标签页排队等待
+    MAX_TAB_SEARCHES = 2
+    
+    def __init__(self, parent=None, text_editor=None, tabs_provider=None, regex_sandbox=None):
         """
         初始化查找替换对话框
         
         Args:
             parent (QWidget): 父组件
             text_editor (QTextEdit): 需要操作的文本编辑器
+            tabs_provider (callable): 返回所有 TabEditor 的函数，提供时可以在所有标签页中查找
+            regex_sandbox (RegexSandbox): 执行正则表达式的沙箱
         """
         super().__init__(parent)
         self.text_editor = text_editor
-        self.highlight_format = QTextCharFormat()
-        self.highlight_format.setBackground(QColor("#FFFF00"))  # 黄色背景
-        self.current_highlights = []
+        self.tabs_provider = tabs_provider
+        self.regex_sandbox = regex_sandbox
+        # 当前查找内容的匹配位置索引，以及正在执行的后台查找任务
+        self.matches = MatchIndex()
+        self.search_task = None
+        # 文档纯文本的快照，文档变化前连续查找时复用，避免每次按键都复制整个文档
+        self._text_snapshot = None
+        # 在所有标签页中查找时各标签页的后台任务：任务 -> TabSearchResult，以及排队等待的 (标签页, 表达式)
+        self.tab_search_tasks = {}
+        self._pending_tab_searches = []
+        # 已创建编辑器的标签页的文本快照：标签页 -> (文档, 修订号, 文本)，文档未变化时复用
+        self._tab_texts = {}
+        # 正在执行的全部替换：(表达式, 替换内容, 是否正则表达式, 沙箱)，没有替换时为 None
+        self._replace_args = None
+        # 正在替换的文档：后台任务、按顺序应用替换的 OrderedEdits 和被替换的编辑器
+        self.replace_task = None
+        self.replace_edits = None
+        self._replace_editor = None
+        self._replace_read_only = False
+        self._replace_length = 0
+        # 后台计算完成后的替换总数，尚未完成时为 None
+        self._replace_count = None
+        # 在所有标签页中替换时：尚未处理的标签页（只替换当前文档时为 None）、正在处理的标签页、
+        # 尚未创建编辑器时后台取得的文本快照，以及已完成的标签页数和替换数
+        self._replace_tabs = None
+        self._replace_tab = None
+        self._replace_snapshot = None
+        self._replace_tab_count = 0
+        self._replace_total = 0
+        # 正在应用或撤销替换，这期间的文档变化来自全部替换本身
+        self._replace_applying = False
+        
+        # 查找内容、选项或文档变化后延迟查找，连续输入只查找一次
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(self.SEARCH_DELAY_MS)
+        self.search_timer.timeout.connect(self.highlight_all_matches)
+        # 全部替换时分批应用替换，每批之间返回事件循环
+        self.replace_timer = QTimer(self)
+        self.replace_timer.setSingleShot(True)
+        self.replace_timer.setInterval(0)
+        self.replace_timer.timeout.connect(self.apply_pending_replacements)
         
         self.setup_ui()
         self.setup_connections()
@@ -59,6 +131,10 @@ class FindReplaceDialog(QDialog):
         self.case_sensitive_checkbox = QCheckBox("区分大小写")
         find_layout.addWidget(self.case_sensitive_checkbox, 2, 1)
         
+        self.all_tabs_checkbox = QCheckBox("在所有打开的标签页中查找")
+        self.all_tabs_checkbox.setEnabled(self.tabs_provider is not None)
+        find_layout.addWidget(self.all_tabs_checkbox, 3, 1)
+        
         layout.addWidget(find_group)
         
         # 替换组
@@ -84,30 +160,49 @@ class FindReplaceDialog(QDialog):
         button_layout.addWidget(self.replace_all_button)
         layout.addLayout(button_layout)
         
+        # 所有标签页的查找结果，视图只为可见的行向模型请求数据
+        self.results_model = SearchResultsModel(self)
+        self.results_view = QTreeView()
+        self.results_view.setModel(self.results_model)
+        self.results_view.setHeaderHidden(True)
+        self.results_view.setUniformRowHeights(True)
+        self.results_view.hide()
+        layout.addWidget(self.results_view, 1)
+        
         # 关闭和状态
         footer_layout = QHBoxLayout()
         self.status_label = QLabel("就绪")
+        self.stop_button = QPushButton("停止")
+        self.stop_button.setEnabled(False)
         self.close_button = QPushButton("关闭")
         footer_layout.addWidget(self.status_label)
         footer_layout.addStretch()
+        footer_layout.addWidget(self.stop_button)
         footer_layout.addWidget(self.close_button)
         layout.addLayout(footer_layout)
         
     def setup_connections(self):
         """设置信号和槽的连接"""
-        self.find_edit.textChanged.connect(self.highlight_all_matches)
-        self.regex_checkbox.toggled.connect(self.highlight_all_matches)
-        self.case_sensitive_checkbox.toggled.connect(self.highlight_all_matches)
+        self.find_edit.textChanged.connect(self.schedule_search)
+        self.regex_checkbox.toggled.connect(self.schedule_search)
+        self.case_sensitive_checkbox.toggled.connect(self.schedule_search)
+        self.all_tabs_checkbox.toggled.connect(self.on_all_tabs_toggled)
+        self.results_view.activated.connect(self.on_result_activated)
         
         self.find_button.clicked.connect(self.find_next)
         self.find_prev_button.clicked.connect(self.find_previous)
-        self.replace_button.clicked.connect(self.replace_current)
-        self.replace_all_button.clicked.connect(self.replace_all)
+        self.replace_button.clicked.connect(PerfMonitor.timed('replace_current', self.replace_current))
+        self.replace_all_button.clicked.connect(PerfMonitor.timed('replace_all', self.replace_all))
+        self.stop_button.clicked.connect(self.cancel_replace_all)
         self.close_button.clicked.connect(self.close)
         
-        # 对话框关闭时自动清除高亮
+        # 对话框关闭时停止全部替换，并自动清除高亮
+        self.finished.connect(self.cancel_replace_all)
         self.finished.connect(self.clear_highlights)
         
+        if self.text_editor:
+            self.text_editor.document().contentsChange.connect(self.on_document_changed)
+        
     def auto_fill_selected_text(self):
         """如果编辑器中有选中的文本，自动填充到查找框"""
         if not self.text_editor:
@@ -120,103 +215,476 @@ class FindReplaceDialog(QDialog):
                 self.find_edit.setText(selected_text)
                 self.highlight_all_matches()
                 
+    def schedule_search(self, *args):
+        """重新开始延迟查找的计时"""
+        self.search_timer.start()
+        
     def highlight_all_matches(self):
-        """高亮显示所有匹配的文本"""
+        """在后台查找所有匹配项，交给编辑器以叠加方式高亮（只绘制视口内的匹配项）"""
+        with PerfMonitor.action("highlight_all_matches"):
+            self._highlight_all_matches()
+
+    def _highlight_all_matches(self):
+        """取消进行中的查找，按当前选项编译表达式后开始查找"""
+        self.search_timer.stop()
+        self.cancel_search()
+        self.cancel_tab_searches()
         find_text = self.find_edit.text()
         if not find_text:
             self.clear_highlights()
             return
-        self.clear_highlights()
         try:
-            if self.regex_checkbox.isChecked():
-                flags = re.IGNORECASE if not self.case_sensitive_checkbox.isChecked() else 0
-                pattern = re.compile(find_text, flags)
-                text = self.text_editor.toPlainText()
-                for match in pattern.finditer(text):
-                    self.highlight_range(match.start(), match.end())
-            else:
-                flags = QTextDocument.FindFlags()
-                if self.case_sensitive_checkbox.isChecked():
-                    flags |= QTextDocument.FindCaseSensitively
-                cursor = self.text_editor.document().find(find_text, 0, flags)
-                while not cursor.isNull():
-                    self.highlight_range(cursor.selectionStart(), cursor.selectionEnd())
-                    cursor = self.text_editor.document().find(find_text, cursor, flags)
-            self.update_status()
+            pattern = compile_search_pattern(find_text, self.regex_checkbox.isChecked(),
+                                             self.case_sensitive_checkbox.isChecked())
         except re.error as e:
+            self.clear_highlights()
             self.status_label.setText(f"正则表达式错误: {e}")
+            return
+        if self.all_tabs_checkbox.isChecked():
+            self.search_all_tabs(pattern)
+        self.search_current_editor(pattern)
+        
+    def sandbox(self):
+        """
+        返回执行当前查找应使用的沙箱：普通查找已按字面值转义，不会发生灾难性回溯，直接在本进程中执行
+
+        Returns:
+            RegexSandbox: 沙箱，不需要时返回 None
+        """
+        return self.regex_sandbox if self.regex_checkbox.isChecked() else None
+        
+    def search_current_editor(self, pattern):
+        """
+        在后台查找当前编辑器中的所有匹配项
+
+        Args:
+            pattern (re.Pattern): 正则表达式
+        """
+        self.cancel_search()
+        try:
+            matches = self.indexed_matches(pattern)
+        except RegexSandboxError as e:
+            self.show_search_failure(str(e))
+            return
+        if matches is not None:
+            self.matches = matches
+            self.text_editor.set_search_matches(self.matches)
+            self.update_status()
+            return
+        self.matches = MatchIndex(pattern)
+        self.text_editor.set_search_matches(self.matches)
+        self.status_label.setText("正在查找...")
+        if self._text_snapshot is None:
+            self._text_snapshot = self.text_editor.toPlainText()
+        self.ensure_text_index()
+        self.search_task = SearchTask(pattern, self._text_snapshot, sandbox=self.sandbox())
+        self.search_task.matches_found.connect(self.on_matches_found)
+        self.search_task.finished.connect(self.on_search_finished)
+        self.search_task.failed.connect(self.on_search_failed)
+        self.search_task.start()
+        
+    def ensure_text_index(self):
+        """大文档还没有索引时，根据文本快照在后台建立索引，供之后的查找使用"""
+        editor = self.text_editor
+        if editor.text_index is None and len(self._text_snapshot) >= TextIndex.MIN_LENGTH:
+            editor.text_index = TextIndex(editor.document())
+            editor.text_index.build(self._text_snapshot)
             
-    def highlight_range(self, start, end):
-        """高亮指定范围的文本"""
-        cursor = QTextCursor(self.text_editor.document())
+    def indexed_matches(self, pattern):
+        """
+        用当前编辑器的索引筛选候选文本块，只在其中查找所有匹配项
+
+        Args:
+            pattern (re.Pattern): 正则表达式
+
+        Returns:
+            MatchIndex: 匹配索引；没有可用的索引、表达式可能跨行或不含固定文字、
+            候选文本太多时返回 None
+
+        Raises:
+            RegexSandboxError: 在工作进程中查找超时或失败
+        """
+        index = self.text_editor.text_index
+        find_text = self.find_edit.text()
+        use_regex = self.regex_checkbox.isChecked()
+        if index is None or not index.ready or '\n' in find_text:
+            return None
+        if use_regex and not is_line_local(pattern):
+            return None
+        regions = index.candidate_regions(
+            required_literals(find_text, use_regex, self.case_sensitive_checkbox.isChecked()))
+        if regions is None or sum(len(text) for start, text in regions) > self.INDEX_SYNC_LIMIT:
+            return None
+        matches = MatchIndex(pattern)
+        if self.sandbox() is not None:
+            matches.extend(*self.sandbox().region_spans(pattern, regions))
+        else:
+            matches.extend(*find_in_regions(pattern, regions))
+        return matches
+            
+    def cancel_search(self):
+        """取消当前编辑器正在执行的后台查找"""
+        if self.search_task is not None:
+            self.search_task.cancel()
+            self.search_task = None
+            
+    def cancel_tab_searches(self):
+        """取消所有标签页正在执行和排队等待的后台查找"""
+        for task in self.tab_search_tasks:
+            task.cancel()
+        self.tab_search_tasks = {}
+        self._pending_tab_searches = []
+            
+    def search_all_tabs(self, pattern):
+        """
+        在后台查找所有标签页，同时最多执行 MAX_TAB_SEARCHES 个，其余排队等待
+
+        尚未加载或已休眠的标签页在后台线程中读取保存的文本，不会创建编辑器；
+        已创建编辑器的标签页的文本快照按文档修订号缓存，文档未变化时不再复制。
+
+        Args:
+            pattern (re.Pattern): 正则表达式
+        """
+        self.results_model.clear()
+        tabs = self.tabs_provider()
+        # 已关闭的标签页的快照不再保留
+        self._tab_texts = {tab: cached for tab, cached in self._tab_texts.items() if tab in tabs}
+        self._pending_tab_searches = [(tab, pattern) for tab in tabs]
+        self.start_tab_searches()
+
+    def start_tab_searches(self):
+        """从等待队列中开始查找，直到同时执行的查找达到 MAX_TAB_SEARCHES 个"""
+        tabs = self.tabs_provider()
+        while self._pending_tab_searches and len(self.tab_search_tasks) < self.MAX_TAB_SEARCHES:
+            tab, pattern = self._pending_tab_searches.pop(0)
+            if tab not in tabs:
+                continue
+            # 文本在后台取得后由 on_tab_text_loaded 填入
+            group = TabSearchResult(tab, tab.get_display_name(), None, pattern)
+            task = SearchTask(pattern, self.tab_text_loader(tab), sandbox=self.sandbox())
+            task.text_loaded.connect(self.on_tab_text_loaded)
+            task.matches_found.connect(self.on_tab_matches_found)
+            task.finished.connect(self.on_tab_search_finished)
+            task.failed.connect(self.on_tab_search_failed)
+            self.tab_search_tasks[task] = group
+            task.start()
+
+    def tab_text_loader(self, tab):
+        """
+        返回读取标签页文本的函数，已创建编辑器的标签页在文档未变化时复用上次的快照
+
+        Args:
+            tab (TabEditor): 标签页
+
+        Returns:
+            callable: 在后台线程中返回标签页文本的函数
+        """
+        if not tab.is_materialized():
+            return tab.text_loader()
+        document = tab.editor.document()
+        cached = self._tab_texts.get(tab)
+        if cached is None or cached[0] is not document or cached[1] != document.revision():
+            cached = (document, document.revision(), tab.get_text())
+            self._tab_texts[tab] = cached
+        text = cached[2]
+        return lambda: text
+
+    def on_tab_text_loaded(self, text):
+        """
+        记录某个标签页查找使用的文本快照，结果中的位置和行内容以它为准
+
+        Args:
+            text (str): 文本快照
+        """
+        group = self.tab_search_tasks.get(self.sender())
+        if group is not None:
+            group.text = text
+            
+    def on_tab_matches_found(self, starts, ends):
+        """
+        把某个标签页的一批匹配项加入结果树
+
+        Args:
+            starts (array): 匹配起始位置
+            ends (array): 匹配结束位置
+        """
+        group = self.tab_search_tasks.get(self.sender())
+        if group is None:
+            return
+        self.results_model.add_matches(group, starts, ends)
+        self.update_status()
+        
+    def on_tab_search_finished(self, count):
+        """
+        某个标签页查找完成
+
+        Args:
+            count (int): 该标签页的匹配数量
+        """
+        # 没有匹配项的标签页不会加入结果树，其文本快照随任务一起释放
+        if self.tab_search_tasks.pop(self.sender(), None) is not None:
+            self.start_tab_searches()
+            self.update_status()
+            
+    def on_tab_search_failed(self, message):
+        """
+        某个标签页的查找超时或出错，停止所有标签页的查找
+
+        Args:
+            message (str): 错误信息
+        """
+        if self.sender() in self.tab_search_tasks:
+            self.cancel_tab_searches()
+            self.status_label.setText(message)
+            
+    def on_all_tabs_toggled(self, checked):
+        """
+        切换是否在所有标签页中查找
+
+        Args:
+            checked (bool): 是否勾选
+        """
+        self.results_view.setVisible(checked)
+        if checked:
+            self.resize(max(self.width(), 600), max(self.height(), 550))
+        else:
+            self.cancel_tab_searches()
+            self.results_model.clear()
+            self._tab_texts = {}
+        self.schedule_search()
+        
+    def on_result_activated(self, index):
+        """
+        切换到结果所在的标签页并选中匹配项
+
+        标签页在查找之后被修改时，结果位置可能已经不对应匹配文本，此时提示重新查找。
+        检查时在整个文档中从起始位置匹配，依赖前后文的表达式（如断言）与查找时的结果一致。
+
+        Args:
+            index (QModelIndex): 结果行
+        """
+        match = self.results_model.match_at(index)
+        if match is None:
+            return
+        group, start, end = match
+        if group.tab not in self.tabs_provider():
+            self.status_label.setText("该标签页已关闭")
+            return
+        self.result_activated.emit(group.tab)
+        editor = group.tab.ensure_editor()
+        self.set_text_editor(editor)
+        document_text = editor.toPlainText()
+        pattern = group.matches.pattern
+        try:
+            if end > len(document_text):
+                matched_end = None
+            elif self.sandbox() is not None:
+                matched_end = self.sandbox().match_end(pattern, document_text, start)
+            else:
+                match = pattern.match(document_text, start)
+                matched_end = match.end() if match is not None else None
+        except RegexSandboxError as e:
+            self.status_label.setText(str(e))
+            return
+        if matched_end != end:
+            self.status_label.setText("标签页内容已变化，请重新查找")
+            return
+        cursor = editor.textCursor()
         cursor.setPosition(start)
         cursor.setPosition(end, QTextCursor.KeepAnchor)
-        cursor.mergeCharFormat(self.highlight_format)
-        self.current_highlights.append(cursor)
+        editor.setTextCursor(cursor)
+        editor.centerCursor()
+        
+    def set_text_editor(self, editor):
+        """
+        切换查找替换操作的编辑器，当前查找内容的高亮随之转移
+
+        Args:
+            editor (CodeEditor): 新的编辑器
+        """
+        if editor is self.text_editor:
+            return
+        old_editor = self.text_editor
+        self.text_editor = editor
+        try:
+            old_editor.document().contentsChange.disconnect(self.on_document_changed)
+            old_editor.clear_search_matches()
+        except RuntimeError:
+            # 旧编辑器所在的标签页已被关闭或休眠
+            pass
+        self.matches = MatchIndex()
+        self._text_snapshot = None
+        editor.document().contentsChange.connect(self.on_document_changed)
+        if self.search_timer.isActive() or not self.find_edit.text():
+            return
+        # 只查找新编辑器，保留所有标签页的结果
+        try:
+            pattern = compile_search_pattern(self.find_edit.text(), self.regex_checkbox.isChecked(),
+                                             self.case_sensitive_checkbox.isChecked())
+        except re.error:
+            return
+        self.search_current_editor(pattern)
+            
+    def on_matches_found(self, starts, ends):
+        """
+        追加后台查找送回的一批匹配项并刷新高亮
+
+        Args:
+            starts (array): 匹配起始位置
+            ends (array): 匹配结束位置
+        """
+        # 已取消的任务在取消前发出的信号可能仍在队列中
+        if self.sender() is not self.search_task:
+            return
+        self.matches.extend(starts, ends)
+        self.text_editor.set_search_matches(self.matches)
+        if not self.all_tabs_checkbox.isChecked():
+            self.status_label.setText(f"正在查找... 已找到 {len(self.matches)} 个匹配项")
+        
+    def on_search_finished(self, count):
+        """
+        后台查找完成
+
+        Args:
+            count (int): 匹配总数
+        """
+        if self.sender() is not self.search_task:
+            return
+        self.search_task = None
+        self.update_status()
+        
+    def on_search_failed(self, message):
+        """
+        后台查找超时或出错，清除不完整的高亮
+
+        Args:
+            message (str): 错误信息
+        """
+        if self.sender() is not self.search_task:
+            return
+        self.search_task = None
+        self.show_search_failure(message)
+        
+    def show_search_failure(self, message):
+        """
+        清除当前编辑器的高亮并显示查找失败的原因
+
+        Args:
+            message (str): 错误信息
+        """
+        self.matches = MatchIndex()
+        self.text_editor.set_search_matches(self.matches)
+        self.status_label.setText(message)
+            
+    def on_document_changed(self, position, chars_removed, chars_added):
+        """
+        文档内容变化后更新匹配索引：小范围编辑只重新查找变化所在的行；
+        大范围变化、可能跨行的表达式或后台查找尚未完成时推迟重新完整查找
+
+        Args:
+            position (int): 变化位置
+            chars_removed (int): 删除的字符数
+            chars_added (int): 插入的字符数
+        """
+        self._text_snapshot = None
+        if self.replace_edits is not None and self._replace_editor is self.text_editor:
+            # 全部替换期间高亮不随替换更新，替换结束后再处理
+            return
+        # 只处理本对话框设置的高亮，对话框关闭后不再响应
+        if self.text_editor.search_matches is not self.matches:
+            return
+        if (self.search_task is None and self.matches.incremental
+                and chars_removed + chars_added <= self.INCREMENTAL_LIMIT):
+            try:
+                self.matches.update_for_change(self.text_editor.document(), position,
+                                               chars_removed, chars_added, self.sandbox())
+            except RegexSandboxError as e:
+                self.show_search_failure(str(e))
+                return
+            self.update_status()
+        else:
+            self.cancel_search()
+            self.search_timer.start()
         
     def clear_highlights(self):
         """清除所有高亮"""
-        # 创建一个默认的QTextCharFormat来清除格式
-        default_format = QTextCharFormat()
-        # 用 QTextCursor 选中全文并重置格式，确保所有高亮都被清除
-        cursor = QTextCursor(self.text_editor.document())
-        cursor.select(QTextCursor.Document)
-        cursor.setCharFormat(default_format)
-        self.text_editor.viewport().update()
-        self.current_highlights.clear()
+        self.search_timer.stop()
+        self.cancel_search()
+        self.cancel_tab_searches()
+        self.text_editor.clear_search_matches()
+        self.matches = MatchIndex()
+        self._text_snapshot = None
+        self.results_model.clear()
         self.status_label.setText("已清除高亮")
 
-    def find_next(self, backward=False):
-        """查找下一个或上一个匹配项"""
+    def current_matches(self):
+        """
+        返回与当前查找内容和选项一致的完整匹配索引
+
+        实时查找仍在等待或尚未完成时，立即在主线程中查找一次（有索引时只查找候选文本块）。
+
+        Returns:
+            MatchIndex: 匹配索引，查找内容为空时返回 None
+
+        Raises:
+            re.error: 正则表达式无效
+            RegexSandboxError: 在工作进程中查找超时或失败
+        """
         find_text = self.find_edit.text()
         if not find_text:
-            return
-            
-        try:
-            cursor = self.text_editor.textCursor()
-            
-            if self.regex_checkbox.isChecked():
-                flags = re.IGNORECASE if not self.case_sensitive_checkbox.isChecked() else 0
-                pattern = re.compile(find_text, flags)
-                text = self.text_editor.toPlainText()
-                
-                matches = list(pattern.finditer(text))
-                if not matches:
-                    self.status_label.setText("未找到匹配项")
-                    return
-                
-                current_pos = cursor.position()
-                if backward:
-                    found = next((m for m in reversed(matches) if m.start() < cursor.selectionStart()), matches[-1])
+            return None
+        pattern = compile_search_pattern(find_text, self.regex_checkbox.isChecked(),
+                                         self.case_sensitive_checkbox.isChecked())
+        if (self.search_task is not None or self.search_timer.isActive()
+                or self.text_editor.search_matches is not self.matches
+                or not self.matches.matches_pattern(pattern)):
+            self.search_timer.stop()
+            self.cancel_search()
+            matches = self.indexed_matches(pattern)
+            if matches is None:
+                if self._text_snapshot is None:
+                    self._text_snapshot = self.text_editor.toPlainText()
+                if self.sandbox() is not None:
+                    matches = MatchIndex(pattern)
+                    matches.extend(*self.sandbox().spans(pattern, self._text_snapshot))
                 else:
-                    found = next((m for m in matches if m.start() > current_pos), matches[0])
-                    
-                cursor.setPosition(found.start())
-                cursor.setPosition(found.end(), QTextCursor.KeepAnchor)
-            else:
-                find_flags = QTextDocument.FindFlags()
-                if backward:
-                    find_flags |= QTextDocument.FindBackward
-                if self.case_sensitive_checkbox.isChecked():
-                    find_flags |= QTextDocument.FindCaseSensitively
-                
-                found_cursor = self.text_editor.document().find(find_text, cursor, find_flags)
-                if found_cursor.isNull():
-                    # 没找到，从头/尾开始重新查找
-                    start_cursor = QTextCursor(self.text_editor.document())
-                    start_cursor.movePosition(QTextCursor.End if backward else QTextCursor.Start)
-                    found_cursor = self.text_editor.document().find(find_text, start_cursor, find_flags)
-                
-                if found_cursor.isNull():
-                    self.status_label.setText("未找到匹配项")
-                    return
-                cursor = found_cursor
+                    matches = MatchIndex.from_pattern(pattern, self._text_snapshot)
+            self.matches = matches
+            self.text_editor.set_search_matches(self.matches)
+        return self.matches
 
-            self.text_editor.setTextCursor(cursor)
-            self.status_label.setText(f"找到匹配项于 {cursor.selectionStart()}-{cursor.selectionEnd()}")
-            
+    def find_next(self, backward=False):
+        """查找下一个或上一个匹配项，在匹配索引中二分查找，到达末尾时回绕"""
+        with PerfMonitor.action("find_next"):
+            self._find_next(backward)
+
+    def _find_next(self, backward):
+        """在匹配索引中二分查找下一个或上一个匹配项并选中"""
+        try:
+            matches = self.current_matches()
         except re.error as e:
             self.status_label.setText(f"正则表达式错误: {e}")
+            return
+        except RegexSandboxError as e:
+            self.show_search_failure(str(e))
+            return
+        if matches is None:
+            return
+            
+        cursor = self.text_editor.textCursor()
+        if backward:
+            index = matches.index_before(cursor.selectionStart())
+        else:
+            index = matches.index_after(cursor.selectionEnd())
+        if index < 0:
+            self.status_label.setText("未找到匹配项")
+            return
+            
+        start, end = matches.span(index)
+        cursor.setPosition(start)
+        cursor.setPosition(end, QTextCursor.KeepAnchor)
+        self.text_editor.setTextCursor(cursor)
+        self.status_label.setText(f"第 {index + 1} 个匹配项，共 {len(matches)} 个")
 
     def find_previous(self):
         """查找上一个匹配项"""
@@ -238,41 +706,359 @@ class FindReplaceDialog(QDialog):
         self.highlight_all_matches()
         
     def replace_all(self):
-        """替换所有匹配项"""
-        find_text = self.find_edit.text()
-        replace_text = self.replace_edit.text()
-        if not find_text:
+        """在后台计算当前文档所有匹配项的替换内容，分批按顺序应用"""
+        if self.all_tabs_checkbox.isChecked():
+            self.replace_all_tabs()
             return
-            
+        pattern = self.replace_pattern()
+        if pattern is None:
+            return
+        self.search_timer.stop()
+        self.cancel_search()
+        if self._text_snapshot is None:
+            self._text_snapshot = self.text_editor.toPlainText()
+        self.start_replace_all(pattern, None)
+        self.start_document_replace(self.text_editor, self._text_snapshot)
+
+    def replace_all_tabs(self):
+        """
+        在所有标签页中替换所有匹配项
+
+        逐个标签页按当前文档的方式在后台计算、分批应用，每个文档作为该文档的一次可撤销编辑；
+        尚未加载或已休眠的标签页在后台读取保存的文本，有匹配项时才创建编辑器。
+        停止或出错时只撤销正在替换的标签页，已完成的标签页保留，可以分别撤销。
+        """
+        pattern = self.replace_pattern()
+        if pattern is None:
+            return
+        self.search_timer.stop()
+        self.cancel_search()
+        self.cancel_tab_searches()
+        self.start_replace_all(pattern, list(self.tabs_provider()))
+        self.replace_next_tab()
+
+    def replace_pattern(self):
+        """
+        编译全部替换使用的表达式
+
+        Returns:
+            re.Pattern: 正则表达式；查找内容为空、正在替换或表达式无效时返回 None
+        """
+        find_text = self.find_edit.text()
+        if not find_text or self._replace_args is not None:
+            return None
         try:
-            text = self.text_editor.toPlainText()
-            
-            if self.regex_checkbox.isChecked():
-                flags = re.IGNORECASE if not self.case_sensitive_checkbox.isChecked() else 0
-                pattern = re.compile(find_text, flags)
-                new_text = pattern.sub(replace_text, text)
-            else:
-                if self.case_sensitive_checkbox.isChecked():
-                    new_text = text.replace(find_text, replace_text)
-                else:
-                    pattern = re.compile(re.escape(find_text), re.IGNORECASE)
-                    new_text = pattern.sub(replace_text, text)
-                    
-            cursor = self.text_editor.textCursor()
-            cursor.beginEditBlock()
-            cursor.select(QTextCursor.Document)
-            cursor.insertText(new_text)
-            cursor.endEditBlock()
-            
-            self.status_label.setText(f"已替换 {self.update_status()} 个匹配项")
-            self.highlight_all_matches()
-            
+            return compile_search_pattern(find_text, self.regex_checkbox.isChecked(),
+                                          self.case_sensitive_checkbox.isChecked())
         except re.error as e:
             self.status_label.setText(f"正则表达式错误: {e}")
-            
+            return None
+
+    def start_replace_all(self, pattern, tabs):
+        """
+        记录全部替换的参数并进入替换状态
+
+        Args:
+            pattern (re.Pattern): 正则表达式
+            tabs (list): 在所有标签页中替换时依次处理的标签页，只替换当前文档时为 None
+        """
+        self._replace_args = (pattern, self.replace_edit.text(), self.regex_checkbox.isChecked(),
+                              self.sandbox())
+        self._replace_tabs = tabs
+        self._replace_tab = None
+        self._replace_tab_count = 0
+        self._replace_total = 0
+        self.set_replace_running(True)
+        self.status_label.setText("正在替换...")
+
+    def start_document_replace(self, editor, text):
+        """
+        开始替换一个文档：在后台计算替换内容，主线程按顺序分批应用
+
+        Args:
+            editor (CodeEditor): 被替换的编辑器；为 None 时 text 是尚未创建编辑器的标签页
+                self._replace_tab 的文本读取函数，第一批替换送回时才创建编辑器
+            text (str or callable): 文档纯文本的快照，或在后台线程中返回快照的函数
+        """
+        self.replace_edits = None
+        self._replace_editor = None
+        self._replace_snapshot = None
+        self._replace_count = None
+        if editor is not None:
+            self.begin_replace_edits(editor, text)
+        pattern, replacement, use_regex, sandbox = self._replace_args
+        self.replace_task = ReplaceTask(pattern, text, replacement, use_regex, sandbox=sandbox)
+        self.replace_task.text_loaded.connect(self.on_replace_text_loaded)
+        self.replace_task.edits_found.connect(self.on_replace_edits_found)
+        self.replace_task.finished.connect(self.on_replace_finished)
+        self.replace_task.failed.connect(self.on_replace_failed)
+        self.replace_task.start()
+
+    def begin_replace_edits(self, editor, text):
+        """
+        准备在编辑器中按快照中的位置应用替换
+
+        Args:
+            editor (CodeEditor): 被替换的编辑器
+            text (str): 计算替换使用的快照，必须与编辑器中的文本相同
+        """
+        # 替换位置基于快照，替换期间禁止编辑文档
+        self._replace_editor = editor
+        self._replace_read_only = editor.isReadOnly()
+        editor.setReadOnly(True)
+        # 替换内容的总长度事先未知，按整个文档估计，超出撤销内存预算时先释放之前的历史
+        editor.undo_tracker.reserve(len(text))
+        self.replace_edits = OrderedEdits(editor.document())
+        self._replace_length = len(text)
+        # 其他来源的修改（例如重新加载文件）会让替换位置错位
+        editor.document().contentsChange.connect(self.on_replace_document_changed)
+
+    def replace_next_tab(self):
+        """开始替换下一个仍然打开的标签页，全部处理完后结束全部替换"""
+        tabs = self.tabs_provider()
+        while self._replace_tabs:
+            tab = self._replace_tabs.pop(0)
+            if tab not in tabs:
+                continue
+            self._replace_tab = tab
+            if tab.is_materialized():
+                self.start_document_replace(tab.editor, tab.get_text())
+            else:
+                self.start_document_replace(None, tab.text_loader())
+            return
+        self.finish_replace_all(self.replace_summary(), False)
+
+    def replace_summary(self):
+        """
+        返回在所有标签页中替换时已完成部分的说明
+
+        Returns:
+            str: 已完成的标签页数和替换数
+        """
+        return f"已在 {self._replace_tab_count} 个标签页中替换 {self._replace_total} 个匹配项"
+
+    def set_replace_running(self, running):
+        """
+        全部替换期间禁用替换按钮，启用停止按钮
+
+        Args:
+            running (bool): 是否正在替换
+        """
+        self.replace_button.setEnabled(not running)
+        self.replace_all_button.setEnabled(not running)
+        self.stop_button.setEnabled(running)
+
+    def on_replace_text_loaded(self, text):
+        """
+        记录尚未创建编辑器的标签页在后台取得的文本快照，创建编辑器时用于比较
+
+        Args:
+            text (str): 文本快照
+        """
+        if self.sender() is self.replace_task:
+            self._replace_snapshot = text
+
+    def on_replace_edits_found(self, starts, ends, replacements):
+        """
+        加入后台送回的一批替换，等待分批应用
+
+        Args:
+            starts (array): 快照中的起始位置
+            ends (array): 快照中的结束位置
+            replacements (list): 替换内容
+        """
+        if self.sender() is not self.replace_task:
+            return
+        if self.replace_edits is None and not self.materialize_replace_tab():
+            return
+        self.replace_edits.add(starts, ends, replacements)
+        if not self.replace_timer.isActive():
+            self.replace_timer.start()
+
+    def materialize_replace_tab(self):
+        """
+        第一批替换送回时创建正在处理的标签页的编辑器
+
+        编辑器中的文本与计算替换使用的快照不同时（例如文件在此期间被修改），
+        按编辑器中的文本重新计算；标签页已被关闭时跳到下一个标签页。
+
+        Returns:
+            bool: 是否可以应用这一批替换
+        """
+        tab = self._replace_tab
+        snapshot, self._replace_snapshot = self._replace_snapshot, None
+        if tab not in self.tabs_provider():
+            self.replace_task.cancel()
+            self.replace_task = None
+            self.replace_next_tab()
+            return False
+        editor = tab.ensure_editor()
+        text = editor.toPlainText()
+        if text != snapshot:
+            self.replace_task.cancel()
+            self.start_document_replace(editor, text)
+            return False
+        self.begin_replace_edits(editor, snapshot)
+        return True
+
+    def on_replace_finished(self, count):
+        """
+        后台计算完成，剩余的替换应用完后结束该文档的替换
+
+        Args:
+            count (int): 替换总数
+        """
+        if self.sender() is not self.replace_task:
+            return
+        self.replace_task = None
+        self._replace_count = count
+        if self.replace_edits is None:
+            # 尚未创建编辑器的标签页中没有匹配项
+            self.finish_document_replace()
+        elif not self.replace_timer.isActive():
+            self.apply_pending_replacements()
+
+    def on_replace_failed(self, message):
+        """
+        替换内容无效、超时或出错，撤销正在替换的文档中已应用的替换
+
+        Args:
+            message (str): 错误信息
+        """
+        if self.sender() is not self.replace_task:
+            return
+        self.revert_replace_all()
+        if self._replace_tabs is not None:
+            message = f"{self.replace_summary()}后停止：{message}"
+        self.finish_replace_all(message, True)
+
+    def on_replace_document_changed(self, position, chars_removed, chars_added):
+        """
+        被替换的文档在替换过程中被其他来源修改，替换位置会错位，只能停止
+
+        Args:
+            position (int): 变化位置
+            chars_removed (int): 删除的字符数
+            chars_added (int): 插入的字符数
+        """
+        if self._replace_applying or self.replace_edits is None:
+            return
+        message = f"文档在替换过程中被修改，已停止（已替换 {self.replace_edits.applied} 个匹配项）"
+        if self._replace_tabs is not None:
+            message = f"{self.replace_summary()}，{message}"
+        self.finish_replace_all(message, False)
+
+    def apply_pending_replacements(self):
+        """应用一批替换并显示进度，全部应用且后台计算完成后结束该文档的替换"""
+        edits = self.replace_edits
+        if edits is None:
+            return
+        self._replace_applying = True
+        try:
+            more = edits.apply(time.monotonic() + self.REPLACE_SLICE_MS / 1000)
+        finally:
+            self._replace_applying = False
+        if more:
+            self.replace_timer.start()
+        elif self._replace_count is not None:
+            self.finish_document_replace()
+            return
+        percent = edits.position * 100 // max(self._replace_length, 1)
+        progress = f"正在替换... 已替换 {edits.applied} 个匹配项（{percent}%）"
+        if self._replace_tabs is not None:
+            progress = f"{progress}，{self.replace_summary()}"
+        self.status_label.setText(progress)
+
+    def finish_document_replace(self):
+        """一个文档的替换已全部应用：在所有标签页中替换时继续下一个标签页，否则结束全部替换"""
+        if self._replace_tabs is None:
+            self.finish_replace_all(f"已替换 {self._replace_count} 个匹配项", False)
+            return
+        if self._replace_count:
+            self._replace_tab_count += 1
+            self._replace_total += self._replace_count
+        self.end_document_replace(False)
+        self.replace_next_tab()
+
+    def cancel_replace_all(self):
+        """停止正在执行的全部替换，并撤销正在替换的文档中已应用的部分"""
+        if self._replace_args is None:
+            return
+        self.revert_replace_all()
+        if self._replace_tabs is not None:
+            message = f"已停止全部替换，{self.replace_summary()}，其余标签页未修改"
+        else:
+            message = "已停止全部替换，文档未修改"
+        self.finish_replace_all(message, True)
+
+    def revert_replace_all(self):
+        """撤销正在替换的文档中已应用的替换"""
+        if self.replace_edits is None:
+            return
+        self._replace_applying = True
+        try:
+            self.replace_edits.revert()
+        except RuntimeError:
+            # 被替换的标签页已被关闭
+            pass
+        finally:
+            self._replace_applying = False
+
+    def end_document_replace(self, matches_valid):
+        """
+        结束正在替换的文档：停止后台计算并恢复编辑器
+
+        替换期间高亮没有随文档更新：文档已恢复原样时原有的匹配项仍然有效，
+        否则清除高亮，不再重新查找整个文档，下次查找时再重新建立。
+
+        Args:
+            matches_valid (bool): 文档是否与替换开始前相同
+        """
+        self.replace_timer.stop()
+        if self.replace_task is not None:
+            self.replace_task.cancel()
+            self.replace_task = None
+        self.replace_edits = None
+        self._replace_snapshot = None
+        editor, self._replace_editor = self._replace_editor, None
+        if editor is None:
+            return
+        try:
+            editor.document().contentsChange.disconnect(self.on_replace_document_changed)
+            editor.setReadOnly(self._replace_read_only)
+        except RuntimeError:
+            pass
+        if not matches_valid and editor is self.text_editor:
+            self.matches = MatchIndex()
+            self.text_editor.set_search_matches(self.matches)
+
+    def finish_replace_all(self, message, matches_valid):
+        """
+        结束全部替换，恢复编辑器并显示结果；在所有标签页中替换并修改了标签页时重新查找，更新各标签页的结果
+
+        Args:
+            message (str): 显示的信息
+            matches_valid (bool): 正在替换的文档是否与替换开始前相同
+        """
+        self.end_document_replace(matches_valid)
+        changed = self._replace_tabs is not None and (self._replace_tab_count or not matches_valid)
+        self._replace_args = None
+        self._replace_tabs = None
+        self._replace_tab = None
+        self.set_replace_running(False)
+        if changed:
+            self.highlight_all_matches()
+        self.status_label.setText(message)
+
     def update_status(self):
         """更新状态栏信息，并返回匹配数量"""
-        count = len(self.current_highlights)
+        if self.all_tabs_checkbox.isChecked():
+            count = self.results_model.total_matches()
+            groups = len(self.results_model.groups)
+            searching = "正在查找... " if self.tab_search_tasks else ""
+            self.status_label.setText(f"{searching}在 {groups} 个标签页中找到 {count} 个匹配项")
+            return count
+        count = len(self.matches)
         if count > 0:
             self.status_label.setText(f"找到 {count} 个匹配项")
         else:
@@ -280,6 +1066,10 @@ class FindReplaceDialog(QDialog):
         return count
 
     def closeEvent(self, event):
-        """重写关闭事件，确保清除高亮"""
+        """重写关闭事件，确保停止全部替换并清除高亮"""
+        self.cancel_replace_all()
         self.clear_highlights()
+        self._tab_texts = {}
+        if self.regex_sandbox is not None:
+            self.regex_sandbox.forget_texts()
         super().closeEvent(event) 
\ No newline at end of file
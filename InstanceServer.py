@@ -0,0 +1,138 @@
+"""
+实例服务模块
+
+第一个启动的实例监听 SingleInstance.server_address()，之后启动的进程通过它转交要打开的文件。
+消息为一行 UTF-8 编码的 JSON：{"files": [绝对路径, ...]}。
+"""
+
+import json
+import os
+import sys
+from PySide6.QtCore import QObject, Signal
+from PySide6.QtNetwork import QAbstractSocket, QLocalServer
+from SingleInstance import forward_files, server_address
+
+
+class InstanceServer(QObject):
+    """
+    接收其他进程转交的文件
+
+    每个连接读到换行符后解析消息并发出 files_received，然后断开连接。
+    """
+
+    # 其他进程要求打开文件，参数为文件路径列表（可能为空，表示只需切换到前台）
+    files_received = Signal(list)
+
+    # 地址被占用且交给已运行的实例失败时，删除失效的地址后重新监听的总次数
+    LISTEN_ATTEMPTS = 3
+
+    def __init__(self, parent=None):
+        """
+        初始化实例服务，调用 listen 后开始监听
+
+        Args:
+            parent (QObject): 父对象
+        """
+        super().__init__(parent)
+        self.server = QLocalServer(self)
+        # 只允许同一用户连接。其他系统上不设置该选项：设置时 Qt 先在临时目录中创建套接字再改名为
+        # 监听地址，会直接覆盖其他实例正在监听的套接字文件；改为由 _listen 在监听成功后限制访问权限
+        if sys.platform == 'win32':
+            self.server.setSocketOptions(QLocalServer.UserAccessOption)
+        self.server.newConnection.connect(self.on_new_connection)
+        # 各连接已收到、尚未组成完整消息的数据
+        self._buffers = {}
+        # listen 时发现其他实例已在监听，并已把文件交给了它
+        self.forwarded = False
+
+    def listen(self, file_paths=()):
+        """
+        开始监听
+
+        地址已被占用时，可能是同时启动的另一个进程在本进程检查过后刚开始监听，
+        也可能是上次异常退出留下的套接字文件。此时再次尝试把文件交给已运行的实例：
+        成功时设置 forwarded，调用者应直接退出；只有连接被拒绝（确实没有进程在监听）时
+        才删除套接字文件后重新监听，不会删除其他实例正在使用的地址。
+
+        Args:
+            file_paths (list): 本进程要打开的文件，地址已被占用时交给已运行的实例
+
+        Returns:
+            bool: 是否监听成功；失败时本实例仍可正常使用，只是不能接收其他进程转交的文件
+        """
+        address = server_address()
+        for _attempt in range(self.LISTEN_ATTEMPTS):
+            if self._listen(address):
+                return True
+            if self.server.serverError() != QAbstractSocket.AddressInUseError:
+                return False
+            try:
+                forward_files(file_paths)
+            except ConnectionRefusedError:
+                QLocalServer.removeServer(address)
+            except FileNotFoundError:
+                # 监听的实例在此期间已经退出
+                pass
+            except OSError:
+                return False
+            else:
+                self.forwarded = True
+                return False
+        return False
+
+    def _listen(self, address):
+        """
+        在地址上监听，其他系统上监听成功后只允许当前用户访问套接字文件
+
+        Returns:
+            bool: 是否监听成功
+        """
+        if not self.server.listen(address):
+            return False
+        if sys.platform != 'win32':
+            try:
+                os.chmod(self.server.fullServerName(), 0o600)
+            except OSError:
+                pass
+        return True
+
+    def on_new_connection(self):
+        """接受新连接"""
+        while self.server.hasPendingConnections():
+            connection = self.server.nextPendingConnection()
+            self._buffers[connection] = b''
+            connection.readyRead.connect(lambda connection=connection: self.on_ready_read(connection))
+            connection.disconnected.connect(lambda connection=connection: self.on_disconnected(connection))
+
+    def on_ready_read(self, connection):
+        """
+        读取数据，收到完整的一行后处理消息
+
+        Args:
+            connection (QLocalSocket): 连接
+        """
+        if connection not in self._buffers:
+            return
+        data = self._buffers[connection] + connection.readAll().data()
+        if b'\n' not in data:
+            self._buffers[connection] = data
+            return
+        del self._buffers[connection]
+        connection.disconnectFromServer()
+        try:
+            files = json.loads(data.split(b'\n', 1)[0].decode('utf-8'))['files']
+        except (ValueError, KeyError, TypeError):
+            return
+        self.files_received.emit([path for path in files if isinstance(path, str)])
+
+    def on_disconnected(self, connection):
+        """
+        连接断开后释放连接，断开前已收到的数据仍会先被读取
+
+        Args:
+            connection (QLocalSocket): 连接
+        """
+        if connection in self._buffers and connection.bytesAvailable():
+            self.on_ready_read(connection)
+        self._buffers.pop(connection, None)
+        connection.deleteLater()
@@ -0,0 +1,408 @@
+"""
+性能监视模块
+
+记录编辑器热点路径（语法高亮、绘制、空白字符叠加、行号区域、工具命令）和按键到绘制的耗时，
+在窗口右上角的面板中显示最近若干次的 p50/p95/最大值，并可以导出 Chrome/Perfetto 跟踪文件
+（在 chrome://tracing 或 https://ui.perfetto.dev 中打开）。
+还可以用 cProfile 分析下一个执行的命令（profile_next_action），
+或用 tracemalloc 记录每个命令前后 Python 内存分配的变化（set_memory_tracing）。
+
+默认关闭。关闭时热点路径只多一次 PerfMonitor.enabled 的判断，不取时间也不记录。
+"""
+
+import io
+import json
+import os
+import threading
+import time
+from collections import deque
+from PySide6.QtWidgets import QLabel
+from PySide6.QtGui import QFont
+from PySide6.QtCore import Qt, QTimer
+
+# 是否记录，热点路径在取时间之前先判断该标志
+enabled = False
+# 最近一次打开记录的时间，早于该时间开始的区间不计入统计
+enabled_since = 0.0
+# 界面线程正在执行的命令名称，不论是否打开记录都会更新，卡顿监视（StallWatchdog）在界面卡住时读取
+current_action = None
+# 等待分析的下一个命令：(保存目录, 完成时的回调)，见 profile_next_action
+_profile_request = None
+# 分析摘要中列出的函数个数
+PROFILE_SUMMARY_LINES = 30
+# 是否记录每个命令的 Python 内存分配，见 set_memory_tracing
+memory_tracing = False
+# 最近命令的 Python 内存分配：(命令名称, 结束时的增量, 执行期间的峰值增量)，单位字节
+_memory_deltas = deque(maxlen=50)
+
+# 每项统计保留的最近耗时个数
+WINDOW_SIZE = 500
+# 跟踪文件最多保留的事件个数，超过后丢弃最早的事件
+MAX_TRACE_EVENTS = 200000
+
+# 计时起点，跟踪事件的时间戳相对于该时间
+_origin = time.perf_counter()
+# 各项最近的耗时（秒）：{名称: deque}
+_samples = {}
+# 跟踪事件：(名称, 开始时间, 结束时间, 线程ID)
+_events = deque(maxlen=MAX_TRACE_EVENTS)
+
+
+def set_enabled(value):
+    """
+    打开或关闭记录，打开时清空之前的统计和跟踪事件
+
+    Args:
+        value (bool): 是否记录
+    """
+    global enabled, enabled_since
+    if value and not enabled:
+        _samples.clear()
+        _events.clear()
+        enabled_since = time.perf_counter()
+    enabled = value
+
+
+def record(name, started):
+    """
+    记录一次耗时，结束时间为调用时刻
+
+    调用方应在 enabled 为 True 时才取开始时间并调用本函数。
+
+    Args:
+        name (str): 统计项名称
+        started (float): 开始时的 time.perf_counter()
+    """
+    ended = time.perf_counter()
+    if started < enabled_since:
+        return
+    samples = _samples.get(name)
+    if samples is None:
+        samples = _samples[name] = deque(maxlen=WINDOW_SIZE)
+    samples.append(ended - started)
+    _events.append((name, started, ended, threading.get_ident()))
+
+
+class _Measure:
+    """记录 with 语句块耗时的上下文管理器"""
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        record(self.name, self.started)
+        return False
+
+
+class _NullMeasure:
+    """关闭记录时使用的空上下文管理器"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_MEASURE = _NullMeasure()
+
+
+def measure(name):
+    """
+    返回记录 with 语句块耗时的上下文管理器，关闭记录时返回共享的空上下文管理器
+
+    Args:
+        name (str): 统计项名称
+
+    Returns:
+        上下文管理器
+    """
+    return _Measure(name) if enabled else _NULL_MEASURE
+
+
+class _Action:
+    """标记界面线程正在执行的命令的上下文管理器，打开记录时同时统计耗时"""
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        global current_action, _profile_request
+        self.previous, current_action = current_action, self.name
+        self.started = time.perf_counter() if enabled else None
+        self.profiler = None
+        self.memory_before = None
+        # 嵌套的命令包含在外层命令的内存统计和分析中
+        if memory_tracing and self.previous is None:
+            import tracemalloc
+            self.memory_before = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        if _profile_request is not None and self.previous is None:
+            # 只在分析时才导入 cProfile
+            import cProfile
+            self.profile_request, _profile_request = _profile_request, None
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        return self
+
+    def __exit__(self, *exc_info):
+        global current_action
+        current_action = self.previous
+        if self.started is not None:
+            record(self.name, self.started)
+        if self.memory_before is not None and memory_tracing:
+            import tracemalloc
+            current, peak = tracemalloc.get_traced_memory()
+            _memory_deltas.append((self.name, current - self.memory_before, peak - self.memory_before))
+        if self.profiler is not None:
+            self.profiler.disable()
+            directory, on_finished = self.profile_request
+            on_finished(self.name, *_save_profile(self.name, self.profiler, directory))
+        return False
+
+
+def action(name):
+    """
+    返回标记正在执行的命令的上下文管理器
+
+    与 measure 不同，不论是否打开记录都会设置 current_action，只用于命令级别的操作，不要用在热点路径上。
+
+    Args:
+        name (str): 命令名称，同时作为统计项名称
+
+    Returns:
+        上下文管理器
+    """
+    return _Action(name)
+
+
+def profile_next_action(directory, on_finished):
+    """
+    用 cProfile 分析下一个执行的命令（用 action 或 timed 标记的命令）
+
+    命令结束后在目录中保存 <时间>-<命令>.prof（pstats 格式，可用 snakeviz、flameprof 等工具查看或生成火焰图）
+    和同名的 .txt 摘要（按累计时间排列的函数），然后在界面线程中调用 on_finished(命令名称, prof文件路径, 摘要)；
+    保存失败时 prof 文件路径为 None，摘要为错误信息。
+    cProfile 只分析界面线程，命令交给后台线程执行的部分不在结果中。
+
+    Args:
+        directory (str): 保存目录
+        on_finished (callable): 分析完成时的回调
+    """
+    global _profile_request
+    _profile_request = (directory, on_finished)
+
+
+def cancel_profile():
+    """取消尚未开始的分析"""
+    global _profile_request
+    _profile_request = None
+
+
+def _save_profile(name, profiler, directory):
+    """
+    保存分析结果和摘要
+
+    Args:
+        name (str): 命令名称
+        profiler (cProfile.Profile): 已停止的分析器
+        directory (str): 保存目录
+
+    Returns:
+        tuple: (prof文件路径, 摘要)，保存失败时为 (None, 错误信息)
+    """
+    import pstats
+    stream = io.StringIO()
+    stats = pstats.Stats(profiler, stream=stream)
+    base = os.path.join(directory, f"{time.strftime('%Y%m%d-%H%M%S')}-{name}")
+    try:
+        # 先保存带完整路径的结果，摘要中只显示文件名
+        stats.dump_stats(base + '.prof')
+        stats.strip_dirs().sort_stats(pstats.SortKey.CUMULATIVE).print_stats(PROFILE_SUMMARY_LINES)
+        summary = stream.getvalue()
+        with open(base + '.txt', 'w', encoding='utf-8') as f:
+            f.write(summary)
+    except OSError as e:
+        return None, f"保存分析结果失败: {e}"
+    return base + '.prof', summary
+
+
+def set_memory_tracing(value):
+    """
+    打开或关闭 Python 内存分配跟踪（tracemalloc）
+
+    跟踪期间所有 Python 内存分配都会变慢，只在排查内存增长时打开。
+
+    Args:
+        value (bool): 是否跟踪
+    """
+    global memory_tracing
+    # 只在需要时才导入 tracemalloc
+    import tracemalloc
+    if value and not tracemalloc.is_tracing():
+        tracemalloc.start()
+        _memory_deltas.clear()
+    elif not value and tracemalloc.is_tracing():
+        tracemalloc.stop()
+    memory_tracing = value
+
+
+def memory_deltas():
+    """
+    Returns:
+        list: 最近命令的 Python 内存分配 [(命令名称, 结束时的增量, 峰值增量), ...]，最近的在前
+    """
+    return list(reversed(_memory_deltas))
+
+
+def top_allocations(limit=10):
+    """
+    统计当前仍存活的 Python 内存分配最多的代码行
+
+    需要对所有跟踪的分配做快照，只在用户刷新时调用。
+
+    Args:
+        limit (int): 返回的行数
+
+    Returns:
+        list: [(文件名:行号, 字节数, 分配次数), ...]，未打开跟踪时返回空列表
+    """
+    if not memory_tracing:
+        return []
+    import tracemalloc
+    statistics = tracemalloc.take_snapshot().statistics('lineno')
+    return [(f"{os.path.basename(stat.traceback[0].filename)}:{stat.traceback[0].lineno}", stat.size, stat.count)
+            for stat in statistics[:limit]]
+
+
+def timed(name, func):
+    """
+    包装无参数的命令（例如菜单项的槽函数），执行时标记为正在执行的命令，打开记录时统计其耗时
+
+    Args:
+        name (str): 命令名称
+        func (callable): 命令
+
+    Returns:
+        callable: 包装后的命令
+    """
+    def run():
+        with action(name):
+            return func()
+    return run
+
+
+def _percentile(ordered, fraction):
+    """返回已排序列表中指定分位的值"""
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+def summary():
+    """
+    汇总各项最近的耗时
+
+    Returns:
+        list: [(名称, 次数, p50毫秒, p95毫秒, 最大毫秒), ...]，按 p95 从大到小排列
+    """
+    rows = []
+    for name, samples in list(_samples.items()):
+        ordered = sorted(samples)
+        if not ordered:
+            continue
+        rows.append((name, len(ordered), _percentile(ordered, 0.5) * 1000,
+                     _percentile(ordered, 0.95) * 1000, ordered[-1] * 1000))
+    rows.sort(key=lambda row: row[3], reverse=True)
+    return rows
+
+
+def event_count():
+    """
+    Returns:
+        int: 已记录的跟踪事件个数
+    """
+    return len(_events)
+
+
+def export_trace(file_path):
+    """
+    把记录的事件导出为 Chrome 跟踪事件格式（JSON）
+
+    Args:
+        file_path (str): 保存路径
+
+    Returns:
+        int: 导出的事件个数
+
+    Raises:
+        OSError: 写入文件失败
+    """
+    pid = os.getpid()
+    trace_events = [
+        {'name': name, 'cat': 'editor', 'ph': 'X', 'pid': pid, 'tid': tid,
+         'ts': round((started - _origin) * 1e6, 1), 'dur': round((ended - started) * 1e6, 1)}
+        for name, started, ended, tid in list(_events)
+    ]
+    with open(file_path, 'w', encoding='utf-8') as f:
+        json.dump({'traceEvents': trace_events, 'displayTimeUnit': 'ms'}, f)
+    return len(trace_events)
+
+
+class PerfHud(QLabel):
+    """
+    性能面板，浮在父窗口中央区域的右上角，定时刷新各项耗时统计
+
+    面板不接收鼠标事件，不影响下面的编辑器操作。
+    """
+
+    REFRESH_INTERVAL_MS = 500
+    MARGIN = 8
+
+    def __init__(self, parent):
+        """
+        初始化性能面板（初始隐藏）
+
+        Args:
+            parent (QMainWindow): 主窗口
+        """
+        super().__init__(parent)
+        self.setAttribute(Qt.WA_TransparentForMouseEvents)
+        self.setTextFormat(Qt.PlainText)
+        self.setFont(QFont("Consolas", 9))
+        self.setStyleSheet("background-color: rgba(32, 32, 32, 200); color: #e0e0e0; padding: 6px;")
+        self.timer = QTimer(self)
+        self.timer.setInterval(self.REFRESH_INTERVAL_MS)
+        self.timer.timeout.connect(self.refresh)
+        self.hide()
+
+    def set_active(self, active):
+        """
+        显示或隐藏面板，同时打开或关闭记录
+
+        Args:
+            active (bool): 是否显示
+        """
+        set_enabled(active)
+        if active:
+            self.refresh()
+            self.show()
+            self.raise_()
+            self.timer.start()
+        else:
+            self.timer.stop()
+            self.hide()
+
+    def refresh(self):
+        """刷新统计并移动到父窗口中央区域的右上角"""
+        lines = [f"{'':<32} {'次数':>5} {'p50':>8} {'p95':>8} {'最大':>6}"]
+        for name, count, p50, p95, maximum in summary():
+            lines.append(f"{name:<32} {count:>7} {p50:>6.2f}ms {p95:>6.2f}ms {maximum:>6.2f}ms")
+        if len(lines) == 1:
+            lines.append("（尚无记录）")
+        self.setText("\n".join(lines))
+        self.adjustSize()
+        area = self.parentWidget().centralWidget().geometry()
+        self.move(area.right() - self.width() - self.MARGIN, area.top() + self.MARGIN)
@@ -0,0 +1,657 @@
+"""
+正则表达式沙箱模块
+
+Python 的 re 在匹配过程中不释放 GIL，也不能被中断，存在灾难性回溯的表达式即使在后台线程中
+执行也会让界面失去响应。本模块把正则表达式放到独立的工作进程中执行：
+工作进程按固定间隔报告进展（不跨行的表达式按行分段扫描，没有匹配项时也能报告），
+超过 timeout 秒没有进展时结束该进程，调用方得到 RegexTimeout 而不是卡死。
+工作进程缓存编译后的表达式和最近一次收到的不太长的文本，对同一文本重复查找时不必再次传输。
+
+本模块只依赖标准库，工作进程启动时不需要导入 Qt。
+"""
+
+import multiprocessing
+import re
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from re import _parser as sre_parse
+
+# 工作进程报告进展（一批匹配项或替换数量）的间隔（秒）
+PROGRESS_INTERVAL = 0.05
+# 工作进程缓存的编译后表达式数量
+PATTERN_CACHE_SIZE = 64
+# 取消后等待工作进程停止的时间（秒），超过后直接结束进程
+CANCEL_GRACE = 0.2
+# 不跨行的表达式按行对齐分段扫描，每段至少这么多字符，每段之后检查时间并报告进展
+SCAN_CHUNK = 64 * 1024
+# 工作进程在请求之间保留的文本的最大字符数，更长的文本用完即释放，下次请求重新传输
+TEXT_CACHE_LIMIT = 1024 * 1024
+# 跨行的表达式不能分段扫描，匹配项很少时整个扫描期间都没有进展；
+# 按这个最慢的正常扫描速度（字符/秒）为文本长度额外留出时间，再判断为没有进展
+MIN_SCAN_RATE = 2 * 1024 * 1024
+
+
+# 不能匹配换行符的字符类别（\d、\S、\w），其他类别（\s、\D、\W）都能匹配换行符
+_LINE_CATEGORIES = {sre_parse.CATEGORY_DIGIT, sre_parse.CATEGORY_NOT_SPACE, sre_parse.CATEGORY_WORD}
+# 不依赖行以外文本的位置断言（单词边界）；其他断言（^ $ \A \Z）依赖整个文本的开头结尾
+_LOCAL_AT_CODES = {sre_parse.AT_BOUNDARY, sre_parse.AT_NON_BOUNDARY}
+_NEWLINE = ord('\n')
+
+
+def _set_matches_newline(items):
+    """
+    判断字符集（IN 节点的内容）能否匹配换行符
+
+    Returns:
+        bool: 能匹配或无法判断时返回 True
+    """
+    negate = bool(items) and items[0][0] is sre_parse.NEGATE
+    contains = False
+    for op, value in items[1:] if negate else items:
+        if op is sre_parse.LITERAL:
+            contains = value == _NEWLINE
+        elif op is sre_parse.RANGE:
+            contains = value[0] <= _NEWLINE <= value[1]
+        elif op is sre_parse.CATEGORY:
+            contains = value not in _LINE_CATEGORIES
+        else:
+            # 无法判断的写法按能匹配处理
+            return True
+        if contains:
+            break
+    return contains != negate
+
+
+def _is_local_subpattern(subpattern, dotall):
+    """
+    判断解析后的表达式是否只在一行之内匹配
+
+    Args:
+        subpattern: sre_parse 解析结果（或其中的节点列表）
+        dotall (bool): 当前 . 是否匹配换行符
+
+    Returns:
+        bool: 不能匹配换行符、不含行以外的断言时返回 True；遇到无法判断的节点返回 False
+    """
+    for op, value in subpattern:
+        if op is sre_parse.LITERAL:
+            if value == _NEWLINE:
+                return False
+        elif op is sre_parse.NOT_LITERAL:
+            if value != _NEWLINE:
+                return False
+        elif op is sre_parse.ANY:
+            if dotall:
+                return False
+        elif op is sre_parse.IN:
+            if _set_matches_newline(value):
+                return False
+        elif op is sre_parse.CATEGORY:
+            if value not in _LINE_CATEGORIES:
+                return False
+        elif op is sre_parse.AT:
+            if value not in _LOCAL_AT_CODES:
+                return False
+        elif op in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT, sre_parse.POSSESSIVE_REPEAT):
+            if not _is_local_subpattern(value[2], dotall):
+                return False
+        elif op is sre_parse.SUBPATTERN:
+            _group, add_flags, del_flags, child = value
+            child_dotall = (dotall or bool(add_flags & re.DOTALL)) and not del_flags & re.DOTALL
+            if not _is_local_subpattern(child, child_dotall):
+                return False
+        elif op is sre_parse.ATOMIC_GROUP:
+            if not _is_local_subpattern(value, dotall):
+                return False
+        elif op is sre_parse.BRANCH:
+            if not all(_is_local_subpattern(branch, dotall) for branch in value[1]):
+                return False
+        elif op in (sre_parse.ASSERT, sre_parse.ASSERT_NOT):
+            # 向后断言在行首会看到上一行的内容
+            if value[0] < 0 or not _is_local_subpattern(value[1], dotall):
+                return False
+        elif op is sre_parse.GROUPREF_EXISTS:
+            _group, yes, no = value
+            if not _is_local_subpattern(yes, dotall) or (no is not None and not _is_local_subpattern(no, dotall)):
+                return False
+        elif op is not sre_parse.GROUPREF:
+            # 反向引用与所引用的分组匹配相同的文本，分组本身已经检查；其他节点无法判断
+            return False
+    return True
+
+
+def is_line_local(pattern):
+    """
+    判断正则表达式的匹配是否不会跨行，也不依赖行以外的文本
+
+    根据解析后的表达式判断，字符集、转义（\\x0a、\\N{LINE FEED} 等）和作用域标志都按实际含义处理；
+    无法解析或遇到无法判断的写法时返回 False，只会多做一次完整查找。
+
+    Args:
+        pattern (re.Pattern): 正则表达式
+
+    Returns:
+        bool: 是否可以只在变化所在的行重新查找，或者按行分段查找
+    """
+    try:
+        parsed = sre_parse.parse(pattern.pattern, pattern.flags)
+    except (re.error, TypeError):
+        return False
+    return _is_local_subpattern(parsed, bool(parsed.state.flags & re.DOTALL))
+
+
+class RegexSandboxError(Exception):
+    """正则表达式沙箱执行失败"""
+
+
+class RegexTimeout(RegexSandboxError):
+    """正则表达式执行超时"""
+
+    def __init__(self, timeout):
+        super().__init__(f"正则表达式超过 {timeout:g} 秒没有进展，已停止。"
+                         f"表达式可能存在灾难性回溯（例如嵌套的重复），请修改后重试")
+        self.timeout = timeout
+
+
+class _Cancelled(Exception):
+    """工作进程中的请求被取消"""
+
+
+def _compile_cached(cache, pattern_text, flags):
+    """从缓存中取得编译后的表达式及其是否不跨行，按最近使用淘汰"""
+    key = (pattern_text, flags)
+    entry = cache.get(key)
+    if entry is None:
+        pattern = re.compile(pattern_text, flags)
+        entry = (pattern, is_line_local(pattern))
+        cache[key] = entry
+        if len(cache) > PATTERN_CACHE_SIZE:
+            cache.popitem(last=False)
+    else:
+        cache.move_to_end(key)
+    return entry
+
+
+def _worker_main(connection, cancel_flag):
+    """
+    工作进程主循环
+
+    启动后先发送 ('ready',)。
+    请求为 (操作, 表达式, 标志, 文本, 参数)，文本为 None 时使用上一次收到的文本。
+    回复为若干 ('batch', 起始位置, 结束位置)、('edits', 起始位置, 结束位置, 替换内容) 或 ('progress', 已扫描的位置)，
+    最后是 ('done', 结果)、('cancelled',) 或 ('error', 信息) 之一。
+    超过 TEXT_CACHE_LIMIT 的文本在请求完成后释放。
+    """
+    cache = OrderedDict()
+    text = ''
+    connection.send(('ready',))
+    while True:
+        try:
+            operation, pattern_text, flags, new_text, argument = connection.recv()
+        except EOFError:
+            return
+        if new_text is not None:
+            text = new_text
+        try:
+            pattern, line_local = _compile_cached(cache, pattern_text, flags)
+            progress = _Progress(connection, cancel_flag)
+            if operation == 'spans':
+                result = _worker_spans(progress, pattern, line_local, [(0, text)])
+            elif operation == 'regions':
+                result = _worker_spans(progress, pattern, line_local, argument)
+            elif operation == 'subn':
+                result = _worker_subn(progress, pattern, line_local, text, *argument)
+            elif operation == 'replacements':
+                result = _worker_replacements(progress, pattern, line_local, text, *argument)
+            else:
+                match = pattern.match(text, argument)
+                result = match.end() if match is not None else None
+        except _Cancelled:
+            connection.send(('cancelled',))
+        except (re.error, IndexError) as e:
+            connection.send(('error', str(e)))
+        else:
+            connection.send(('done', result))
+        if len(text) > TEXT_CACHE_LIMIT:
+            text = ''
+
+
+class _Progress:
+    """
+    工作进程中按 PROGRESS_INTERVAL 检查取消并报告进展
+
+    flush 为发送已积累结果的函数，返回是否发送了消息；没有可发送的结果时发送 ('progress', 已扫描的位置)，
+    没有匹配项的长时间扫描也能让调用方知道仍在进展。
+    """
+
+    def __init__(self, connection, cancel_flag):
+        self.connection = connection
+        self.cancel_flag = cancel_flag
+        self.flush = None
+        self.next_report = time.monotonic() + PROGRESS_INTERVAL
+
+    def __call__(self, position):
+        """
+        检查是否到了报告的时间
+
+        Args:
+            position (int): 已扫描到的文本位置
+
+        Raises:
+            _Cancelled: 请求已被取消
+        """
+        if time.monotonic() < self.next_report:
+            return
+        if self.cancel_flag.value:
+            raise _Cancelled()
+        if self.flush is None or not self.flush():
+            self.connection.send(('progress', position))
+        self.next_report = time.monotonic() + PROGRESS_INTERVAL
+
+
+def _scan(pattern, line_local, text, progress):
+    """
+    依次产生文本中的所有匹配项，与 pattern.finditer(text) 相同
+
+    不跨行的表达式按行对齐分成至少 SCAN_CHUNK 个字符的段，用 finditer(text, 起始位置, 结束位置) 查找，
+    每段之后调用 progress，匹配项很少时也能按时报告进展；段的结束位置在换行符之后，
+    不跨行的表达式在段内的匹配与整个文本中相同。其他表达式只能在每个匹配项之后报告。
+
+    Args:
+        pattern (re.Pattern): 正则表达式
+        line_local (bool): 表达式是否不跨行（is_line_local）
+        text (str): 文本
+        progress (_Progress): 报告进展的函数
+    """
+    length = len(text)
+    if not line_local or length <= SCAN_CHUNK:
+        for match in pattern.finditer(text):
+            yield match
+            progress(match.end())
+        return
+    position = 0
+    while position < length:
+        end = text.find('\n', position + SCAN_CHUNK)
+        end = length if end < 0 else end + 1
+        for match in pattern.finditer(text, position, end):
+            if match.start() == end and end < length:
+                # 段末尾的空匹配由下一段产生，避免重复
+                break
+            yield match
+            progress(match.end())
+        progress(end)
+        position = end
+
+
+def _worker_spans(progress, pattern, line_local, regions):
+    """
+    在每个 (起始位置, 文本) 区域中查找所有长度不为0的匹配项，位置加上区域的起始位置，
+    按间隔分批发送，返回匹配总数
+    """
+    starts, ends = array('q'), array('q')
+    count = 0
+
+    def flush():
+        nonlocal starts, ends, count
+        if not starts:
+            return False
+        count += len(starts)
+        progress.connection.send(('batch', starts, ends))
+        starts, ends = array('q'), array('q')
+        return True
+
+    progress.flush = flush
+    for offset, text in regions:
+        for match in _scan(pattern, line_local, text, progress):
+            start, end = match.span()
+            if end > start:
+                starts.append(offset + start)
+                ends.append(offset + end)
+    flush()
+    return count
+
+
+def _worker_subn(progress, pattern, line_local, text, replacement, use_regex):
+    """替换所有匹配项，按间隔报告进展，返回 (替换后的文本, 替换数量)，与 pattern.subn 相同"""
+    if use_regex:
+        # 先检查替换内容中的反向引用，与 re.sub 一致，没有匹配项时也报告错误
+        pattern.sub(replacement, '')
+    pieces = []
+    count = 0
+    last = 0
+    for match in _scan(pattern, line_local, text, progress):
+        start, end = match.span()
+        pieces.append(text[last:start])
+        pieces.append(match.expand(replacement) if use_regex else replacement)
+        last = end
+        count += 1
+    pieces.append(text[last:])
+    return ''.join(pieces), count
+
+
+def _worker_replacements(progress, pattern, line_local, text, replacement, use_regex):
+    """计算所有匹配项的替换内容，按间隔分批发送 (起始位置, 结束位置, 替换内容)，返回替换数量"""
+    if use_regex:
+        # 与 _worker_subn 相同，先检查替换内容中的反向引用
+        pattern.sub(replacement, '')
+    starts, ends, replacements = array('q'), array('q'), []
+    count = 0
+
+    def flush():
+        nonlocal starts, ends, replacements, count
+        if not starts:
+            return False
+        count += len(starts)
+        progress.connection.send(('edits', starts, ends, replacements))
+        starts, ends, replacements = array('q'), array('q'), []
+        return True
+
+    progress.flush = flush
+    for match in _scan(pattern, line_local, text, progress):
+        starts.append(match.start())
+        ends.append(match.end())
+        replacements.append(match.expand(replacement) if use_regex else replacement)
+    flush()
+    return count
+
+
+class _Worker:
+    """一个工作进程及其连接"""
+
+    def __init__(self, context):
+        self.connection, child_connection = context.Pipe()
+        self.cancel_flag = context.Value('b', 0, lock=False)
+        self.process = context.Process(target=_worker_main, args=(child_connection, self.cancel_flag),
+                                       daemon=True)
+        self.process.start()
+        child_connection.close()
+        # 工作进程中保存的文本，用于判断是否需要重新传输
+        self.text = None
+
+    def kill(self):
+        """结束工作进程"""
+        self.process.kill()
+        self.process.join()
+        self.connection.close()
+
+
+class RegexSandbox:
+    """
+    在工作进程中执行正则表达式
+
+    可以被多个线程同时使用，每个请求占用一个空闲的工作进程。后台线程的请求最多同时占用
+    MAX_WORKERS 个，超过时等待其他请求完成；界面线程的同步请求（输入时的增量查找、查找下一个等）
+    使用另外保留的一个工作进程，不会排在后台查找之后等待。
+    timeout 为允许工作进程没有进展的最长时间（秒），可以随时修改；跨行的表达式按文本长度另外留出扫描时间（见 MIN_SCAN_RATE）。
+    """
+
+    DEFAULT_TIMEOUT = 2.0
+    MAX_WORKERS = 3
+
+    def __init__(self, timeout=DEFAULT_TIMEOUT):
+        """
+        初始化沙箱，工作进程在第一次使用时才启动
+
+        Args:
+            timeout (float): 允许没有进展的最长时间（秒）
+        """
+        self.timeout = timeout
+        # 不使用 fork：在已启动 Qt 和多个线程的进程中 fork 不安全
+        self._context = multiprocessing.get_context('spawn')
+        self._condition = threading.Condition()
+        self._idle_workers = []
+        # 后台线程的请求正在占用的工作进程数
+        self._background_busy = 0
+        # 为界面线程保留的空闲工作进程，后台线程不会使用
+        self._interactive_worker = None
+        self._closed = False
+
+    def _acquire(self, interactive):
+        """
+        取得一个空闲的工作进程，没有时启动新的进程；后台线程的请求已占用 MAX_WORKERS 个时等待
+
+        Args:
+            interactive (bool): 是否为界面线程的请求，使用保留的工作进程（界面线程同一时间只有一个请求）
+        """
+        with self._condition:
+            if interactive:
+                worker, self._interactive_worker = self._interactive_worker, None
+                if worker is not None:
+                    return worker
+            else:
+                while self._background_busy >= self.MAX_WORKERS:
+                    self._condition.wait()
+                self._background_busy += 1
+                if self._idle_workers:
+                    return self._idle_workers.pop()
+        try:
+            return _Worker(self._context)
+        except Exception:
+            self._release(None, False, interactive)
+            raise
+
+    def _release(self, worker, reusable, interactive):
+        """归还工作进程，不可复用（已超时、已取消或已关闭）时结束它"""
+        with self._condition:
+            if reusable and not self._closed:
+                if interactive:
+                    self._interactive_worker = worker
+                else:
+                    self._idle_workers.append(worker)
+                worker = None
+            if not interactive:
+                self._background_busy -= 1
+                self._condition.notify()
+        if worker is not None:
+            worker.kill()
+
+    def _call(self, operation, pattern, text, argument=None, on_message=None, cancelled=None):
+        """
+        在工作进程中执行一个请求
+
+        Args:
+            operation (str): 操作
+            pattern (re.Pattern): 正则表达式
+            text (str): 文本，为 None 时操作不使用文本，工作进程中保存的文本不变
+            argument: 操作的参数
+            on_message (callable): 处理进展消息的函数
+            cancelled (callable): 返回是否已取消的函数
+
+        Returns:
+            请求的结果，被取消时返回 None
+
+        Raises:
+            RegexTimeout: 超过 timeout 秒没有进展
+            RegexSandboxError: 工作进程意外退出
+            re.error: 表达式或替换内容无效
+        """
+        interactive = threading.current_thread() is threading.main_thread()
+        worker = self._acquire(interactive)
+        reusable = False
+        try:
+            worker.cancel_flag.value = 0
+            worker.connection.send((operation, pattern.pattern, pattern.flags,
+                                    None if text is None or text is worker.text else text, argument))
+            if text is not None:
+                # 与工作进程一致，只记住不超过 TEXT_CACHE_LIMIT 的文本，长文本下次重新传输
+                worker.text = text if len(text) <= TEXT_CACHE_LIMIT else None
+            allowance = self.timeout
+            if not is_line_local(pattern):
+                scanned = sum(len(region) for _, region in argument) if text is None else len(text)
+                allowance += scanned / MIN_SCAN_RATE
+            deadline = time.monotonic() + allowance
+            cancel_requested = False
+            while True:
+                if worker.connection.poll(PROGRESS_INTERVAL):
+                    message = worker.connection.recv()
+                    kind = message[0]
+                    if kind == 'done':
+                        reusable = True
+                        return message[1]
+                    if kind == 'cancelled':
+                        reusable = True
+                        return None
+                    if kind == 'error':
+                        reusable = True
+                        raise re.error(message[1])
+                    if kind not in ('ready', 'progress') and on_message is not None and not cancel_requested:
+                        on_message(message)
+                    if not cancel_requested:
+                        deadline = time.monotonic() + allowance
+                    continue
+                if cancelled is not None and not cancel_requested and cancelled():
+                    worker.cancel_flag.value = 1
+                    cancel_requested = True
+                    deadline = min(deadline, time.monotonic() + CANCEL_GRACE)
+                if time.monotonic() >= deadline:
+                    if cancel_requested:
+                        return None
+                    raise RegexTimeout(self.timeout)
+        except (EOFError, OSError) as e:
+            raise RegexSandboxError(f"正则表达式进程意外退出: {e}") from e
+        finally:
+            self._release(worker, reusable, interactive)
+
+    def finditer_spans(self, pattern, text, on_batch, cancelled=None):
+        """
+        查找所有长度不为0的匹配项，分批交给 on_batch
+
+        Args:
+            pattern (re.Pattern): 正则表达式
+            text (str): 文本
+            on_batch (callable): 参数为 (起始位置数组, 结束位置数组)，在调用线程中执行
+            cancelled (callable): 返回是否已取消的函数，取消后不再调用 on_batch
+
+        Returns:
+            int: 匹配总数，被取消时返回 None
+
+        Raises:
+            RegexTimeout: 超过 timeout 秒没有进展
+        """
+        return self._call('spans', pattern, text, on_message=lambda message: on_batch(*message[1:]),
+                          cancelled=cancelled)
+
+    def spans(self, pattern, text):
+        """
+        查找所有长度不为0的匹配项
+
+        Args:
+            pattern (re.Pattern): 正则表达式
+            text (str): 文本
+
+        Returns:
+            tuple: (起始位置数组, 结束位置数组)
+
+        Raises:
+            RegexTimeout: 超过 timeout 秒没有进展
+        """
+        starts, ends = array('q'), array('q')
+
+        def collect(batch_starts, batch_ends):
+            starts.extend(batch_starts)
+            ends.extend(batch_ends)
+
+        self.finditer_spans(pattern, text, collect)
+        return starts, ends
+
+    def region_spans(self, pattern, regions):
+        """
+        只在给定的区域中查找所有长度不为0的匹配项，用于索引筛选出候选文本块之后的验证
+
+        Args:
+            pattern (re.Pattern): 正则表达式
+            regions (list): [(起始位置, 文本), ...]，返回的位置为起始位置加上区域内的位置
+
+        Returns:
+            tuple: (起始位置数组, 结束位置数组)
+
+        Raises:
+            RegexTimeout: 超过 timeout 秒没有进展
+        """
+        starts, ends = array('q'), array('q')
+
+        def collect(message):
+            starts.extend(message[1])
+            ends.extend(message[2])
+
+        self._call('regions', pattern, None, regions, on_message=collect)
+        return starts, ends
+
+    def subn(self, pattern, text, replacement, use_regex, cancelled=None):
+        """
+        替换文本中的所有匹配项，语义与 SearchIndex.replace_matches 相同
+
+        Args:
+            pattern (re.Pattern): 正则表达式
+            text (str): 原文本
+            replacement (str): 替换内容
+            use_regex (bool): 是否为正则表达式模式
+            cancelled (callable): 返回是否已取消的函数
+
+        Returns:
+            tuple: (替换后的文本, 替换的数量)，被取消时返回 None
+
+        Raises:
+            RegexTimeout: 超过 timeout 秒没有进展
+            re.error: 替换内容中的反向引用无效
+        """
+        return self._call('subn', pattern, text, (replacement, use_regex), cancelled=cancelled)
+
+    def finditer_replacements(self, pattern, text, replacement, use_regex, on_batch, cancelled=None):
+        """
+        计算所有匹配项的替换内容，分批交给 on_batch，语义与 SearchIndex.replace_matches 相同
+
+        Args:
+            pattern (re.Pattern): 正则表达式
+            text (str): 原文本
+            replacement (str): 替换内容
+            use_regex (bool): 是否为正则表达式模式
+            on_batch (callable): 参数为 (起始位置数组, 结束位置数组, 替换内容列表)，在调用线程中执行
+            cancelled (callable): 返回是否已取消的函数，取消后不再调用 on_batch
+
+        Returns:
+            int: 替换数量，被取消时返回 None
+
+        Raises:
+            RegexTimeout: 超过 timeout 秒没有进展
+            re.error: 替换内容中的反向引用无效
+        """
+        return self._call('replacements', pattern, text, (replacement, use_regex),
+                          on_message=lambda message: on_batch(*message[1:]), cancelled=cancelled)
+
+    def match_end(self, pattern, text, position):
+        """
+        在文本的指定位置匹配表达式，位置之前和之后的文本仍可用于断言，与 pattern.match(text, position) 相同
+
+        Args:
+            pattern (re.Pattern): 正则表达式
+            text (str): 文本
+            position (int): 开始匹配的位置
+
+        Returns:
+            int: 匹配的结束位置，不匹配时返回 None
+
+        Raises:
+            RegexTimeout: 超过 timeout 秒没有结果
+        """
+        return self._call('match_end', pattern, text, position)
+
+    def forget_texts(self):
+        """不再保留已传给工作进程的文本的引用，下次请求会重新传输文本"""
+        with self._condition:
+            for worker in self._idle_workers + [self._interactive_worker]:
+                if worker is not None:
+                    worker.text = None
+
+    def shutdown(self):
+        """结束所有空闲的工作进程，正在执行的请求完成后其进程也会结束"""
+        with self._condition:
+            self._closed = True
+            workers, self._idle_workers = self._idle_workers, []
+            if self._interactive_worker is not None:
+                workers.append(self._interactive_worker)
+                self._interactive_worker = None
+        for worker in workers:
+            worker.kill()
@@ -1,32 +1,87 @@
-from PySide6.QtWidgets import (QApplication, QMainWindow, QInputDialog, QFileDialog,
+from PySide6.QtWidgets import (QMainWindow, QInputDialog, QFileDialog,
                               QVBoxLayout, QWidget, QHBoxLayout, QMessageBox, QPlainTextEdit,
                               QMenu, QTabWidget, QPushButton, QLabel, QTabBar)
 from PySide6.QtGui import (QFont, QColor, QTextCharFormat, QSyntaxHighlighter, QIcon,
-                          QUndoStack, QKeySequence, QAction, QTextCursor, QTextDocument, QPainter)
-from PySide6.QtCore import Qt, QRect, Signal, QSize
-import sqlparse
-import chardet
+                          QKeySequence, QAction, QActionGroup, QTextCursor, QTextDocument, QPainter)
+from PySide6.QtCore import Qt, QRect, Signal, QSize, QTimer
 import re
 from CodeEditor import CodeEditor
 from SQLHighlighter import SQLHighlighter
-from FindReplaceDialog import FindReplaceDialog
+from FileCodec import read_text_file, file_signature
+from FileWatcher import FileWatcher, ReloadTask
+from TextDiff import apply_edits, compute_line_edits, edit_chars, normalize_newlines
+from SQLTools import (format_sql_text, sql_to_java, java_to_sql, fill_parameters,
+                      align_comment_lines, fill_template, longest_line_length, split_long_lines,
+                      warm_up_formatter)
+from SQLHighlighter import LONG_LINE_LENGTH
+from UndoMemory import UndoBudget
+from SessionManager import SessionManager
+from TabHibernation import HibernationPolicy, estimate_tab_memory, format_size
+import PerfMonitor
+import StartupTiming
+from StallWatchdog import StallWatchdog
+from AppPaths import app_data_dir
+import html
 import os
+import threading
+import time
+import zlib
 
 
 
 
 class TabEditor(QWidget):
     """单个标签页编辑器组件"""
+
+    # 编辑器控件创建完成时发出（首次激活或从会话恢复后激活）
+    editor_created = Signal(object)
+    # 修改状态变化时发出（只在 已修改/未修改 切换时发出，而不是每次按键）
+    modification_changed = Signal(bool)
     
-    def __init__(self, file_path=None, content=""):
+    def __init__(self, file_path=None, content="", lazy_state=None):
+        """
+        初始化标签页
+
+        Args:
+            file_path (str): 文件路径
+            content (str): 初始内容
+            lazy_state (dict): 会话中保存的标签页状态。提供时不立即创建编辑器，
+                               直到调用 ensure_editor 时才创建
+        """
         super().__init__()
         self.file_path = file_path
-        self.is_modified = False
+        self.encoding = 'utf-8'
+        self.editor = None
+        self.highlighter = None
+        self._is_modified = False
+        # 尚未创建编辑器或已休眠时保存的状态（内容、光标、滚动位置等）
+        self._pending_state = None
+        # 最近一次激活的时间，用于休眠策略
+        self.last_active = time.monotonic()
+        # 最近一次读取或保存时磁盘文件的 (修改时间, 大小)，用于忽略自身保存触发的变化
+        self.disk_signature = None
+        # 长行模式提示条，检测到超长行时创建
+        self._long_line_bar = None
         
         # 创建布局
-        layout = QVBoxLayout(self)
-        layout.setContentsMargins(0, 0, 0, 0)
-        
+        self._layout = QVBoxLayout(self)
+        self._layout.setContentsMargins(0, 0, 0, 0)
+
+        if lazy_state is not None:
+            self.file_path = lazy_state.get('file_path')
+            self.encoding = lazy_state.get('encoding') or 'utf-8'
+            self._is_modified = bool(lazy_state.get('is_modified'))
+            self._pending_state = dict(lazy_state)
+        else:
+            self._create_editor(content)
+
+    def _create_editor(self, content):
+        """
+        创建代码编辑器、文档和语法高亮器
+
+        Args:
+            content (str): 编辑器的初始内容
+        """
         # 创建代码编辑器
         self.editor = CodeEditor()
         self.editor.setStyleSheet('''
@@ -39,21 +94,314 @@ class TabEditor(QWidget):
             }
         ''')
         
-        # 设置内容
+        # 设置内容，包含超长行时先启用长行模式，避免按普通方式排版整行
+        longest = longest_line_length(content) if content else 0
+        if longest > LONG_LINE_LENGTH:
+            self.editor.set_long_line_mode(True)
+            self._show_long_line_bar(longest)
+        elif self._long_line_bar is not None:
+            self._long_line_bar.hide()
         if content:
             self.editor.setPlainText(content)
         
         # 添加语法高亮
         self.highlighter = SQLHighlighter(self.editor.document())
         
-        # 监听文本变化
-        self.editor.textChanged.connect(self.on_text_changed)
-        
-        layout.addWidget(self.editor)
+        # 监听修改状态变化，由文档的撤销栈维护，撤销回保存时的状态会自动变为未修改
+        document = self.editor.document()
+        document.setModified(self._is_modified)
+        document.modificationChanged.connect(self.on_modification_changed)
         
-    def on_text_changed(self):
-        """文本变化时标记为已修改"""
-        self.is_modified = True
+        self._layout.addWidget(self.editor)
+
+    def _show_long_line_bar(self, longest):
+        """
+        显示长行模式提示条，提供一键快速拆分
+
+        Args:
+            longest (int): 最长行的字符数
+        """
+        if self._long_line_bar is None:
+            bar = QWidget(self)
+            bar.setStyleSheet("background-color: #3c3f41; color: #bbbbbb;")
+            bar_layout = QHBoxLayout(bar)
+            bar_layout.setContentsMargins(8, 4, 8, 4)
+            self._long_line_label = QLabel(bar)
+            bar_layout.addWidget(self._long_line_label, 1)
+            split_button = QPushButton('快速拆分', bar)
+            split_button.clicked.connect(self.split_long_lines)
+            bar_layout.addWidget(split_button)
+            close_button = QPushButton('关闭', bar)
+            close_button.clicked.connect(bar.hide)
+            bar_layout.addWidget(close_button)
+            self._layout.insertWidget(0, bar)
+            self._long_line_bar = bar
+        self._long_line_label.setText(
+            f'检测到超长行（{longest} 个字符），已启用长行模式：只高亮可见部分，不显示该行的空白字符。')
+        self._long_line_bar.show()
+
+    def split_long_lines(self):
+        """
+        在语句和子句边界处拆分超长行（一次可撤销的编辑），拆分后不再有超长行时退出长行模式
+
+        Returns:
+            bool: 文档是否被修改
+        """
+        editor = self.ensure_editor()
+        old_text = editor.toPlainText()
+        new_text = split_long_lines(old_text, LONG_LINE_LENGTH)
+        edits = compute_line_edits(old_text, new_text)
+        editor.undo_tracker.reserve(edit_chars(edits))
+        changed = apply_edits(editor.document(), edits) > 0
+        if longest_line_length(new_text) <= LONG_LINE_LENGTH:
+            editor.set_long_line_mode(False)
+            if self._long_line_bar is not None:
+                self._long_line_bar.hide()
+        return changed
+
+    def is_materialized(self):
+        """返回编辑器控件是否已经创建"""
+        return self.editor is not None
+
+    def ensure_editor(self):
+        """
+        确保编辑器控件已创建，未创建时根据保存的状态创建并恢复光标和滚动位置
+
+        Returns:
+            CodeEditor: 代码编辑器
+        """
+        if self.editor is not None:
+            return self.editor
+
+        state = self._pending_state or {}
+        content = self._pending_content()
+        self._pending_state = None
+        if content is None and self.file_path:
+            try:
+                content, self.encoding = read_text_file(self.file_path)
+                self.disk_signature = file_signature(self.file_path)
+            except OSError:
+                content = ""
+
+        self._create_editor(content or "")
+
+        # 恢复光标和滚动位置
+        cursor = self.editor.textCursor()
+        position = min(state.get('cursor_position', 0), self.editor.document().characterCount() - 1)
+        cursor.setPosition(max(position, 0))
+        self.editor.setTextCursor(cursor)
+        self.editor.verticalScrollBar().setValue(state.get('scroll_value', 0))
+        self.editor.horizontalScrollBar().setValue(state.get('hscroll_value', 0))
+
+        self.editor_created.emit(self.editor)
+        return self.editor
+
+    def hibernate(self):
+        """
+        休眠标签页：释放编辑器控件、文档布局、高亮数据和撤销历史，
+        只保留压缩的文本快照以及光标、滚动位置和撤销元数据
+        """
+        if self.editor is None:
+            return
+
+        memory_before = estimate_tab_memory(self)
+        document = self.editor.document()
+        state = {
+            'file_path': self.file_path,
+            'encoding': self.encoding,
+            'is_modified': self.is_modified,
+            'cursor_position': self.editor.textCursor().position(),
+            'scroll_value': self.editor.verticalScrollBar().value(),
+            'hscroll_value': self.editor.horizontalScrollBar().value(),
+            'compressed_content': zlib.compress(self.editor.toPlainText().encode('utf-8'), 1),
+            'undo_steps': document.availableUndoSteps(),
+            'memory_before': memory_before,
+            'hibernated_at': time.time(),
+        }
+
+        editor = self.editor
+        self._is_modified = editor.document().isModified()
+        self.editor = None
+        self.highlighter = None
+        self._layout.removeWidget(editor)
+        editor.deleteLater()
+        self._pending_state = state
+
+    def is_hibernated(self):
+        """返回标签页是否处于休眠状态"""
+        return self.editor is None and 'compressed_content' in (self._pending_state or {})
+
+    def hibernation_info(self):
+        """
+        获取休眠元数据
+
+        Returns:
+            dict: 休眠前估算内存、快照大小、释放的撤销步数等，未休眠时返回None
+        """
+        if not self.is_hibernated():
+            return None
+        state = self._pending_state
+        return {
+            'memory_before': state.get('memory_before', 0),
+            'snapshot_size': len(state['compressed_content']),
+            'undo_steps': state.get('undo_steps', 0),
+            'hibernated_at': state.get('hibernated_at'),
+        }
+
+    def snapshot_size(self):
+        """
+        返回未创建编辑器时保存的文本快照占用的字节数
+
+        Returns:
+            int: 快照字节数
+        """
+        state = self._pending_state or {}
+        if 'compressed_content' in state:
+            return len(state['compressed_content'])
+        return len(state.get('content') or '') * 2
+
+    def discard_snapshot(self):
+        """
+        丢弃未创建编辑器时保存的文本快照，下次激活时从磁盘重新读取
+
+        只对没有未保存更改的标签页生效。
+        """
+        if self.editor is not None or self.is_modified or self._pending_state is None:
+            return
+        self._pending_state.pop('compressed_content', None)
+        self._pending_state.pop('content', None)
+
+    def _pending_content(self):
+        """
+        获取未创建编辑器时保存的文本（会话中的未保存内容或休眠快照）
+
+        Returns:
+            str: 文本内容，没有保存内容时返回None
+        """
+        return self._state_content(self._pending_state or {})
+
+    @staticmethod
+    def _state_content(state):
+        """
+        从保存的状态中取出文本
+
+        Args:
+            state (dict): 未创建编辑器时保存的状态
+
+        Returns:
+            str: 文本内容，没有保存内容时返回None
+        """
+        if 'compressed_content' in state:
+            return zlib.decompress(state['compressed_content']).decode('utf-8')
+        return state.get('content')
+
+    @staticmethod
+    def _load_state_text(state, file_path):
+        """
+        读取未创建编辑器的标签页的全部文本，只使用参数不访问控件，可在后台线程中调用
+
+        Args:
+            state (dict): 未创建编辑器时保存的状态
+            file_path (str): 文件路径，可以为None
+
+        Returns:
+            str: 标签页文本
+        """
+        content = TabEditor._state_content(state)
+        if content is not None:
+            return content
+        if file_path:
+            try:
+                # 与编辑器中的文本一致使用 \n 换行，调用者按这份文本计算的位置才能用于文档
+                return normalize_newlines(read_text_file(file_path)[0])
+            except OSError:
+                return ""
+        return ""
+
+    def get_text(self):
+        """
+        获取标签页的全部文本，尚未创建编辑器时不会触发创建
+
+        Returns:
+            str: 标签页文本
+        """
+        return self.text_loader()()
+
+    def text_loader(self):
+        """
+        获取读取标签页全部文本的函数，供后台线程调用
+
+        已创建编辑器时文本在这里取出；否则只记下当前保存的状态和文件路径，
+        解压或读取文件在调用返回的函数时才进行，不占用主线程。
+
+        Returns:
+            callable: 无参数、返回标签页文本 (str) 的函数
+        """
+        if self.editor is not None:
+            text = self.editor.toPlainText()
+            return lambda: text
+        # 浅复制：之后休眠、恢复或丢弃快照都替换或删除键，不影响这里记下的内容
+        state = dict(self._pending_state or {})
+        file_path = self.file_path
+        return lambda: TabEditor._load_state_text(state, file_path)
+
+    def session_state(self):
+        """
+        获取用于保存会话的标签页状态
+
+        Returns:
+            dict: 包含路径、编码、光标、滚动位置以及未保存内容的字典
+        """
+        if self.editor is None:
+            state = {key: value for key, value in (self._pending_state or {}).items()
+                     if key in ('cursor_position', 'scroll_value', 'hscroll_value', 'content')}
+            state.update(file_path=self.file_path, encoding=self.encoding,
+                         is_modified=self.is_modified)
+            if self.is_hibernated() and (self.is_modified or not self.file_path):
+                state['content'] = self._pending_content()
+            return state
+
+        state = {
+            'file_path': self.file_path,
+            'encoding': self.encoding,
+            'is_modified': self.is_modified,
+            'cursor_position': self.editor.textCursor().position(),
+            'scroll_value': self.editor.verticalScrollBar().value(),
+            'hscroll_value': self.editor.horizontalScrollBar().value(),
+            'content': None,
+        }
+        # 只有未保存的内容需要写入会话，已保存的文件在激活时从磁盘读取
+        if self.is_modified or not self.file_path:
+            text = self.editor.toPlainText()
+            if text or self.is_modified:
+                state['content'] = text
+        return state
+
+    @property
+    def is_modified(self):
+        """是否有未保存的更改"""
+        if self.editor is not None:
+            return self.editor.document().isModified()
+        return self._is_modified
+
+    @is_modified.setter
+    def is_modified(self, value):
+        if self.editor is not None:
+            # 由 modificationChanged 同步 _is_modified 并通知标签页标题更新
+            self.editor.document().setModified(value)
+        elif value != self._is_modified:
+            self._is_modified = value
+            self.modification_changed.emit(value)
+
+    def on_modification_changed(self, modified):
+        """
+        文档修改状态变化时转发信号
+
+        Args:
+            modified (bool): 是否已修改
+        """
+        self._is_modified = modified
+        self.modification_changed.emit(modified)
         
     def get_display_name(self):
         """获取显示名称"""
@@ -74,9 +422,14 @@ class TabEditor(QWidget):
             
         if self.file_path:
             try:
+                text = self.get_text()
                 with open(self.file_path, 'w', encoding='utf-8') as f:
-                    f.write(self.editor.toPlainText())
+                    f.write(text)
+                self.encoding = 'utf-8'
                 self.is_modified = False
+                self.disk_signature = file_signature(self.file_path)
+                if self._pending_state is not None and not self.is_hibernated():
+                    self._pending_state['content'] = None
                 return True
             except Exception as e:
                 return False
@@ -84,6 +437,16 @@ class TabEditor(QWidget):
 
 
 class SQLFormatterApp(QMainWindow):
+    """
+    SQL编辑器主窗口
+
+    为了尽快显示窗口，构造时只创建可见的部分：查找替换等对话框及其依赖的模块在第一次使用时才导入，
+    监视文件、预热 sqlparse 等看不见的准备工作在窗口第一次绘制之后才执行（finish_startup）。
+    """
+
+    # 窗口一直没有绘制（例如启动时最小化）时，最迟在该时间后执行延迟的启动工作
+    STARTUP_FALLBACK_MS = 2000
+
     def __init__(self):
         super().__init__()
 
@@ -108,29 +471,97 @@ class SQLFormatterApp(QMainWindow):
         
         # 连接标签页点击事件，处理新建标签页功能
         self.tab_widget.tabBarClicked.connect(self.on_tab_clicked)
+        # 切换标签页时再创建该标签页的编辑器
+        self.tab_widget.currentChanged.connect(self.on_current_tab_changed)
         
         layout.addWidget(self.tab_widget)
         
-        # 创建第一个标签页和[+]标签页
-        self.new_tab()
+        # 监视已打开文件在外部的修改
+        self.file_watcher = FileWatcher(self)
+        self.file_watcher.file_changed.connect(self.on_external_file_changed)
+        self._reload_tasks = {}
+
+        # 正则表达式在工作进程中执行，表达式执行过慢时可以中止，不会卡住界面；
+        # 沙箱需要导入 multiprocessing，第一次使用时才创建（get_regex_sandbox）
+        self._regex_sandbox = None
+
+        # 性能监视面板，第一次打开时创建
+        self._perf_hud = None
+        # 界面卡顿监视，启动完成后开始（finish_startup），卡顿时记录界面线程的调用栈
+        self.stall_watchdog = StallWatchdog(self.current_tab_chars, parent=self)
+
+        # 撤销内存预算，在状态栏显示当前标签页和全部标签页的撤销内存
+        self.undo_budget = UndoBudget(self.get_tab_editors, self.get_current_tab_editor, self)
+        self.undo_memory_label = QLabel()
+        self.statusBar().addPermanentWidget(self.undo_memory_label)
+        self.undo_budget.usage_changed.connect(self.update_undo_memory_label)
+
+        # 恢复上次的会话，没有会话时创建第一个标签页，最后添加[+]标签页
+        self.session_manager = SessionManager()
+        if not self.restore_session():
+            self.new_tab()
         self.add_plus_tab()
+        StartupTiming.mark("恢复会话并创建当前标签页")
+
+        # 长时间未激活的标签页自动休眠以节省内存
+        self.hibernation_policy = HibernationPolicy(self.get_tab_editors, self._can_hibernate, self)
 
         # 初始化菜单栏
         self.setup_menus()
         
         # 添加撤销/重做功能
-        self.undo_stack = QUndoStack(self)
         self.setup_undo_redo_actions()
 
+        self._painted = False
+        self._startup_finished = False
+        QTimer.singleShot(self.STARTUP_FALLBACK_MS, self.finish_startup)
+
+    def paintEvent(self, event):
+        """第一次绘制之后再执行延迟的启动工作"""
+        super().paintEvent(event)
+        if not self._painted:
+            self._painted = True
+            StartupTiming.mark("第一次绘制")
+            # 等这次绘制完成、窗口真正显示出来后再执行
+            QTimer.singleShot(0, self.finish_startup)
+
+    def finish_startup(self):
+        """执行启动时推迟的、看不见的准备工作，只执行一次"""
+        if self._startup_finished:
+            return
+        self._startup_finished = True
+        self.update_watched_files()
+        threading.Thread(target=self._warm_up, daemon=True).start()
+        StartupTiming.mark("监视已打开的文件")
+        self.stall_watchdog.start()
+
+    def _warm_up(self):
+        """在后台线程中预热 sqlparse，第一次格式化 SQL 时不必等待模块加载"""
+        started = time.perf_counter()
+        warm_up_formatter()
+        StartupTiming.mark("预热 sqlparse（后台线程）", started)
+
+    def get_regex_sandbox(self):
+        """
+        返回正则表达式沙箱，第一次调用时创建
+
+        Returns:
+            RegexSandbox: 沙箱
+        """
+        if self._regex_sandbox is None:
+            from RegexSandbox import RegexSandbox
+            self._regex_sandbox = RegexSandbox()
+        return self._regex_sandbox
+
     def setup_menus(self):
         """设置菜单栏"""
         # 文件菜单
         file_menu = self.menuBar().addMenu('文件(&F)')
         file_menu.addAction('新建', self.insert_tab_before_plus).setShortcut('Ctrl+N')
-        file_menu.addAction('打开', self.open_file).setShortcut('Ctrl+O')
+        file_menu.addAction('打开', PerfMonitor.timed('open_file', self.open_file)).setShortcut('Ctrl+O')
         file_menu.addSeparator()
-        file_menu.addAction('保存', self.save_file).setShortcut('Ctrl+S')
-        file_menu.addAction('另存为', self.save_as_file).setShortcut('Ctrl+Shift+S')
+        file_menu.addAction('保存', PerfMonitor.timed('save_file', self.save_file)).setShortcut('Ctrl+S')
+        file_menu.addAction('另存为', PerfMonitor.timed('save_as_file', self.save_as_file)).setShortcut('Ctrl+Shift+S')
         file_menu.addSeparator()
         file_menu.addAction('关闭标签页', self.close_current_tab).setShortcut('Ctrl+W')
         file_menu.addAction('退出', self.exit_app).setShortcut('Ctrl+Q')
@@ -138,6 +569,12 @@ class SQLFormatterApp(QMainWindow):
         # 编辑菜单
         edit_menu = self.menuBar().addMenu('编辑(&E)')
         edit_menu.addAction('查找替换', self.show_find_replace_dialog).setShortcut('Ctrl+H')
+        edit_menu.addAction('在文件夹中查找', self.show_workspace_search_dialog).setShortcut('Ctrl+Shift+F')
+        edit_menu.addAction('正则表达式超时设置', self.configure_regex_timeout)
+        edit_menu.addSeparator()
+        # 快捷键由编辑器处理，这里只显示提示
+        edit_menu.addAction('切换行注释\tCtrl+/', self.toggle_line_comment)
+        edit_menu.addAction('关键字大写\tCtrl+Shift+K', self.uppercase_keywords)
         edit_menu.addSeparator()
         
         # 显示空白字符选项
@@ -146,33 +583,66 @@ class SQLFormatterApp(QMainWindow):
         self.show_whitespace_action.setChecked(True)
         self.show_whitespace_action.triggered.connect(self.toggle_whitespace_visibility)
 
+        # 空白字符显示方式，原生方式由 Qt 排版绘制，滚动更流畅
+        whitespace_mode_menu = edit_menu.addMenu('空白字符显示方式')
+        self.whitespace_mode_group = QActionGroup(self)
+        for mode, title in ((CodeEditor.WHITESPACE_MODE_NATIVE, '原生绘制（快速）'),
+                            (CodeEditor.WHITESPACE_MODE_OVERLAY, '自定义符号（叠加绘制）')):
+            action = whitespace_mode_menu.addAction(title)
+            action.setCheckable(True)
+            action.setData(mode)
+            action.setChecked(mode == CodeEditor.WHITESPACE_MODE_NATIVE)
+            self.whitespace_mode_group.addAction(action)
+        self.whitespace_mode_group.triggered.connect(self.change_whitespace_mode)
+
         # 工具菜单
+        # 工具命令的耗时计入性能监视，统计项名称为方法名
         tool_menu = self.menuBar().addMenu('工具(&T)')
-        tool_menu.addAction('格式化SQL', self.format_sql).setShortcut('Ctrl+F')
-        tool_menu.addAction('转换Java格式', self.convert_to_java_format).setShortcut('Ctrl+J')
-        tool_menu.addAction('从Java转回SQL', self.convert_back_to_sql).setShortcut('Ctrl+K')
-        tool_menu.addAction('对齐注释', self.align_comments).setShortcut('Ctrl+L')
-        tool_menu.addAction('填充参数', self.fill_sql_parameters).setShortcut('Ctrl+P')
-        tool_menu.addAction('代码填充', self.fill_code).setShortcut('Ctrl+M')
+        for title, slot, shortcut in (('格式化SQL', self.format_sql, 'Ctrl+F'),
+                                      ('转换Java格式', self.convert_to_java_format, 'Ctrl+J'),
+                                      ('从Java转回SQL', self.convert_back_to_sql, 'Ctrl+K'),
+                                      ('对齐注释', self.align_comments, 'Ctrl+L'),
+                                      ('填充参数', self.fill_sql_parameters, 'Ctrl+P'),
+                                      ('代码填充', self.fill_code, 'Ctrl+M'),
+                                      ('拆分超长行', self.split_long_lines, None)):
+            action = tool_menu.addAction(title, PerfMonitor.timed(slot.__name__, slot))
+            if shortcut:
+                action.setShortcut(shortcut)
+
+        # 视图菜单
+        view_menu = self.menuBar().addMenu('视图(&V)')
+        view_menu.addAction('标签页内存', self.show_tab_memory_dialog)
+        view_menu.addAction('立即休眠非活动标签页', self.hibernate_inactive_tabs)
+        view_menu.addAction('标签页休眠设置', self.configure_hibernation)
+        view_menu.addAction('撤销内存预算', self.configure_undo_budget)
+        view_menu.addSeparator()
+        self.perf_hud_action = view_menu.addAction('性能监视面板')
+        self.perf_hud_action.setCheckable(True)
+        self.perf_hud_action.toggled.connect(self.toggle_perf_hud)
+        view_menu.addAction('导出性能跟踪...', self.export_perf_trace)
 
         # 帮助菜单
         help_menu = self.menuBar().addMenu('帮助(&H)')
         help_menu.addAction('关于', self.show_about).setShortcut('F1')
+        help_menu.addAction('启动耗时', self.show_startup_report)
+        help_menu.addAction('卡顿报告', self.show_stall_report)
+        help_menu.addAction('卡顿监视阈值', self.configure_stall_threshold)
+        self.profile_action = help_menu.addAction('分析下一个操作')
+        self.profile_action.setCheckable(True)
+        self.profile_action.toggled.connect(self.toggle_profile_next_action)
         
     def new_tab(self, file_path=None, content=""):
         """创建新标签页"""
         tab_editor = TabEditor(file_path, content)
+        self._connect_tab_editor(tab_editor)
         
-        # 监听文本变化以更新标签页标题
-        tab_editor.editor.textChanged.connect(lambda: self.update_tab_title(tab_editor))
-        
-        # 应用当前的空白字符显示设置
-        if hasattr(self, 'show_whitespace_action'):
-            show_whitespace = self.show_whitespace_action.isChecked()
-            tab_editor.editor.set_show_whitespace(show_whitespace)
-        
-        # 添加标签页
-        index = self.tab_widget.addTab(tab_editor, tab_editor.get_display_name())
+        # 添加标签页，已有[+]标签页时插入到它前面
+        plus_index = self.tab_widget.count() - 1
+        plus_widget = self.tab_widget.widget(plus_index)
+        if getattr(plus_widget, 'is_plus_tab', False):
+            index = self.tab_widget.insertTab(plus_index, tab_editor, tab_editor.get_display_name())
+        else:
+            index = self.tab_widget.addTab(tab_editor, tab_editor.get_display_name())
         self.tab_widget.setCurrentIndex(index)
         
         # 更新窗口标题
@@ -180,6 +650,303 @@ class SQLFormatterApp(QMainWindow):
         
         return tab_editor
         
+    def _connect_tab_editor(self, tab_editor):
+        """
+        连接标签页的编辑器信号，编辑器延迟创建时在创建后再连接
+
+        Args:
+            tab_editor (TabEditor): 标签页编辑器
+        """
+        tab_editor.editor_created.connect(lambda editor: self._on_editor_created(tab_editor, editor))
+        # 只在修改状态切换时更新标题，避免每次按键都刷新标签栏
+        tab_editor.modification_changed.connect(lambda _: self.update_tab_title(tab_editor))
+        if tab_editor.is_materialized():
+            self._on_editor_created(tab_editor, tab_editor.editor)
+
+    def _on_editor_created(self, tab_editor, editor):
+        """
+        编辑器创建后连接信号并应用当前设置
+
+        Args:
+            tab_editor (TabEditor): 标签页编辑器
+            editor (CodeEditor): 新创建的代码编辑器
+        """
+        # 应用当前的空白字符显示设置
+        if hasattr(self, 'show_whitespace_action'):
+            show_whitespace = self.show_whitespace_action.isChecked()
+            editor.set_show_whitespace(show_whitespace)
+            editor.set_whitespace_mode(self.whitespace_mode_group.checkedAction().data())
+        # 纳入撤销内存预算
+        self.undo_budget.attach(editor.undo_tracker)
+        editor.undo_tracker.trimmed.connect(
+            lambda freed: self.on_undo_history_trimmed(tab_editor, freed))
+
+    def on_current_tab_changed(self, index):
+        """
+        当前标签页变化时创建尚未创建的编辑器
+
+        Args:
+            index (int): 新的当前标签页序号
+        """
+        if getattr(self, '_restoring_session', False):
+            return
+        # 记录离开和进入的标签页的激活时间
+        previous_tab = getattr(self, '_active_tab_editor', None)
+        if previous_tab is not None:
+            previous_tab.last_active = time.monotonic()
+        tab_editor = self.tab_widget.widget(index)
+        if isinstance(tab_editor, TabEditor):
+            tab_editor.last_active = time.monotonic()
+            tab_editor.ensure_editor()
+            self._active_tab_editor = tab_editor
+            # 查找替换对话框跟随当前标签页
+            dialog = getattr(self, '_find_replace_dialog', None)
+            if dialog is not None:
+                dialog.set_text_editor(tab_editor.editor)
+        self.update_window_title()
+        self.undo_budget.schedule_update()
+
+    def get_tab_editors(self):
+        """
+        获取所有普通标签页（不含[+]标签页）
+
+        Returns:
+            list: TabEditor 列表
+        """
+        return [self.tab_widget.widget(i) for i in range(self.tab_widget.count())
+                if isinstance(self.tab_widget.widget(i), TabEditor)]
+
+    def _can_hibernate(self, tab_editor):
+        """
+        判断标签页能否休眠：当前标签页和查找替换对话框正在使用的标签页不能休眠
+
+        Args:
+            tab_editor (TabEditor): 标签页编辑器
+
+        Returns:
+            bool: 能否休眠
+        """
+        if tab_editor is self.tab_widget.currentWidget():
+            return False
+        dialog = getattr(self, '_find_replace_dialog', None)
+        if dialog is not None and dialog.text_editor is tab_editor.editor:
+            return False
+        return True
+
+    def hibernate_inactive_tabs(self):
+        """立即休眠所有非活动标签页"""
+        count = self.hibernation_policy.hibernate_all_inactive()
+        self.statusBar().showMessage(f"已休眠 {count} 个标签页", 3000)
+        self.undo_budget.schedule_update()
+
+    def show_tab_memory_dialog(self):
+        """显示标签页内存对话框"""
+        from TabMemoryDialog import TabMemoryDialog
+        dialog = TabMemoryDialog(self, self.get_tab_editors, self.hibernation_policy.hibernate_all_inactive)
+        dialog.exec()
+
+    def configure_hibernation(self):
+        """设置标签页休眠的空闲时间和内存预算"""
+        policy = self.hibernation_policy
+        minutes, ok = QInputDialog.getInt(
+            self, '标签页休眠设置', '空闲多少分钟后休眠（0表示停用自动休眠）:',
+            policy.idle_timeout // 60 if policy.enabled else 0, 0, 24 * 60)
+        if not ok:
+            return
+        budget_mb, ok = QInputDialog.getInt(
+            self, '标签页休眠设置', '所有标签页的内存预算(MB):',
+            policy.memory_budget // (1024 * 1024), 16, 64 * 1024)
+        if not ok:
+            return
+        policy.set_enabled(minutes > 0)
+        if minutes > 0:
+            policy.idle_timeout = minutes * 60
+        policy.memory_budget = budget_mb * 1024 * 1024
+
+    def configure_undo_budget(self):
+        """设置单个标签页和全部标签页的撤销内存预算"""
+        budget = self.undo_budget
+        tab_mb, ok = QInputDialog.getInt(
+            self, '撤销内存预算', '单个标签页的撤销内存预算(MB):',
+            budget.tab_budget // (1024 * 1024), 1, 16 * 1024)
+        if not ok:
+            return
+        global_mb, ok = QInputDialog.getInt(
+            self, '撤销内存预算', '所有标签页的撤销内存预算(MB):',
+            budget.global_budget // (1024 * 1024), tab_mb, 64 * 1024)
+        if not ok:
+            return
+        budget.set_budgets(tab_mb * 1024 * 1024, global_mb * 1024 * 1024)
+
+    def configure_regex_timeout(self):
+        """设置正则表达式查找替换允许没有进展的最长时间"""
+        seconds, ok = QInputDialog.getDouble(
+            self, '正则表达式超时设置', '正则表达式超过多少秒没有进展时停止:',
+            self.get_regex_sandbox().timeout, 0.1, 600, 1)
+        if ok:
+            self.get_regex_sandbox().timeout = seconds
+
+    def update_undo_memory_label(self, current_bytes, total_bytes):
+        """
+        在状态栏显示撤销内存
+
+        Args:
+            current_bytes (int): 当前标签页的撤销内存估算值
+            total_bytes (int): 所有标签页的撤销内存估算值
+        """
+        self.undo_memory_label.setText(
+            f"撤销内存: {format_size(current_bytes)} / 全部 {format_size(total_bytes)}")
+        self.undo_memory_label.setToolTip(
+            f"单个标签页预算 {format_size(self.undo_budget.tab_budget)}，"
+            f"全局预算 {format_size(self.undo_budget.global_budget)}")
+
+    def on_undo_history_trimmed(self, tab_editor, freed):
+        """
+        撤销历史因超出预算被清空时提示用户
+
+        Args:
+            tab_editor (TabEditor): 被清空撤销历史的标签页
+            freed (int): 释放的估算字节数
+        """
+        self.statusBar().showMessage(
+            f"撤销内存超出预算，已清空 \"{tab_editor.get_display_name()}\" 的撤销历史"
+            f"（释放约 {format_size(freed)}）", 5000)
+
+    def restore_session(self):
+        """
+        恢复上次退出时的会话
+
+        只创建标签栏，标签页的编辑器在首次激活时才创建。
+
+        Returns:
+            bool: 是否恢复了至少一个标签页
+        """
+        tab_states, current_index = self.session_manager.load()
+        if not tab_states:
+            return False
+
+        self._restoring_session = True
+        try:
+            for state in tab_states:
+                tab_editor = TabEditor(lazy_state=state)
+                self._connect_tab_editor(tab_editor)
+                self.tab_widget.addTab(tab_editor, tab_editor.get_display_name())
+            self.tab_widget.setCurrentIndex(current_index)
+        finally:
+            self._restoring_session = False
+
+        self.on_current_tab_changed(self.tab_widget.currentIndex())
+        return True
+
+    def update_watched_files(self):
+        """根据当前打开的标签页更新被监视的文件"""
+        self.file_watcher.set_paths(tab.file_path for tab in self.get_tab_editors() if tab.file_path)
+
+    def on_external_file_changed(self, path):
+        """
+        已打开的文件在外部被修改时重新加载
+
+        有未保存更改的标签页会先询问用户；尚未创建编辑器的标签页只丢弃快照，
+        在激活时从磁盘读取。
+
+        Args:
+            path (str): 变化的文件路径
+        """
+        for tab_editor in self.get_tab_editors():
+            if not tab_editor.file_path or os.path.abspath(tab_editor.file_path) != path:
+                continue
+            signature = file_signature(path)
+            if signature is None or signature == tab_editor.disk_signature:
+                # 文件被删除，或者是本程序自己保存触发的变化
+                continue
+            if not tab_editor.is_materialized():
+                tab_editor.discard_snapshot()
+                continue
+            if tab_editor.is_modified:
+                reply = QMessageBox.question(
+                    self, '文件已修改',
+                    f'文件 "{path}" 已在外部被修改，是否重新加载？\n当前未保存的更改可以通过撤销恢复。',
+                    QMessageBox.Yes | QMessageBox.No
+                )
+                if reply != QMessageBox.Yes:
+                    tab_editor.disk_signature = signature
+                    continue
+            self._start_reload(tab_editor)
+
+    def _start_reload(self, tab_editor):
+        """
+        在后台读取文件并计算与当前文本的差异
+
+        Args:
+            tab_editor (TabEditor): 需要重新加载的标签页
+        """
+        document = tab_editor.editor.document()
+        task = ReloadTask(tab_editor.file_path, tab_editor.editor.toPlainText(), document.revision(), self)
+        task.finished.connect(lambda result: self._on_reload_finished(tab_editor, task, result))
+        self._reload_tasks[id(task)] = task
+        task.start()
+
+    def _on_reload_finished(self, tab_editor, task, result):
+        """
+        后台重新加载完成后，把差异作为一次可撤销的编辑应用到文档
+
+        Args:
+            tab_editor (TabEditor): 重新加载的标签页
+            task (ReloadTask): 完成的任务
+            result (dict): 任务结果
+        """
+        self._reload_tasks.pop(id(task), None)
+        task.deleteLater()
+        if tab_editor not in self.get_tab_editors() or not tab_editor.is_materialized():
+            return
+        if result['error']:
+            self.statusBar().showMessage(f"重新加载失败: {result['error']}", 5000)
+            return
+
+        document = tab_editor.editor.document()
+        if document.revision() != result['revision']:
+            # 计算差异期间文档又被编辑过，基于最新文本重新计算
+            self._start_reload(tab_editor)
+            return
+
+        tab_editor.editor.undo_tracker.reserve(edit_chars(result['edits']))
+        count = apply_edits(document, result['edits'])
+        tab_editor.encoding = result['encoding']
+        tab_editor.disk_signature = file_signature(tab_editor.file_path)
+        tab_editor.is_modified = False
+        self.update_tab_title(tab_editor)
+        self.statusBar().showMessage(
+            f"已从磁盘重新加载 {os.path.basename(tab_editor.file_path)}（{count} 处更改）", 3000)
+
+    def save_session(self):
+        """保存当前会话"""
+        tab_states = []
+        current_index = 0
+        for i in range(self.tab_widget.count()):
+            tab_editor = self.tab_widget.widget(i)
+            if not isinstance(tab_editor, TabEditor):
+                continue
+            if i == self.tab_widget.currentIndex():
+                current_index = len(tab_states)
+            tab_states.append(tab_editor.session_state())
+        try:
+            self.session_manager.save(tab_states, current_index)
+        except OSError:
+            pass
+
+    def closeEvent(self, event):
+        """
+        重写关闭事件，退出前保存会话
+
+        Args:
+            event (QCloseEvent): 关闭事件
+        """
+        self.save_session()
+        self.stall_watchdog.stop()
+        if self._regex_sandbox is not None:
+            self._regex_sandbox.shutdown()
+        super().closeEvent(event)
+
     def add_plus_tab(self):
         """添加[+]标签页作为新建按钮"""
         # 创建一个空的widget作为[+]标签页
@@ -274,6 +1041,7 @@ class SQLFormatterApp(QMainWindow):
                     self.tab_widget.setCurrentIndex(last_normal_index)
         
         self.update_window_title()
+        self.update_watched_files()
         
     def close_current_tab(self):
         """关闭当前标签页"""
@@ -283,9 +1051,9 @@ class SQLFormatterApp(QMainWindow):
             
     def get_current_editor(self):
         """获取当前活动的编辑器"""
-        current_tab = self.tab_widget.currentWidget()
+        current_tab = self.get_current_tab_editor()
         if current_tab:
-            return current_tab.editor
+            return current_tab.ensure_editor()
         return None
         
     def get_current_tab_editor(self):
@@ -298,11 +1066,11 @@ class SQLFormatterApp(QMainWindow):
         
     def update_tab_title(self, tab_editor):
         """更新标签页标题"""
-        for i in range(self.tab_widget.count()):
-            if self.tab_widget.widget(i) == tab_editor:
-                self.tab_widget.setTabText(i, tab_editor.get_display_name())
-                break
-        self.update_window_title()
+        index = self.tab_widget.indexOf(tab_editor)
+        if index >= 0:
+            self.tab_widget.setTabText(index, tab_editor.get_display_name())
+        if tab_editor is self.tab_widget.currentWidget():
+            self.update_window_title()
         
     def update_window_title(self):
         """更新窗口标题"""
@@ -331,6 +1099,18 @@ class SQLFormatterApp(QMainWindow):
                 menu.addAction(redo_action)
                 return
                 
+    def toggle_line_comment(self):
+        """切换当前编辑器选中行的行注释"""
+        editor = self.get_current_editor()
+        if editor:
+            editor.toggle_line_comment()
+
+    def uppercase_keywords(self):
+        """将当前编辑器中的SQL关键字转换为大写"""
+        editor = self.get_current_editor()
+        if editor:
+            editor.uppercase_keywords()
+
     def undo_current(self):
         """撤销当前编辑器的操作"""
         editor = self.get_current_editor()
@@ -343,28 +1123,36 @@ class SQLFormatterApp(QMainWindow):
         if editor:
             editor.redo()
 
+    def _apply_tool_result(self, editor, new_text):
+        """
+        把工具生成的新文本作为一次可撤销的编辑应用到编辑器
+
+        只替换与原文不同的行，撤销记录只保存变化的片段，而不是整篇文档的旧文本和新文本。
+
+        Args:
+            editor (CodeEditor): 目标编辑器
+            new_text (str): 工具生成的新文本
+        """
+        edits = compute_line_edits(editor.toPlainText(), new_text)
+        # 超出撤销内存预算时先释放之前的历史，保证这次编辑可以撤销
+        editor.undo_tracker.reserve(edit_chars(edits))
+        apply_edits(editor.document(), edits)
+
+    def split_long_lines(self):
+        """在语句和子句边界处拆分当前标签页中的超长行"""
+        tab_editor = self.get_current_tab_editor()
+        if tab_editor and not tab_editor.split_long_lines():
+            self.statusBar().showMessage("没有需要拆分的超长行", 3000)
+
     def format_sql(self):
         """格式化当前标签页的SQL"""
         editor = self.get_current_editor()
         if not editor:
             return
             
-        sql = editor.toPlainText()
         try:
-            # Format SQL with uppercase keywords
-            formatted_sql = sqlparse.format(sql,
-                reindent=True,
-                keyword_case='upper',
-                strip_comments=True,
-                use_space_around_operators=True,
-                comma_first=True
-            )
-            # 使用 QTextCursor 替换文本，支持撤销功能
-            cursor = editor.textCursor()
-            cursor.beginEditBlock()
-            cursor.select(cursor.SelectionType.Document)
-            cursor.insertText(formatted_sql)
-            cursor.endEditBlock()
+            formatted_sql = format_sql_text(editor.toPlainText())
+            self._apply_tool_result(editor, formatted_sql)
         except Exception as e:
             QMessageBox.critical(self, '格式化错误', f'SQL格式化失败: {str(e)}')
 
@@ -378,23 +1166,7 @@ class SQLFormatterApp(QMainWindow):
         if not sql:
             return
         
-        # Split SQL into lines
-        lines = sql.split('\n')
-        
-        # Create Java string builder code
-        java_code = "StringBuffer sb = new StringBuffer();\n"
-        for line in lines:
-            # Escape quotes and preserve whitespace
-            escaped_line = line.replace('"', '\\"').replace('\\', '\\\\')
-            # Add each line as append statement
-            java_code += f'sb.append(" {escaped_line} ");\n'
-        
-        # 使用 QTextCursor 替换文本，支持撤销功能
-        cursor = editor.textCursor()
-        cursor.beginEditBlock()
-        cursor.select(cursor.SelectionType.Document)
-        cursor.insertText(java_code)
-        cursor.endEditBlock()
+        self._apply_tool_result(editor, sql_to_java(sql))
 
     """
     将Java代码格式的SQL转换回原始SQL语句。
@@ -414,36 +1186,9 @@ class SQLFormatterApp(QMainWindow):
         if not editor:
             return
             
-        java_code = editor.toPlainText()
-        lines = java_code.splitlines()
-        result_lines = []
-        
-        for index, line in enumerate(lines):
-            # Skip empty lines
-            if not line.strip():
-                continue
-                
-            # Extract content inside quotes
-            if '"' in line:
-                content = line.split('"')[1]
-            else:
-                continue  # Skip if no quoted content
-                
-            # Remove leading whitespace for all except first line
-            if index > 0:
-                content = content.lstrip()
-                
-            result_lines.append(content)
-            
-        sql = "\n".join(result_lines)
-        
+        sql = java_to_sql(editor.toPlainText())
         if sql:
-            # 使用 QTextCursor 替换文本，支持撤销功能
-            cursor = editor.textCursor()
-            cursor.beginEditBlock()
-            cursor.select(cursor.SelectionType.Document)
-            cursor.insertText(sql)
-            cursor.endEditBlock()
+            self._apply_tool_result(editor, sql)
 
     def fill_sql_parameters(self):
         """
@@ -474,23 +1219,14 @@ class SQLFormatterApp(QMainWindow):
 
         # 处理参数
         params = [param.strip() for param in params_text.split(',')]
-        
-        # 替换SQL中的占位符
-        placeholder_count = sql.count('?')
-        if placeholder_count != len(params):
-            QMessageBox.warning(self, '参数错误', f'占位符数量({placeholder_count})与参数数量({len(params)})不匹配!')
+        try:
+            sql = fill_parameters(sql, params)
+        except ValueError as e:
+            placeholder_count, param_count = e.args
+            QMessageBox.warning(self, '参数错误', f'占位符数量({placeholder_count})与参数数量({param_count})不匹配!')
             return
-
-        # 用参数值替换占位符
-        for param in params:
-            sql = sql.replace('?', f"'{param}'", 1)  # 只替换第一个匹配项
         
-        # 使用 QTextCursor 替换文本，支持撤销功能
-        cursor = editor.textCursor()
-        cursor.beginEditBlock()
-        cursor.select(cursor.SelectionType.Document)
-        cursor.insertText(sql)
-        cursor.endEditBlock()
+        self._apply_tool_result(editor, sql)
 
    
     def align_comments(self):
@@ -515,44 +1251,7 @@ class SQLFormatterApp(QMainWindow):
         if not java_code:
             return
 
-        # 按行分割
-        lines = java_code.splitlines()
-        result_lines = []
-        
-        # 第一次处理：将tab转换为空格，记录最大注释位置
-        max_comment_pos = 0
-        processed_lines = []
-        
-        for line in lines:
-            # 将tab转换为4个空格
-            line_with_spaces = line.replace('\t', '    ')
-            
-            # 查找注释位置
-            comment_pos = line_with_spaces.find('//')
-            if comment_pos != -1:
-                # 更新最大注释位置
-                max_comment_pos = max(max_comment_pos, comment_pos)
-                
-            # 保存处理后的行和注释位置
-            processed_lines.append((line_with_spaces, comment_pos))
-        
-        # 第二次处理：对齐注释
-        for line, comment_pos in processed_lines:
-            if comment_pos != -1:
-                # 如果是注释行，添加适当的前导空格
-                aligned_line = line[:comment_pos] + ' ' * (max_comment_pos - comment_pos) + line[comment_pos:]
-                result_lines.append(aligned_line)
-            else:
-                # 非注释行直接添加
-                result_lines.append(line)
-        
-        # 使用 QTextCursor 替换文本，支持撤销功能
-        aligned_java_code = '\n'.join(result_lines)
-        cursor = editor.textCursor()
-        cursor.beginEditBlock()
-        cursor.select(cursor.SelectionType.Document)
-        cursor.insertText(aligned_java_code)
-        cursor.endEditBlock()
+        self._apply_tool_result(editor, align_comment_lines(java_code))
 
     def fill_code(self):
         """
@@ -571,7 +1270,6 @@ class SQLFormatterApp(QMainWindow):
         if not editor:
             return
             
-        # 创建多行输入对话框
         # 使用 getMultiLineText 方法创建多行输入对话框
         template, ok = QInputDialog.getMultiLineText(
             self,
@@ -588,66 +1286,46 @@ class SQLFormatterApp(QMainWindow):
         if not text:
             return
 
-        # 按行处理文本
-        lines = text.splitlines()
-        result_lines = []
-        
-        for line in lines:
-            # 跳过空行
-            if not line.strip():
-                continue
-                
-            # 分割行内容
-            parts = [part.strip() for part in line.split('\t')]
-            
-            # 替换模板中的占位符
-            try:
-                formatted_line = template.format(*parts)
-                result_lines.extend(formatted_line.split('\n'))  # 支持多行输出
-            except IndexError as e:
-                QMessageBox.warning(self, '模板错误', f'模板占位符与实际参数不匹配: {str(e)}')
-                return
+        try:
+            result = fill_template(text, template)
+        except IndexError as e:
+            QMessageBox.warning(self, '模板错误', f'模板占位符与实际参数不匹配: {str(e)}')
+            return
 
-        # 使用 QTextCursor 替换文本，这样可以支持撤销功能
-        if result_lines:
-            cursor = editor.textCursor()
-            # 开始复合编辑操作，这样整个替换操作会被视为一个撤销步骤
-            cursor.beginEditBlock()
-            # 选择所有文本
-            cursor.select(cursor.SelectionType.Document)
-            # 替换选中的文本
-            cursor.insertText('\n'.join(result_lines))
-            # 结束复合编辑操作
-            cursor.endEditBlock()
+        if result:
+            self._apply_tool_result(editor, result)
 
     def open_file(self):
         """打开文件到新标签页"""
         file_path, _ = QFileDialog.getOpenFileName(self, '打开文件', '', 'SQL Files (*.sql);;All Files (*)')
         if file_path:
-            try:
-                with open(file_path, 'rb') as f:
-                    raw_data = f.read()
-                    # 自动检测文件编码
-                    detected = chardet.detect(raw_data)
-                    encoding = detected['encoding'] or 'gbk'
-                    try:
-                        text = raw_data.decode(encoding)
-                    except UnicodeDecodeError:
-                        text = raw_data.decode('gbk', errors='replace')
-                    # 分步解码策略
-                    try:
-                        text = raw_data.decode('utf-8')
-                    except UnicodeDecodeError:
-                        detected = chardet.detect(raw_data)
-                        text = raw_data.decode(detected['encoding'] or 'gb18030', errors='replace')
-                
-                # 创建新标签页并设置内容
-                tab_editor = self.new_tab(file_path, text)
-                tab_editor.is_modified = False  # 刚打开的文件标记为未修改
-                self.update_tab_title(tab_editor)
-                
-            except Exception as e:
-                QMessageBox.critical(self, '打开失败', f'文件解码失败: {str(e)}')
+            self.open_file_path(file_path)
+
+    def open_file_path(self, file_path):
+        """
+        打开指定路径的文件到新标签页
+
+        Args:
+            file_path (str): 文件路径
+
+        Returns:
+            TabEditor: 新建的标签页，打开失败时返回None
+        """
+        try:
+            # 自动检测文件编码
+            text, encoding = read_text_file(file_path)
+        except Exception as e:
+            QMessageBox.critical(self, '打开失败', f'文件解码失败: {str(e)}')
+            return None
+
+        # 创建新标签页并设置内容
+        tab_editor = self.new_tab(file_path, text)
+        tab_editor.encoding = encoding
+        tab_editor.disk_signature = file_signature(file_path)
+        tab_editor.is_modified = False  # 刚打开的文件标记为未修改
+        self.update_tab_title(tab_editor)
+        self.update_watched_files()
+        return tab_editor
     
     def save_file(self):
         """保存当前标签页的文件"""
@@ -675,6 +1353,7 @@ class SQLFormatterApp(QMainWindow):
             if current_tab.save(file_path):
                 self.update_tab_title(current_tab)
                 self.update_window_title()
+                self.update_watched_files()
             else:
                 QMessageBox.critical(self, '保存失败', '文件保存失败')
                 
@@ -685,12 +1364,14 @@ class SQLFormatterApp(QMainWindow):
         else:
             # 如果没有文件路径，弹出另存为对话框
             file_path, _ = QFileDialog.getSaveFileName(self, '保存文件', '', 'SQL Files (*.sql);;All Files (*)')
-            if file_path:
-                return tab_editor.save(file_path)
+            if file_path and tab_editor.save(file_path):
+                self.update_watched_files()
+                return True
         return False
     
     def exit_app(self):
-        QApplication.instance().quit()
+        # 通过关闭主窗口退出，以便在 closeEvent 中保存会话
+        self.close()
 
     def show_about(self):
         """
@@ -740,6 +1421,97 @@ class SQLFormatterApp(QMainWindow):
         
         QMessageBox.about(self, "关于 SQL编辑器", about_text)
 
+    def show_startup_report(self):
+        """显示启动过程中各阶段的耗时"""
+        QMessageBox.information(self, "启动耗时", f"<pre>{html.escape(StartupTiming.report())}</pre>")
+
+    def toggle_perf_hud(self, checked):
+        """
+        显示或隐藏性能监视面板，面板显示期间记录热点路径的耗时
+
+        Args:
+            checked (bool): 是否显示
+        """
+        if self._perf_hud is None:
+            self._perf_hud = PerfMonitor.PerfHud(self)
+        self._perf_hud.set_active(checked)
+
+    def export_perf_trace(self):
+        """把性能监视记录的事件导出为 Chrome/Perfetto 跟踪文件"""
+        if not PerfMonitor.event_count():
+            QMessageBox.information(self, '导出性能跟踪', '没有记录。请先打开“视图 → 性能监视面板”，复现卡顿后再导出。')
+            return
+        file_path, _ = QFileDialog.getSaveFileName(self, '导出性能跟踪', 'trace.json', 'Trace Files (*.json)')
+        if not file_path:
+            return
+        try:
+            count = PerfMonitor.export_trace(file_path)
+        except OSError as e:
+            QMessageBox.critical(self, '导出失败', f'写入跟踪文件失败: {str(e)}')
+            return
+        self.statusBar().showMessage(f"已导出 {count} 个事件，可在 chrome://tracing 或 ui.perfetto.dev 中打开", 5000)
+
+    def show_stall_report(self):
+        """显示记录的界面卡顿，按命令和调用热点排列"""
+        report = self.stall_watchdog.report()
+        QMessageBox.information(
+            self, "卡顿报告",
+            f"<pre>{html.escape(report)}</pre><p>记录文件: {html.escape(self.stall_watchdog.report_path)}</p>")
+
+    def configure_stall_threshold(self):
+        """设置界面卡顿监视的阈值"""
+        threshold, ok = QInputDialog.getInt(
+            self, '卡顿监视阈值', '界面超过该时间（毫秒）没有响应时记录调用栈:',
+            round(self.stall_watchdog.threshold * 1000), 50, 10000, 50)
+        if ok:
+            self.stall_watchdog.set_threshold(threshold)
+
+    def toggle_profile_next_action(self, checked):
+        """
+        打开时用 cProfile 分析下一个执行的操作（工具命令、打开/保存、查找/替换），完成后显示耗时最多的函数
+
+        Args:
+            checked (bool): 是否分析下一个操作
+        """
+        if checked:
+            PerfMonitor.profile_next_action(app_data_dir('diagnostics', 'profiles'), self.on_action_profiled)
+            self.statusBar().showMessage("将分析下一个操作", 3000)
+        else:
+            PerfMonitor.cancel_profile()
+
+    def on_action_profiled(self, name, prof_path, summary):
+        """
+        显示操作的分析结果
+
+        Args:
+            name (str): 操作名称
+            prof_path (str): 分析结果文件路径，保存失败时为 None
+            summary (str): 按累计时间排列的函数，保存失败时为错误信息
+        """
+        self.profile_action.blockSignals(True)
+        self.profile_action.setChecked(False)
+        self.profile_action.blockSignals(False)
+        if prof_path is None:
+            QMessageBox.warning(self, '分析操作', summary)
+            return
+        # 操作可能在对话框中触发，等它返回后再显示
+        QTimer.singleShot(0, lambda: QMessageBox.information(
+            self, f'分析操作: {name}',
+            f"<p>分析结果: {html.escape(prof_path)}</p><p>摘要: {html.escape(os.path.splitext(prof_path)[0])}.txt</p>"
+            f"<pre>{html.escape(summary)}</pre>"))
+
+    def current_tab_chars(self):
+        """
+        返回当前标签页的字符数，尚未创建编辑器的标签页返回 None（不会因此创建编辑器）
+
+        Returns:
+            int: 字符数
+        """
+        tab_editor = self.get_current_tab_editor()
+        if tab_editor is None or not tab_editor.is_materialized():
+            return None
+        return tab_editor.editor.document().characterCount()
+
     def show_find_replace_dialog(self):
         """
         显示查找替换对话框（非模态）
@@ -754,12 +1526,98 @@ class SQLFormatterApp(QMainWindow):
             self._find_replace_dialog.activateWindow()
             self._find_replace_dialog.raise_()
             return
-        # 创建新对话框
-        self._find_replace_dialog = FindReplaceDialog(self, current_editor)
+        # 创建新对话框，对话框模块在第一次使用时才导入
+        from FindReplaceDialog import FindReplaceDialog
+        self._find_replace_dialog = FindReplaceDialog(self, current_editor, self.get_tab_editors,
+                                                       self.get_regex_sandbox())
+        self._find_replace_dialog.result_activated.connect(self.tab_widget.setCurrentWidget)
         # 关闭时清理引用
         self._find_replace_dialog.finished.connect(lambda _: setattr(self, '_find_replace_dialog', None))
         self._find_replace_dialog.show()
         
+    def show_workspace_search_dialog(self):
+        """显示文件夹查找对话框（非模态），初始目录为当前文件所在的目录"""
+        dialog = getattr(self, '_workspace_search_dialog', None)
+        if dialog is not None:
+            dialog.activateWindow()
+            dialog.raise_()
+            return
+        directory = ''
+        current_tab = self.get_current_tab_editor()
+        if current_tab and current_tab.file_path:
+            directory = os.path.dirname(os.path.abspath(current_tab.file_path))
+        from WorkspaceSearchDialog import WorkspaceSearchDialog
+        self._workspace_search_dialog = WorkspaceSearchDialog(self, directory, self.get_regex_sandbox())
+        self._workspace_search_dialog.location_activated.connect(self.open_file_at_line)
+        self._workspace_search_dialog.finished.connect(lambda _: setattr(self, '_workspace_search_dialog', None))
+        self._workspace_search_dialog.show()
+
+    def find_tab_by_path(self, file_path):
+        """
+        查找已打开指定文件的标签页
+
+        Args:
+            file_path (str): 文件路径
+
+        Returns:
+            TabEditor: 找到的标签页，未打开时返回None
+        """
+        path = os.path.abspath(file_path)
+        return next((tab for tab in self.get_tab_editors()
+                     if tab.file_path and os.path.abspath(tab.file_path) == path), None)
+
+    def open_files(self, file_paths):
+        """
+        打开多个文件，已打开的文件不重复打开，最后切换到最后一个文件的标签页
+
+        Args:
+            file_paths (list): 文件路径列表
+        """
+        last_tab = None
+        for file_path in file_paths:
+            tab_editor = self.find_tab_by_path(file_path) or self.open_file_path(os.path.abspath(file_path))
+            if tab_editor is not None:
+                last_tab = tab_editor
+        if last_tab is not None:
+            self.tab_widget.setCurrentWidget(last_tab)
+
+    def open_forwarded_files(self, file_paths):
+        """
+        打开其他进程转交的文件，并把窗口切换到前台
+
+        Args:
+            file_paths (list): 文件路径列表，为空时只切换到前台
+        """
+        self.open_files(file_paths)
+        if self.isMinimized():
+            self.showNormal()
+        self.raise_()
+        self.activateWindow()
+
+    def open_file_at_line(self, file_path, line_number):
+        """
+        打开文件（已打开时切换到该标签页）并把光标移到指定行
+
+        Args:
+            file_path (str): 文件路径
+            line_number (int): 行号，从1开始
+        """
+        path = os.path.abspath(file_path)
+        tab_editor = self.find_tab_by_path(path)
+        if tab_editor is None:
+            tab_editor = self.open_file_path(path)
+            if tab_editor is None:
+                return
+        self.tab_widget.setCurrentWidget(tab_editor)
+        editor = tab_editor.ensure_editor()
+        block = editor.document().findBlockByNumber(line_number - 1)
+        if block.isValid():
+            cursor = editor.textCursor()
+            cursor.setPosition(block.position())
+            editor.setTextCursor(cursor)
+            editor.centerCursor()
+        editor.setFocus()
+
     def toggle_whitespace_visibility(self):
         """切换空白字符显示状态"""
         show_whitespace = self.show_whitespace_action.isChecked()
@@ -767,5 +1625,19 @@ class SQLFormatterApp(QMainWindow):
         # 对所有标签页应用设置
         for i in range(self.tab_widget.count()):
             tab_editor = self.tab_widget.widget(i)
-            if tab_editor and hasattr(tab_editor, 'editor'):
+            # 尚未创建编辑器的标签页会在创建时应用该设置
+            if isinstance(tab_editor, TabEditor) and tab_editor.is_materialized():
                 tab_editor.editor.set_show_whitespace(show_whitespace)
+
+    def change_whitespace_mode(self, action):
+        """
+        切换空白字符的显示方式
+
+        Args:
+            action (QAction): 选中的显示方式菜单项
+        """
+        mode = action.data()
+        for tab_editor in self.get_tab_editors():
+            # 尚未创建编辑器的标签页会在创建时应用该设置
+            if tab_editor.is_materialized():
+                tab_editor.editor.set_whitespace_mode(mode)
@@ -1,11 +1,72 @@
 from PySide6.QtGui import QTextCharFormat, QSyntaxHighlighter, QColor
+import PerfMonitor
+import time
+
+
+# 超过该长度的行视为超长行（压缩或生成的单行SQL），只高亮可见的部分
+LONG_LINE_LENGTH = 10000
+
+# SQL关键字，高亮器和关键字大写等编辑功能共用
+SQL_KEYWORDS = frozenset({
+    "ABSOLUTE", "ACTION", "ADD", "ADMIN", "AFTER", "AGGREGATE", "ALIAS", "ALL",
+    "ALLOCATE", "ALTER", "AND", "ANY", "ARE", "ARRAY", "AS", "ASC", "ASSERTION",
+    "AT", "AUTHORIZATION", "BEFORE", "BEGIN", "BETWEEN", "BINARY", "BIT", "BLOB",
+    "BOOLEAN", "BOTH", "BREADTH", "BY", "CALL", "CASCADE", "CASCADED", "CASE",
+    "CAST", "CATALOG", "CHAR", "CHARACTER", "CHECK", "CLASS", "CLOB", "CLOSE",
+    "COLLATE", "COLLATION", "COLUMN", "COMMENT", "COMMIT", "COMPLETION", "CONNECT",
+    "CONNECTION", "CONSTRAINT", "CONSTRAINTS", "CONSTRUCTOR", "CONTINUE",
+    "CORRESPONDING", "CREATE", "CROSS", "CUBE", "CURRENT", "CURRENT_DATE",
+    "CURRENT_PATH", "CURRENT_ROLE", "CURRENT_TIME", "CURRENT_TIMESTAMP",
+    "CURRENT_USER", "CURSOR", "CYCLE", "DATA", "DATE", "DAY", "DEALLOCATE",
+    "DEC", "DECIMAL", "DECLARE", "DEFAULT", "DEFERRABLE", "DEFERRED", "DELETE",
+    "DEPTH", "DEREF", "DESC", "DESCRIBE", "DESCRIPTOR", "DESTROY", "DESTRUCTOR",
+    "DETERMINISTIC", "DIAGNOSTICS", "DICTIONARY", "DISCONNECT", "DISTINCT",
+    "DOMAIN", "DOUBLE", "DROP", "DYNAMIC", "DYNAMIC_FUNCTION_CODE", "EACH",
+    "ELSE", "END", "END-EXEC", "EQUALS", "ESCAPE", "EVERY", "EXCEPT", "EXCEPTION",
+    "EXEC", "EXECUTE", "EXISTS", "EXTERNAL", "FALSE", "FETCH", "FIRST", "FLOAT",
+    "FOLLOWING", "FOR", "FOREIGN", "FOUND", "FREE", "FROM", "FULL", "FUNCTION",
+    "GENERAL", "GET", "GLOBAL", "GO", "GOTO", "GRANT", "GROUP", "GROUPING",
+    "HAVING", "HOST", "HOUR", "IDENTITY", "IF", "IGNORE", "IMMEDIATE", "IN",
+    "INDEX", "INDICATOR", "INITIALIZE", "INITIALLY", "INNER", "INOUT", "INPUT",
+    "INSERT", "INT", "INTEGER", "INTERSECT", "INTERVAL", "INTO", "IS", "ISOLATION",
+    "ITERATE", "JOIN", "KEY", "LANGUAGE", "LARGE", "LAST", "LATERAL", "LEADING",
+    "LEFT", "LESS", "LEVEL", "LIKE", "LIMIT", "LOCAL", "LOCALTIME", "LOCALTIMESTAMP",
+    "LOCATOR", "MAP", "MATCH", "MATCHED", "MATERIALIZED", "MERGE", "MINUS",
+    "MINUTE", "MODIFIES", "MODIFY", "MODULE", "MONTH", "NAMES", "NATIONAL",
+    "NATURAL", "NCHAR", "NCLOB", "NEW", "NEXT", "NO", "NONE", "NOT", "NULL",
+    "NULLS", "NUMERIC", "OBJECT", "OF", "OFF", "OFFSET", "OLD", "ON", "ONLY",
+    "OPEN", "OPERATION", "OPTION", "OR", "ORDER", "ORDINALITY", "OUT", "OUTER",
+    "OUTPUT", "OVER", "PAD", "PARAMETER", "PARAMETERS", "PARTIAL", "PARTITION",
+    "PATH", "POSTFIX", "PRECEDING", "PRECISION", "PREFIX", "PREORDER", "PREPARE",
+    "PRESERVE", "PRIMARY", "PRIOR", "PRIVILEGES", "PROCEDURE", "PUBLIC", "RANGE",
+    "READ", "READS", "REAL", "RECURSIVE", "REF", "REFERENCES", "REFERENCING",
+    "RELATIVE", "REPLACE", "RESPECT", "RESTRICT", "RESULT", "RETURN",
+    "RETURNED_LENGTH", "RETURNING", "RETURNS", "REVOKE", "RIGHT", "ROLE",
+    "ROLLBACK", "ROLLUP", "ROUTINE", "ROW", "ROWS", "SAVEPOINT", "SCHEMA",
+    "SCOPE", "SCROLL", "SEARCH", "SECOND", "SECTION", "SELECT", "SEQUENCE",
+    "SESSION", "SESSION_USER", "SET", "SETS", "SIMILAR", "SIZE", "SMALLINT",
+    "SOME", "SPACE", "SPECIFIC", "SPECIFICTYPE", "SQL", "SQLEXCEPTION",
+    "SQLSTATE", "SQLWARNING", "START", "STATE", "STATEMENT", "STATIC",
+    "STRUCTURE", "SYSTEM_USER", "TABLE", "TEMPORARY", "TERMINATE", "THAN",
+    "THEN", "TIME", "TIMESTAMP", "TIMEZONE_HOUR", "TIMEZONE_MINUTE", "TO",
+    "TRAILING", "TRANSACTION", "TRANSLATION", "TREAT", "TRIGGER", "TRUE",
+    "TRUNCATE", "UNBOUNDED", "UNDER", "UNION", "UNIQUE", "UNKNOWN", "UNNEST",
+    "UPDATE", "USAGE", "USER", "USING", "VALUE", "VALUES", "VARCHAR",
+    "VARIABLE", "VARYING", "VIEW", "WHEN", "WHENEVER", "WHERE", "WHILE",
+    "WINDOW", "WITH", "WITHOUT", "WORK", "WRITE", "YEAR", "ZONE"
+})
 
 
 class SQLHighlighter(QSyntaxHighlighter):
     """
     SQL语法高亮器类，用于在文本编辑器中高亮显示SQL语法
     支持关键字、字符串和注释的高亮显示
+
+    超长行只高亮编辑器通过 set_visible_range 告知的可见区间（前后各留 SEGMENT_MARGIN 个字符），
+    区间开始处如果位于字符串中间，该字符串的颜色可能不准确。
     """
+
+    SEGMENT_MARGIN = 5000
     
     def __init__(self, parent=None):
         """初始化SQL语法高亮器"""
@@ -24,55 +85,38 @@ class SQLHighlighter(QSyntaxHighlighter):
         self.comment_format = QTextCharFormat()
         self.comment_format.setForeground(QColor("#6DB487"))
 
-        # SQL关键字列表
-        self.keywords = [
-            "ABSOLUTE", "ACTION", "ADD", "ADMIN", "AFTER", "AGGREGATE", "ALIAS", "ALL",
-            "ALLOCATE", "ALTER", "AND", "ANY", "ARE", "ARRAY", "AS", "ASC", "ASSERTION",
-            "AT", "AUTHORIZATION", "BEFORE", "BEGIN", "BETWEEN", "BINARY", "BIT", "BLOB",
-            "BOOLEAN", "BOTH", "BREADTH", "BY", "CALL", "CASCADE", "CASCADED", "CASE",
-            "CAST", "CATALOG", "CHAR", "CHARACTER", "CHECK", "CLASS", "CLOB", "CLOSE",
-            "COLLATE", "COLLATION", "COLUMN", "COMMENT", "COMMIT", "COMPLETION", "CONNECT",
-            "CONNECTION", "CONSTRAINT", "CONSTRAINTS", "CONSTRUCTOR", "CONTINUE",
-            "CORRESPONDING", "CREATE", "CROSS", "CUBE", "CURRENT", "CURRENT_DATE",
-            "CURRENT_PATH", "CURRENT_ROLE", "CURRENT_TIME", "CURRENT_TIMESTAMP",
-            "CURRENT_USER", "CURSOR", "CYCLE", "DATA", "DATE", "DAY", "DEALLOCATE",
-            "DEC", "DECIMAL", "DECLARE", "DEFAULT", "DEFERRABLE", "DEFERRED", "DELETE",
-            "DEPTH", "DEREF", "DESC", "DESCRIBE", "DESCRIPTOR", "DESTROY", "DESTRUCTOR",
-            "DETERMINISTIC", "DIAGNOSTICS", "DICTIONARY", "DISCONNECT", "DISTINCT",
-            "DOMAIN", "DOUBLE", "DROP", "DYNAMIC", "DYNAMIC_FUNCTION_CODE", "EACH",
-            "ELSE", "END", "END-EXEC", "EQUALS", "ESCAPE", "EVERY", "EXCEPT", "EXCEPTION",
-            "EXEC", "EXECUTE", "EXISTS", "EXTERNAL", "FALSE", "FETCH", "FIRST", "FLOAT",
-            "FOLLOWING", "FOR", "FOREIGN", "FOUND", "FREE", "FROM", "FULL", "FUNCTION",
-            "GENERAL", "GET", "GLOBAL", "GO", "GOTO", "GRANT", "GROUP", "GROUPING",
-            "HAVING", "HOST", "HOUR", "IDENTITY", "IF", "IGNORE", "IMMEDIATE", "IN",
-            "INDEX", "INDICATOR", "INITIALIZE", "INITIALLY", "INNER", "INOUT", "INPUT",
-            "INSERT", "INT", "INTEGER", "INTERSECT", "INTERVAL", "INTO", "IS", "ISOLATION",
-            "ITERATE", "JOIN", "KEY", "LANGUAGE", "LARGE", "LAST", "LATERAL", "LEADING",
-            "LEFT", "LESS", "LEVEL", "LIKE", "LIMIT", "LOCAL", "LOCALTIME", "LOCALTIMESTAMP",
-            "LOCATOR", "MAP", "MATCH", "MATCHED", "MATERIALIZED", "MERGE", "MINUS",
-            "MINUTE", "MODIFIES", "MODIFY", "MODULE", "MONTH", "NAMES", "NATIONAL",
-            "NATURAL", "NCHAR", "NCLOB", "NEW", "NEXT", "NO", "NONE", "NOT", "NULL",
-            "NULLS", "NUMERIC", "OBJECT", "OF", "OFF", "OFFSET", "OLD", "ON", "ONLY",
-            "OPEN", "OPERATION", "OPTION", "OR", "ORDER", "ORDINALITY", "OUT", "OUTER",
-            "OUTPUT", "OVER", "PAD", "PARAMETER", "PARAMETERS", "PARTIAL", "PARTITION",
-            "PATH", "POSTFIX", "PRECEDING", "PRECISION", "PREFIX", "PREORDER", "PREPARE",
-            "PRESERVE", "PRIMARY", "PRIOR", "PRIVILEGES", "PROCEDURE", "PUBLIC", "RANGE",
-            "READ", "READS", "REAL", "RECURSIVE", "REF", "REFERENCES", "REFERENCING",
-            "RELATIVE", "REPLACE", "RESPECT", "RESTRICT", "RESULT", "RETURN",
-            "RETURNED_LENGTH", "RETURNING", "RETURNS", "REVOKE", "RIGHT", "ROLE",
-            "ROLLBACK", "ROLLUP", "ROUTINE", "ROW", "ROWS", "SAVEPOINT", "SCHEMA",
-            "SCOPE", "SCROLL", "SEARCH", "SECOND", "SECTION", "SELECT", "SEQUENCE",
-            "SESSION", "SESSION_USER", "SET", "SETS", "SIMILAR", "SIZE", "SMALLINT",
-            "SOME", "SPACE", "SPECIFIC", "SPECIFICTYPE", "SQL", "SQLEXCEPTION",
-            "SQLSTATE", "SQLWARNING", "START", "STATE", "STATEMENT", "STATIC",
-            "STRUCTURE", "SYSTEM_USER", "TABLE", "TEMPORARY", "TERMINATE", "THAN",
-            "THEN", "TIME", "TIMESTAMP", "TIMEZONE_HOUR", "TIMEZONE_MINUTE", "TO",
-            "TRAILING", "TRANSACTION", "TRANSLATION", "TREAT", "TRIGGER", "TRUE",
-            "TRUNCATE", "UNBOUNDED", "UNDER", "UNION", "UNIQUE", "UNKNOWN", "UNNEST",
-            "UPDATE", "USAGE", "USER", "USING", "VALUE", "VALUES", "VARCHAR",
-            "VARIABLE", "VARYING", "VIEW", "WHEN", "WHENEVER", "WHERE", "WHILE",
-            "WINDOW", "WITH", "WITHOUT", "WORK", "WRITE", "YEAR", "ZONE"
-        ]
+        # SQL关键字集合
+        self.keywords = SQL_KEYWORDS
+
+        # 超长行的可见区间：块号 -> (起始位置, 结束位置)
+        self.visible_ranges = {}
+
+    def set_visible_range(self, block, start, end):
+        """
+        设置超长行的可见区间并重新高亮该行
+
+        Args:
+            block (QTextBlock): 超长行所在的块
+            start (int): 可见部分在块内的起始位置
+            end (int): 可见部分在块内的结束位置
+        """
+        self.visible_ranges[block.blockNumber()] = (start, end)
+        self.rehighlightBlock(block)
+
+    def highlighted_range(self, block):
+        """
+        返回超长行当前已高亮的区间
+
+        Args:
+            block (QTextBlock): 块
+
+        Returns:
+            tuple: (起始位置, 结束位置)，没有记录时返回 None
+        """
+        visible = self.visible_ranges.get(block.blockNumber())
+        if visible is None:
+            return None
+        return max(0, visible[0] - self.SEGMENT_MARGIN), visible[1] + self.SEGMENT_MARGIN
 
     def highlightBlock(self, text):
         """
@@ -81,11 +125,41 @@ class SQLHighlighter(QSyntaxHighlighter):
         Args:
             text (str): 需要高亮显示的文本
         """
+        if not PerfMonitor.enabled:
+            self._highlight_block(text)
+            return
+        started = time.perf_counter()
+        self._highlight_block(text)
+        PerfMonitor.record("SQLHighlighter.highlightBlock", started)
+
+    def _highlight_block(self, text):
+        """高亮显示文本块，超长行只处理可见区间"""
+        if len(text) <= LONG_LINE_LENGTH:
+            self._highlight_segment(text, 0)
+            return
+        # 超长行只处理可见区间
+        visible = self.visible_ranges.get(self.currentBlock().blockNumber(), (0, 0))
+        start = max(0, visible[0] - self.SEGMENT_MARGIN)
+        end = min(len(text), visible[1] + self.SEGMENT_MARGIN)
+        self._highlight_segment(text[start:end], start)
+        # 区间之前开始的注释一直延续到行尾
+        comment_start = text.find("--", 0, start)
+        if comment_start != -1:
+            self.setFormat(start, end - start, self.comment_format)
+
+    def _highlight_segment(self, text, offset):
+        """
+        高亮一段文本
+
+        Args:
+            text (str): 文本片段
+            offset (int): 片段在块内的起始位置
+        """
         # 高亮关键字
         for word in text.split():
             if word.upper() in self.keywords:
                 start = text.find(word)
-                self.setFormat(start, len(word), self.keyword_format)
+                self.setFormat(offset + start, len(word), self.keyword_format)
         
         # 高亮字符串
         in_string = False
@@ -95,11 +169,11 @@ class SQLHighlighter(QSyntaxHighlighter):
                 in_string = True
                 start_idx = i
             elif char == "'" and in_string:
-                self.setFormat(start_idx, i - start_idx + 1, self.string_format)
+                self.setFormat(offset + start_idx, i - start_idx + 1, self.string_format)
                 in_string = False
                 start_idx = -1
         
         # 高亮注释
         comment_start = text.find("--")
         if comment_start != -1:
-            self.setFormat(comment_start, len(text) - comment_start, self.comment_format)
\ No newline at end of file
+            self.setFormat(offset + comment_start, len(text) - comment_start, self.comment_format)
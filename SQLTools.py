@@ -0,0 +1,221 @@
+"""
+SQL 文本工具模块
+
+格式化、Java 格式互转、参数填充、注释对齐、模板填充、超长行拆分等工具的纯文本实现，
+不依赖界面，输入和输出都是字符串；由主窗口负责把结果作为差异应用到编辑器。
+"""
+
+import re
+
+
+def format_sql_text(sql):
+    """
+    格式化SQL，关键字大写
+
+    Args:
+        sql (str): 原始SQL
+
+    Returns:
+        str: 格式化后的SQL
+    """
+    # sqlparse 导入较慢，第一次格式化时才导入；启动后由 warm_up_formatter 在后台提前导入
+    import sqlparse
+    return sqlparse.format(sql,
+        reindent=True,
+        keyword_case='upper',
+        strip_comments=True,
+        use_space_around_operators=True,
+        comma_first=True
+    )
+
+
+def warm_up_formatter():
+    """
+    预先导入 sqlparse 并格式化一条简单的语句，第一次格式化时不必再等待模块加载，
+    在后台线程中调用
+    """
+    format_sql_text("select a, b from t where c = 1 -- warm up")
+
+
+def sql_to_java(sql):
+    """
+    将SQL转换为 StringBuffer 拼接形式的Java代码
+
+    Args:
+        sql (str): SQL文本
+
+    Returns:
+        str: Java代码
+    """
+    parts = ["StringBuffer sb = new StringBuffer();\n"]
+    for line in sql.split('\n'):
+        # Escape quotes and preserve whitespace
+        escaped_line = line.replace('"', '\\"').replace('\\', '\\\\')
+        parts.append(f'sb.append(" {escaped_line} ");\n')
+    return ''.join(parts)
+
+
+def java_to_sql(java_code):
+    """
+    从Java格式的代码中提取引号内的内容，还原为SQL
+
+    Args:
+        java_code (str): Java代码
+
+    Returns:
+        str: SQL文本，没有可提取的内容时返回空字符串
+    """
+    result_lines = []
+    for index, line in enumerate(java_code.splitlines()):
+        # Skip empty lines and lines without quoted content
+        if not line.strip() or '"' not in line:
+            continue
+        content = line.split('"')[1]
+        # Remove leading whitespace for all except first line
+        if index > 0:
+            content = content.lstrip()
+        result_lines.append(content)
+    return "\n".join(result_lines)
+
+
+def fill_parameters(sql, params):
+    """
+    依次用参数值替换SQL中的占位符 ?
+
+    Args:
+        sql (str): 含占位符的SQL
+        params (list): 参数值列表
+
+    Returns:
+        str: 填充后的SQL
+
+    Raises:
+        ValueError: 占位符数量与参数数量不一致，args 为 (占位符数量, 参数数量)
+    """
+    placeholder_count = sql.count('?')
+    if placeholder_count != len(params):
+        raise ValueError(placeholder_count, len(params))
+    # 一次分割后拼接，避免逐个 replace 反复复制整段文本
+    pieces = sql.split('?')
+    parts = [pieces[0]]
+    for param, piece in zip(params, pieces[1:]):
+        parts.append(f"'{param}'")
+        parts.append(piece)
+    return ''.join(parts)
+
+
+def align_comment_lines(java_code):
+    """
+    将tab转换为4个空格，并把各行的 // 注释对齐到同一列
+
+    Args:
+        java_code (str): 代码文本
+
+    Returns:
+        str: 对齐后的文本
+    """
+    processed_lines = []
+    max_comment_pos = 0
+    for line in java_code.splitlines():
+        line_with_spaces = line.replace('\t', '    ')
+        comment_pos = line_with_spaces.find('//')
+        if comment_pos != -1:
+            max_comment_pos = max(max_comment_pos, comment_pos)
+        processed_lines.append((line_with_spaces, comment_pos))
+
+    result_lines = []
+    for line, comment_pos in processed_lines:
+        if comment_pos != -1:
+            line = line[:comment_pos] + ' ' * (max_comment_pos - comment_pos) + line[comment_pos:]
+        result_lines.append(line)
+    return '\n'.join(result_lines)
+
+
+def fill_template(text, template):
+    """
+    按行把文本中以tab分隔的字段填入模板的 {0}、{1} 等占位符
+
+    Args:
+        text (str): 数据文本，每行一条记录
+        template (str): 代码模板
+
+    Returns:
+        str: 填充结果，没有非空行时返回空字符串
+
+    Raises:
+        IndexError: 模板占位符多于行内字段
+    """
+    result_lines = []
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        parts = [part.strip() for part in line.split('\t')]
+        result_lines.extend(template.format(*parts).split('\n'))  # 支持多行输出
+    return '\n'.join(result_lines)
+
+
+# 快速拆分超长行时的断行位置：语句结束的分号之后、子句关键字之前；跳过字符串和注释
+_SPLIT_PATTERN = re.compile(
+    r"'(?:[^']|'')*'|\"[^\"\n]*\"|--[^\n]*|/\*.*?\*/|;|"
+    r"\b(?:(?:LEFT|RIGHT|FULL|INNER|CROSS)\s+(?:OUTER\s+)?JOIN|JOIN|GROUP\s+BY|ORDER\s+BY"
+    r"|UNION(?:\s+ALL)?|SELECT|FROM|WHERE|HAVING|VALUES|SET|AND|OR|LIMIT"
+    r"|INSERT|UPDATE|DELETE)\b",
+    re.IGNORECASE | re.DOTALL)
+
+
+def longest_line_length(text):
+    """
+    返回文本中最长一行的字符数
+
+    Args:
+        text (str): 文本
+
+    Returns:
+        int: 最长行的长度
+    """
+    return max(map(len, text.split('\n')), default=0)
+
+
+def split_long_lines(text, max_length):
+    """
+    在语句和子句边界处拆分超过 max_length 的行，其他行保持不变
+
+    只做断行，不调整缩进和大小写，用于让压缩成一行的SQL能够正常编辑；
+    需要完整排版时再使用格式化功能。
+
+    Args:
+        text (str): SQL文本
+        max_length (int): 超过该长度的行才会被拆分
+
+    Returns:
+        str: 拆分后的文本
+    """
+    lines = text.split('\n')
+    for index, line in enumerate(lines):
+        if len(line) > max_length:
+            lines[index] = _split_line(line)
+    return '\n'.join(lines)
+
+
+def _split_line(line):
+    """在语句和子句边界处拆分一行"""
+    pieces = []
+    piece_start = 0
+    for match in _SPLIT_PATTERN.finditer(line):
+        token = match.group()
+        first = token[0]
+        if first in "'\"-/":
+            continue
+        if token == ';':
+            cut = match.end()
+        else:
+            cut = match.start()
+        if cut > piece_start:
+            piece = line[piece_start:cut].strip()
+            if piece:
+                pieces.append(piece)
+            piece_start = cut
+    tail = line[piece_start:].strip()
+    if tail:
+        pieces.append(tail)
+    return '\n'.join(pieces)
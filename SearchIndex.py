@@ -0,0 +1,528 @@
+"""
+查找匹配索引模块
+
+查找结果只保存匹配的起止位置，使用 array 紧凑存储，按位置有序；
+编辑器只根据视口范围二分查找需要绘制的匹配项，与匹配总数无关。
+查找在后台线程中对文本快照执行，分批把结果送回主线程，可以随时取消；
+文档编辑后只在变化附近重新查找，并支持按位置二分查找上一个、下一个匹配项。
+全部替换同样在后台线程中计算各匹配项的替换内容，分批送回主线程按顺序应用。
+正则表达式可以交给 RegexSandbox 在工作进程中执行，执行过慢时报告错误而不会卡住界面。
+"""
+
+import re
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from functools import lru_cache
+from re import _parser as sre_parse
+from PySide6.QtCore import QObject, Signal
+from BlockTransform import range_text
+from RegexSandbox import RegexSandboxError, is_line_local
+
+
+def required_literals(find_text, use_regex, case_sensitive):
+    """
+    提取匹配结果中必定出现的文字片段（小写），用于通过索引筛选候选文件或文本块
+
+    正则表达式只取顶层连续的普通字符；含有顶层分支（|）或无法解析时返回空列表，
+    表示不能筛选。
+
+    Args:
+        find_text (str): 查找内容
+        use_regex (bool): 是否为正则表达式
+        case_sensitive (bool): 是否区分大小写
+
+    Returns:
+        list: 文字片段列表
+    """
+    if not use_regex:
+        return [find_text.lower()]
+    try:
+        parsed = sre_parse.parse(find_text, 0 if case_sensitive else re.IGNORECASE)
+    except re.error:
+        return []
+    literals = []
+    current = []
+    for op, value in parsed:
+        if op is sre_parse.LITERAL:
+            current.append(chr(value))
+            continue
+        if op is sre_parse.BRANCH:
+            return []
+        if current:
+            literals.append(''.join(current).lower())
+            current = []
+    if current:
+        literals.append(''.join(current).lower())
+    return literals
+
+
+@lru_cache(maxsize=64)
+def compile_search_pattern(find_text, use_regex, case_sensitive):
+    """
+    把查找内容编译为正则表达式，普通查找按字面值转义；结果会被缓存，重复查找时不再编译
+
+    Args:
+        find_text (str): 查找内容
+        use_regex (bool): 是否为正则表达式
+        case_sensitive (bool): 是否区分大小写
+
+    Returns:
+        re.Pattern: 编译后的正则表达式
+
+    Raises:
+        re.error: 正则表达式无效
+    """
+    if not use_regex:
+        find_text = re.escape(find_text)
+    return re.compile(find_text, 0 if case_sensitive else re.IGNORECASE)
+
+
+def replace_matches(pattern, text, replacement, use_regex):
+    """
+    替换文本中的所有匹配项
+
+    正则表达式模式下替换内容支持 \\1 等反向引用，普通查找按字面值替换。
+
+    Args:
+        pattern (re.Pattern): 正则表达式
+        text (str): 原文本
+        replacement (str): 替换内容
+        use_regex (bool): 是否为正则表达式模式
+
+    Returns:
+        tuple: (替换后的文本, 替换的数量)
+
+    Raises:
+        re.error: 替换内容中的反向引用无效
+    """
+    if not use_regex:
+        return pattern.subn(lambda match: replacement, text)
+    return pattern.subn(replacement, text)
+
+
+class MatchIndex:
+    """
+    匹配位置索引
+
+    starts、ends 为按位置升序排列的匹配起止位置（文档字符位置，结束位置不包含）。
+    finditer 的结果互不重叠，因此两个数组都是有序的，可以直接二分查找。
+
+    文档编辑后只重新查找变化所在的行，其后的匹配项整体平移（只适用于不跨行的表达式，
+    见 is_line_local）。平移是延迟的：
+    序号不小于 _shift_index 的元素实际位置还要加上 _shift，在同一处连续输入时
+    只需要累加偏移量，不必每次按键都改写其后的所有元素。
+    """
+
+    def __init__(self, pattern=None):
+        """
+        初始化匹配索引
+
+        Args:
+            pattern (re.Pattern): 建立索引使用的正则表达式
+        """
+        self.pattern = pattern
+        self.incremental = pattern is not None and is_line_local(pattern)
+        self.starts = array('q')
+        self.ends = array('q')
+        self._shift_index = 0
+        self._shift = 0
+
+    def memory_size(self):
+        """
+        Returns:
+            int: 起止位置数组占用的字节数
+        """
+        return (len(self.starts) + len(self.ends)) * self.starts.itemsize
+
+    @classmethod
+    def from_pattern(cls, pattern, text):
+        """
+        在文本中查找所有匹配项建立索引，忽略长度为0的匹配
+
+        Args:
+            pattern (re.Pattern): 正则表达式
+            text (str): 文档的纯文本
+
+        Returns:
+            MatchIndex: 匹配索引
+        """
+        index = cls(pattern)
+        starts, ends = index.starts, index.ends
+        for match in pattern.finditer(text):
+            start, end = match.span()
+            if end > start:
+                starts.append(start)
+                ends.append(end)
+        return index
+
+    def __len__(self):
+        return len(self.starts)
+
+    def matches_pattern(self, pattern):
+        """
+        判断索引是否由相同的表达式和选项建立
+
+        Args:
+            pattern (re.Pattern): 正则表达式
+
+        Returns:
+            bool: 是否相同
+        """
+        return (self.pattern is not None and self.pattern.pattern == pattern.pattern
+                and self.pattern.flags == pattern.flags)
+
+    def extend(self, starts, ends):
+        """
+        在末尾追加一批位置更靠后的匹配项
+
+        Args:
+            starts (array): 匹配起始位置
+            ends (array): 匹配结束位置
+        """
+        self._move_shift_boundary(len(self.starts))
+        self.starts.extend(starts)
+        self.ends.extend(ends)
+        self._shift_index = len(self.starts)
+
+    def span(self, i):
+        """
+        返回第 i 个匹配项的 (起始位置, 结束位置)
+
+        Args:
+            i (int): 序号
+
+        Returns:
+            tuple: (起始位置, 结束位置)
+        """
+        if i >= self._shift_index:
+            return self.starts[i] + self._shift, self.ends[i] + self._shift
+        return self.starts[i], self.ends[i]
+
+    def _bisect(self, search, column, value, lo=0):
+        """在考虑延迟偏移的情况下二分查找，search 为 bisect_left 或 bisect_right"""
+        boundary = self._shift_index
+        if lo < boundary:
+            index = search(column, value, lo, boundary)
+            if index < boundary:
+                return index
+        return search(column, value - self._shift, max(lo, boundary))
+
+    def range_between(self, start, end):
+        """
+        求与 [start, end) 有重叠的匹配项序号范围
+
+        Args:
+            start (int): 起始位置
+            end (int): 结束位置
+
+        Returns:
+            tuple: (第一个序号, 最后一个序号 + 1)
+        """
+        first = self._bisect(bisect_right, self.ends, start)
+        last = self._bisect(bisect_left, self.starts, end, first)
+        return first, last
+
+    def index_after(self, position):
+        """
+        返回第一个起始位置不小于 position 的匹配项序号，之后没有时回到第一个
+
+        Args:
+            position (int): 文档位置
+
+        Returns:
+            int: 序号，没有匹配项时返回 -1
+        """
+        if not self.starts:
+            return -1
+        index = self._bisect(bisect_left, self.starts, position)
+        return index if index < len(self.starts) else 0
+
+    def index_before(self, position):
+        """
+        返回最后一个起始位置小于 position 的匹配项序号，之前没有时回到最后一个
+
+        Args:
+            position (int): 文档位置
+
+        Returns:
+            int: 序号，没有匹配项时返回 -1
+        """
+        if not self.starts:
+            return -1
+        index = self._bisect(bisect_left, self.starts, position) - 1
+        return index if index >= 0 else len(self.starts) - 1
+
+    def _move_shift_boundary(self, index):
+        """
+        移动延迟偏移的分界序号，只改写两个分界之间的元素
+
+        Args:
+            index (int): 新的分界序号
+        """
+        boundary, shift = self._shift_index, self._shift
+        if shift and index != boundary:
+            if index > boundary:
+                low, high, amount = boundary, index, shift
+            else:
+                low, high, amount = index, boundary, -shift
+            for column in (self.starts, self.ends):
+                column[low:high] = array('q', [value + amount for value in column[low:high]])
+        self._shift_index = index
+
+    def update_for_change(self, document, position, chars_removed, chars_added, sandbox=None):
+        """
+        文档变化后只重新查找变化所在的行（以及与变化区域重叠的旧匹配项所覆盖的范围），
+        其后的匹配项平移；只能在 incremental 为 True 时调用
+
+        Args:
+            document (QTextDocument): 已变化的文档
+            position (int): 变化位置
+            chars_removed (int): 删除的字符数
+            chars_added (int): 插入的字符数
+            sandbox (RegexSandbox): 提供时在工作进程中查找
+
+        Raises:
+            RegexSandboxError: 在工作进程中查找超时或失败，此时索引保持不变
+        """
+        delta = chars_added - chars_removed
+        start = document.findBlock(position).position()
+        last_block = document.findBlock(position + chars_added)
+        if not last_block.isValid():
+            last_block = document.lastBlock()
+        end = last_block.position() + last_block.length() - 1
+        # 跨行的旧匹配项与变化区域重叠时，扩大重新查找的范围以覆盖它（旧位置在变化之后的部分需要平移）
+        first, last = self.range_between(position, position + chars_removed)
+        if first < last:
+            start = min(start, self.span(first)[0])
+            end = max(end, self.span(last - 1)[1] + delta)
+        # 要替换的旧匹配项：与 [start, end) 对应的旧区间重叠的部分
+        first, last = self.range_between(start, end - delta)
+
+        text = range_text(document, start, end)
+        if sandbox is not None:
+            new_starts, new_ends = sandbox.spans(self.pattern, text)
+            new_starts = array('q', [value + start for value in new_starts])
+            new_ends = array('q', [value + start for value in new_ends])
+        else:
+            new_starts, new_ends = array('q'), array('q')
+            for match in self.pattern.finditer(text):
+                match_start, match_end = match.span()
+                if match_end > match_start:
+                    new_starts.append(start + match_start)
+                    new_ends.append(start + match_end)
+
+        # 先让 [0, last) 都变为实际位置，替换后其后的元素统一加上新的偏移
+        self._move_shift_boundary(last)
+        self.starts[first:last] = new_starts
+        self.ends[first:last] = new_ends
+        self._shift_index = first + len(new_starts)
+        self._shift += delta
+
+
+class SearchTask(QObject):
+    """
+    后台查找任务
+
+    在工作线程中对文本快照执行 finditer，每隔 BATCH_INTERVAL 秒把新找到的匹配项
+    作为一批发回主线程；调用 cancel 后在下一个匹配项处停止，不再发出信号。
+    提供 sandbox 时 finditer 在工作进程中执行，超时或出错时发出 failed。
+    text 可以是返回快照的函数，这时快照在工作线程中取得，取得后先发出 text_loaded。
+    """
+
+    # 取得文本快照，参数为快照 (str)
+    text_loaded = Signal(object)
+    # 一批新的匹配项，参数为 (起始位置数组, 结束位置数组)
+    matches_found = Signal(object, object)
+    # 查找完成（未被取消），参数为匹配总数
+    finished = Signal(int)
+    # 在工作进程中查找超时或出错（未被取消），参数为错误信息
+    failed = Signal(str)
+
+    BATCH_INTERVAL = 0.05
+
+    def __init__(self, pattern, text, parent=None, sandbox=None):
+        """
+        初始化查找任务
+
+        Args:
+            pattern (re.Pattern): 正则表达式
+            text (str or callable): 文档纯文本的快照，或在工作线程中返回快照的无参数函数
+            parent (QObject): 父对象
+            sandbox (RegexSandbox): 提供时在工作进程中查找
+        """
+        super().__init__(parent)
+        self.pattern = pattern
+        self.text = text
+        self.sandbox = sandbox
+        self.cancelled = False
+
+    def start(self):
+        """在后台线程中开始执行"""
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def cancel(self):
+        """取消查找"""
+        self.cancelled = True
+
+    def _run(self):
+        """查找所有长度不为0的匹配项，分批发出"""
+        if callable(self.text):
+            self.text = self.text()
+            if self.cancelled:
+                self.text = None
+                return
+            self.text_loaded.emit(self.text)
+        if self.sandbox is not None:
+            self._run_in_sandbox()
+            return
+        starts, ends = array('q'), array('q')
+        count = 0
+        next_emit = time.monotonic() + self.BATCH_INTERVAL
+        for match in self.pattern.finditer(self.text):
+            if self.cancelled:
+                break
+            start, end = match.span()
+            if end > start:
+                starts.append(start)
+                ends.append(end)
+            if starts and time.monotonic() >= next_emit:
+                count += len(starts)
+                self.matches_found.emit(starts, ends)
+                starts, ends = array('q'), array('q')
+                next_emit = time.monotonic() + self.BATCH_INTERVAL
+        self.text = None
+        if self.cancelled:
+            return
+        if starts:
+            count += len(starts)
+            self.matches_found.emit(starts, ends)
+        self.finished.emit(count)
+
+    def _run_in_sandbox(self):
+        """在工作进程中查找，工作进程送回的批次直接转发"""
+        def forward(starts, ends):
+            if not self.cancelled:
+                self.matches_found.emit(starts, ends)
+
+        try:
+            count = self.sandbox.finditer_spans(self.pattern, self.text, forward, lambda: self.cancelled)
+        except (RegexSandboxError, re.error) as e:
+            if not self.cancelled:
+                self.failed.emit(str(e))
+            return
+        finally:
+            self.text = None
+        if count is not None and not self.cancelled:
+            self.finished.emit(count)
+
+
+class ReplaceTask(QObject):
+    """
+    后台替换任务
+
+    在工作线程中对文本快照逐个计算匹配项的替换内容，每隔 BATCH_INTERVAL 秒把新的替换
+    作为一批 (起始位置, 结束位置, 替换内容) 发回主线程，由主线程按文档顺序应用；
+    文本本身不在工作线程中修改。替换的语义与 replace_matches 相同，长度为0的匹配项也会被替换。
+    调用 cancel 后在下一个匹配项处停止，不再发出信号。
+    提供 sandbox 时在工作进程中计算，超时或出错时发出 failed。
+    text 可以是返回快照的函数，这时快照在工作线程中取得，取得后先发出 text_loaded。
+    """
+
+    # 取得文本快照，参数为快照 (str)
+    text_loaded = Signal(object)
+    # 一批替换，参数为 (起始位置数组, 结束位置数组, 替换内容列表)，位置为快照中的位置
+    edits_found = Signal(object, object, object)
+    # 计算完成（未被取消），参数为替换总数
+    finished = Signal(int)
+    # 替换内容无效、超时或出错（未被取消），参数为错误信息
+    failed = Signal(str)
+
+    BATCH_INTERVAL = 0.05
+
+    def __init__(self, pattern, text, replacement, use_regex, parent=None, sandbox=None):
+        """
+        初始化替换任务
+
+        Args:
+            pattern (re.Pattern): 正则表达式
+            text (str or callable): 文档纯文本的快照，或在工作线程中返回快照的无参数函数
+            replacement (str): 替换内容，正则表达式模式下支持 \\1 等反向引用
+            use_regex (bool): 是否为正则表达式模式
+            parent (QObject): 父对象
+            sandbox (RegexSandbox): 提供时在工作进程中计算
+        """
+        super().__init__(parent)
+        self.pattern = pattern
+        self.text = text
+        self.replacement = replacement
+        self.use_regex = use_regex
+        self.sandbox = sandbox
+        self.cancelled = False
+
+    def start(self):
+        """在后台线程中开始执行"""
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def cancel(self):
+        """取消替换"""
+        self.cancelled = True
+
+    def _run(self):
+        """计算所有匹配项的替换内容，分批发出"""
+        try:
+            if callable(self.text):
+                self.text = self.text()
+                if self.cancelled:
+                    return
+                self.text_loaded.emit(self.text)
+            if self.sandbox is not None:
+                count = self._run_in_sandbox()
+            else:
+                count = self._run_in_thread()
+        except re.error as e:
+            if not self.cancelled:
+                self.failed.emit(f"正则表达式错误: {e}")
+            return
+        except RegexSandboxError as e:
+            if not self.cancelled:
+                self.failed.emit(str(e))
+            return
+        finally:
+            self.text = None
+        if count is not None and not self.cancelled:
+            self.finished.emit(count)
+
+    def _run_in_thread(self):
+        """在本进程中计算，返回替换总数，被取消时返回 None"""
+        if self.use_regex:
+            # 先检查替换内容中的反向引用，与 re.sub 一致，没有匹配项时也报告错误
+            self.pattern.sub(self.replacement, '')
+        starts, ends, replacements = array('q'), array('q'), []
+        count = 0
+        next_emit = time.monotonic() + self.BATCH_INTERVAL
+        for match in self.pattern.finditer(self.text):
+            if self.cancelled:
+                return None
+            starts.append(match.start())
+            ends.append(match.end())
+            replacements.append(match.expand(self.replacement) if self.use_regex else self.replacement)
+            if time.monotonic() >= next_emit:
+                count += len(starts)
+                self.edits_found.emit(starts, ends, replacements)
+                starts, ends, replacements = array('q'), array('q'), []
+                next_emit = time.monotonic() + self.BATCH_INTERVAL
+        if starts:
+            count += len(starts)
+            self.edits_found.emit(starts, ends, replacements)
+        return count
+
+    def _run_in_sandbox(self):
+        """在工作进程中计算，工作进程送回的批次直接转发"""
+        def forward(starts, ends, replacements):
+            if not self.cancelled:
+                self.edits_found.emit(starts, ends, replacements)
+
+        return self.sandbox.finditer_replacements(self.pattern, self.text, self.replacement,
+                                                  self.use_regex, forward, lambda: self.cancelled)
@@ -0,0 +1,172 @@
+"""
+多标签页查找结果模块
+
+每个标签页的匹配项以 MatchIndex 保存，结果树按标签页分组；
+行号和行内容只在视图需要显示某一行时才根据文本快照计算，
+视图只为可见的行请求数据，几十万条结果也不会为每行创建控件或对象。
+"""
+
+import re
+from array import array
+from bisect import bisect_right
+from PySide6.QtCore import Qt, QAbstractItemModel, QModelIndex
+from SearchIndex import MatchIndex
+
+
+class TabSearchResult:
+    """
+    单个标签页的查找结果
+
+    text 为查找时的文本快照，结果中的位置和显示的行内容都以它为准；
+    快照在后台线程中取得，取得之前为 None，此时还没有匹配项。
+    """
+
+    # 结果中显示的行内容最多保留的字符数
+    PREVIEW_LENGTH = 200
+
+    def __init__(self, tab, name, text, pattern):
+        """
+        初始化查找结果
+
+        Args:
+            tab (TabEditor): 标签页
+            name (str): 显示名称
+            text (str): 文本快照，尚未取得时为 None
+            pattern (re.Pattern): 正则表达式
+        """
+        self.tab = tab
+        self.name = name
+        self.text = text
+        self.matches = MatchIndex(pattern)
+        self._line_starts = None
+
+    def line_at(self, position):
+        """
+        返回位置所在的行号（从1开始）和行内容
+
+        Args:
+            position (int): 文本快照中的位置
+
+        Returns:
+            tuple: (行号, 行内容)
+        """
+        if self._line_starts is None:
+            line_starts = array('q', [0])
+            line_starts.extend(match.end() for match in re.finditer('\n', self.text))
+            self._line_starts = line_starts
+        number = bisect_right(self._line_starts, position)
+        start = self._line_starts[number - 1]
+        end = self.text.find('\n', start, start + self.PREVIEW_LENGTH)
+        if end == -1:
+            end = start + self.PREVIEW_LENGTH
+        return number, self.text[start:end].strip()
+
+
+class SearchResultsModel(QAbstractItemModel):
+    """
+    按标签页分组的查找结果树模型
+
+    顶层行为有匹配项的标签页，子行为匹配项。子行的 internalId 为所属分组序号加1，
+    顶层行为0，不需要为每个节点创建对象。
+    """
+
+    def __init__(self, parent=None):
+        """
+        初始化结果模型
+
+        Args:
+            parent (QObject): 父对象
+        """
+        super().__init__(parent)
+        self.groups = []
+
+    def clear(self):
+        """清空所有结果"""
+        self.beginResetModel()
+        self.groups = []
+        self.endResetModel()
+
+    def add_matches(self, group, starts, ends):
+        """
+        追加某个标签页的一批匹配项，该标签页第一次有结果时新增分组
+
+        Args:
+            group (TabSearchResult): 标签页的查找结果
+            starts (array): 匹配起始位置
+            ends (array): 匹配结束位置
+        """
+        if not starts:
+            return
+        if group not in self.groups:
+            group.matches.extend(starts, ends)
+            row = len(self.groups)
+            self.beginInsertRows(QModelIndex(), row, row)
+            self.groups.append(group)
+            self.endInsertRows()
+            return
+        row = self.groups.index(group)
+        parent = self.index(row, 0)
+        count = len(group.matches)
+        self.beginInsertRows(parent, count, count + len(starts) - 1)
+        group.matches.extend(starts, ends)
+        self.endInsertRows()
+        self.dataChanged.emit(parent, parent)
+
+    def total_matches(self):
+        """
+        所有标签页的匹配总数
+
+        Returns:
+            int: 匹配总数
+        """
+        return sum(len(group.matches) for group in self.groups)
+
+    def match_at(self, index):
+        """
+        返回结果行对应的匹配项
+
+        Args:
+            index (QModelIndex): 结果行
+
+        Returns:
+            tuple: (TabSearchResult, 起始位置, 结束位置)，分组行返回 None
+        """
+        if not index.isValid() or index.internalId() == 0:
+            return None
+        group = self.groups[index.internalId() - 1]
+        start, end = group.matches.span(index.row())
+        return group, start, end
+
+    def index(self, row, column, parent=QModelIndex()):
+        if not self.hasIndex(row, column, parent):
+            return QModelIndex()
+        if not parent.isValid():
+            return self.createIndex(row, column, 0)
+        return self.createIndex(row, column, parent.row() + 1)
+
+    def parent(self, index=None):
+        if index is None:
+            return super().parent()
+        if not index.isValid() or index.internalId() == 0:
+            return QModelIndex()
+        return self.createIndex(index.internalId() - 1, 0, 0)
+
+    def rowCount(self, parent=QModelIndex()):
+        if not parent.isValid():
+            return len(self.groups)
+        if parent.internalId() == 0:
+            return len(self.groups[parent.row()].matches)
+        return 0
+
+    def columnCount(self, parent=QModelIndex()):
+        return 1
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or role != Qt.DisplayRole:
+            return None
+        if index.internalId() == 0:
+            group = self.groups[index.row()]
+            return f"{group.name} ({len(group.matches)})"
+        group = self.groups[index.internalId() - 1]
+        number, line = group.line_at(group.matches.span(index.row())[0])
+        return f"{number}: {line}"
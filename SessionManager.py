@@ -0,0 +1,78 @@
+"""
+会话管理模块
+
+退出时把所有标签页的元数据（路径、编码、光标、滚动位置、未保存内容）写入会话文件，
+启动时据此快速恢复标签栏，编辑器控件在标签页首次激活时才创建。
+"""
+
+import json
+import os
+from AppPaths import app_data_dir
+
+
+class SessionManager:
+    """会话文件的读写"""
+
+    SESSION_VERSION = 1
+
+    def __init__(self, session_path=None):
+        """
+        初始化会话管理器
+
+        Args:
+            session_path (str): 会话文件路径，默认位于应用数据目录
+        """
+        if session_path is None:
+            session_path = os.path.join(app_data_dir(), 'session.json')
+        self.session_path = session_path
+
+    def save(self, tab_states, current_index):
+        """
+        保存会话
+
+        Args:
+            tab_states (list): 每个标签页的状态字典，见 TabEditor.session_state
+            current_index (int): 当前激活的标签页序号
+        """
+        data = {
+            'version': self.SESSION_VERSION,
+            'current_index': current_index,
+            'tabs': tab_states,
+        }
+        # 先写临时文件再替换，避免写到一半退出导致会话损坏
+        temp_path = self.session_path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(temp_path, self.session_path)
+
+    def load(self):
+        """
+        读取会话
+
+        已不存在且没有未保存内容的文件会被跳过。
+
+        Returns:
+            tuple: (标签页状态列表, 当前标签页序号)，没有可用会话时返回 ([], 0)
+        """
+        try:
+            with open(self.session_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return [], 0
+
+        if not isinstance(data, dict) or data.get('version') != self.SESSION_VERSION:
+            return [], 0
+
+        tab_states = []
+        current_index = data.get('current_index', 0)
+        for index, state in enumerate(data.get('tabs', [])):
+            file_path = state.get('file_path')
+            has_content = state.get('content') is not None
+            if not has_content and not (file_path and os.path.exists(file_path)):
+                if index < current_index:
+                    current_index -= 1
+                continue
+            tab_states.append(state)
+
+        current_index = min(max(current_index, 0), max(len(tab_states) - 1, 0))
+        return tab_states, current_index
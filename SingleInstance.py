@@ -0,0 +1,102 @@
+"""
+单实例模块
+
+程序启动时先尝试把要打开的文件交给同一用户已经运行的实例，交接成功后新进程直接退出，
+不再导入 Qt、创建窗口。已运行的实例由 InstanceServer 用 QLocalServer 监听同一个地址
+（Windows 上是命名管道，其他系统上是 Unix 域套接字文件）。
+
+本模块只依赖标准库：交接文件的进程只需要启动 Python 本身，不必付出导入 PySide6 的时间。
+"""
+
+import getpass
+import json
+import os
+import socket
+import sys
+import time
+
+# Windows 上所有管道实例都在使用时 CreateFile 返回的错误码
+_ERROR_PIPE_BUSY = 231
+
+
+def server_address():
+    """
+    返回当前用户的实例监听的地址
+
+    不同用户各自使用一个实例。Windows 上为命名管道的名称（QLocalServer 会加上 \\\\.\\pipe\\ 前缀），
+    其他系统上为套接字文件的完整路径，客户端不依赖 Qt 计算临时目录。
+
+    Returns:
+        str: 传给 QLocalServer.listen 的地址
+    """
+    try:
+        user = getpass.getuser()
+    except Exception:
+        user = 'user'
+    name = 'SQLFormatterApp-' + ''.join(c if c.isalnum() else '_' for c in user)
+    if sys.platform == 'win32':
+        return name
+    return os.path.join(os.environ.get('TMPDIR') or '/tmp', name)
+
+
+def send_to_running_instance(file_paths, timeout=1.0):
+    """
+    把要打开的文件交给已经运行的实例
+
+    Args:
+        file_paths (list): 文件路径，相对路径按当前目录转换为绝对路径；为空时只让已运行的实例切换到前台
+        timeout (float): 连接和发送的最长时间（秒）
+
+    Returns:
+        bool: 是否已交给已运行的实例；没有已运行的实例或连接失败时返回 False，应正常启动
+    """
+    try:
+        forward_files(file_paths, timeout)
+    except OSError:
+        return False
+    return True
+
+
+def forward_files(file_paths, timeout=1.0):
+    """
+    把要打开的文件交给已经运行的实例，失败时抛出异常，调用者可以区分失败的原因
+
+    Args:
+        file_paths (list): 文件路径，相对路径按当前目录转换为绝对路径；为空时只让已运行的实例切换到前台
+        timeout (float): 连接和发送的最长时间（秒）
+
+    Raises:
+        FileNotFoundError: 监听地址不存在
+        ConnectionRefusedError: 套接字文件存在但没有进程在监听（上次异常退出留下的）
+        OSError: 其他原因导致连接或发送失败
+    """
+    message = json.dumps({'files': [os.path.abspath(path) for path in file_paths]}) + '\n'
+    if sys.platform == 'win32':
+        _send_to_pipe(server_address(), message.encode('utf-8'), timeout)
+    else:
+        _send_to_socket(server_address(), message.encode('utf-8'), timeout)
+
+
+def _send_to_pipe(name, data, timeout):
+    """通过命名管道发送消息，管道实例都在使用时短暂等待后重试"""
+    # 允许已运行的实例把窗口切换到前台，否则 Windows 只会让任务栏按钮闪烁
+    import ctypes
+    ctypes.windll.user32.AllowSetForegroundWindow(-1)
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            with open(rf'\\.\pipe\{name}', 'wb', buffering=0) as pipe:
+                pipe.write(data)
+            return
+        except OSError as e:
+            if getattr(e, 'winerror', None) != _ERROR_PIPE_BUSY or time.monotonic() >= deadline:
+                raise
+            time.sleep(0.01)
+
+
+def _send_to_socket(path, data, timeout):
+    """通过 Unix 域套接字发送消息，套接字文件不存在或没有进程监听时抛出 OSError"""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        connection.settimeout(timeout)
+        connection.connect(path)
+        connection.sendall(data)
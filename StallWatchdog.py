@@ -0,0 +1,253 @@
+"""
+界面卡顿监视模块
+
+界面线程用定时器定期更新心跳，监视线程发现心跳超过阈值（默认200毫秒）没有更新时，
+说明事件循环没有转动，此时按阈值间隔采样界面线程的 Python 调用栈，
+并记录卡顿开始时正在执行的命令（PerfMonitor.current_action）和当前标签页的字符数。
+卡顿结束后追加到应用数据目录的 diagnostics/stalls.jsonl，“帮助 → 卡顿报告”按热点排列。
+
+界面线程在不释放 GIL 的 C++ 调用中卡住时监视线程无法采样，
+因此心跳同时重新设置 faulthandler 的定时转储：卡住超过 HANG_TIMEOUT 秒时
+由 faulthandler 在 C 层把所有线程的调用栈写入 diagnostics/hangs.log。
+"""
+
+import faulthandler
+import json
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import Counter
+from PySide6.QtCore import QObject, QTimer, Signal
+from AppPaths import app_data_dir
+import PerfMonitor
+
+
+def load_stalls(file_path, limit):
+    """
+    读取记录的卡顿
+
+    Args:
+        file_path (str): stalls.jsonl 路径
+        limit (int): 最多读取最近的条数
+
+    Returns:
+        list: 卡顿记录（dict）列表，文件不存在或无法读取时返回空列表
+    """
+    try:
+        with open(file_path, encoding='utf-8') as f:
+            lines = f.readlines()[-limit:]
+    except OSError:
+        return []
+    stalls = []
+    for line in lines:
+        try:
+            stalls.append(json.loads(line))
+        except ValueError:
+            continue
+    return stalls
+
+
+def format_report(stalls, top=15):
+    """
+    生成卡顿报告：按命令汇总卡顿时间，按采样到的最内层调用（热点）和包含该调用的采样数排列
+
+    Args:
+        stalls (list): 卡顿记录列表
+        top (int): 每部分最多显示的条数
+
+    Returns:
+        str: 报告文本
+    """
+    if not stalls:
+        return "尚未记录到界面卡顿。"
+    action_time = Counter()
+    action_count = Counter()
+    action_chars = {}
+    self_samples = Counter()
+    total_samples = Counter()
+    sample_count = 0
+    for stall in stalls:
+        action = stall.get('action') or '（无命令，事件处理或绘制）'
+        action_time[action] += stall.get('duration_ms', 0)
+        action_count[action] += 1
+        action_chars[action] = max(action_chars.get(action, 0), stall.get('tab_chars') or 0)
+        for stack in stall.get('stacks', []):
+            if not stack:
+                continue
+            sample_count += 1
+            self_samples[stack[-1]] += 1
+            for frame in set(stack):
+                total_samples[frame] += 1
+
+    lines = [f"共 {len(stalls)} 次卡顿，{sample_count} 个调用栈采样", "",
+             "按命令（总卡顿时间、次数、卡顿时最大的标签页字符数）："]
+    for action, duration in action_time.most_common(top):
+        lines.append(f"{duration:9.0f}ms  {action_count[action]:4} 次  {action_chars[action]:>10}  {action}")
+    lines += ["", "最内层调用（采样数 / 包含该调用的采样数）："]
+    for frame, count in self_samples.most_common(top):
+        lines.append(f"{count:5} / {total_samples[frame]:<5}  {frame}")
+    return "\n".join(lines)
+
+
+class StallWatchdog(QObject):
+    """
+    界面线程卡顿监视
+
+    构造后调用 start 开始监视，退出前调用 stop。
+    """
+
+    # 一次卡顿结束，参数为卡顿记录（由监视线程发出，排队到界面线程处理）
+    stall_recorded = Signal(dict)
+
+    HEARTBEAT_MS = 50
+    DEFAULT_THRESHOLD_MS = 200
+    # 每次卡顿最多保存的调用栈采样数
+    MAX_STACKS = 50
+    # 每个调用栈最多保存的帧数（从最内层算起）
+    MAX_FRAMES = 30
+    # 卡住超过该秒数时由 faulthandler 转储所有线程的调用栈
+    HANG_TIMEOUT = 10
+    # 卡顿报告读取的最近记录条数
+    REPORT_LIMIT = 1000
+
+    def __init__(self, tab_size_provider=None, threshold_ms=DEFAULT_THRESHOLD_MS, parent=None):
+        """
+        初始化卡顿监视
+
+        Args:
+            tab_size_provider (callable): 返回当前标签页字符数的函数，在界面线程的心跳中调用，
+                卡顿时记录卡顿前最后一次心跳的值；为 None 时不记录
+            threshold_ms (int): 心跳超过该毫秒数没有更新时视为卡顿
+            parent (QObject): 父对象
+        """
+        super().__init__(parent)
+        self.tab_size_provider = tab_size_provider
+        self.threshold = threshold_ms / 1000
+        directory = app_data_dir('diagnostics')
+        self.report_path = os.path.join(directory, 'stalls.jsonl')
+        self.hang_log_path = os.path.join(directory, 'hangs.log')
+
+        self._main_thread_id = threading.main_thread().ident
+        self._last_beat = time.monotonic()
+        self._tab_chars = None
+        self._stop = threading.Event()
+        self._thread = None
+        self._hang_log = None
+
+        self.heartbeat = QTimer(self)
+        self.heartbeat.setInterval(self.HEARTBEAT_MS)
+        self.heartbeat.timeout.connect(self.beat)
+
+    def start(self):
+        """开始监视"""
+        if self._thread is not None:
+            return
+        try:
+            self._hang_log = open(self.hang_log_path, 'a', encoding='utf-8')
+        except OSError:
+            self._hang_log = None
+        self._stop.clear()
+        self.beat()
+        self.heartbeat.start()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """停止监视"""
+        if self._thread is None:
+            return
+        self.heartbeat.stop()
+        self._stop.set()
+        self._thread.join(1)
+        self._thread = None
+        if self._hang_log is not None:
+            faulthandler.cancel_dump_traceback_later()
+            self._hang_log.close()
+            self._hang_log = None
+
+    def set_threshold(self, threshold_ms):
+        """
+        设置卡顿阈值
+
+        Args:
+            threshold_ms (int): 毫秒数
+        """
+        self.threshold = threshold_ms / 1000
+
+    def beat(self):
+        """界面线程的心跳：更新时间和当前标签页的字符数，并推迟 faulthandler 的定时转储"""
+        if self.tab_size_provider is not None:
+            self._tab_chars = self.tab_size_provider()
+        self._last_beat = time.monotonic()
+        if self._hang_log is not None:
+            faulthandler.dump_traceback_later(self.HANG_TIMEOUT, file=self._hang_log)
+
+    def _run(self):
+        """监视线程：检查心跳，卡顿期间按阈值间隔采样界面线程的调用栈"""
+        stall = None
+        next_sample = 0
+        while not self._stop.wait(min(self.threshold / 4, self.HEARTBEAT_MS / 1000)):
+            last_beat = self._last_beat
+            now = time.monotonic()
+            if now - last_beat < self.threshold + self.HEARTBEAT_MS / 1000:
+                if stall is not None:
+                    self._finish(stall, last_beat)
+                    stall = None
+                continue
+            if stall is None:
+                stall = {
+                    'time': time.time() - (now - last_beat),
+                    'action': PerfMonitor.current_action,
+                    'tab_chars': self._tab_chars,
+                    'stacks': [],
+                    '_started': last_beat,
+                }
+                next_sample = now
+            if now >= next_sample and len(stall['stacks']) < self.MAX_STACKS:
+                stack = self._main_stack()
+                if stack:
+                    stall['stacks'].append(stack)
+                next_sample = now + self.threshold
+
+    def _main_stack(self):
+        """
+        采样界面线程的 Python 调用栈
+
+        Returns:
+            list: 从外到内的帧，每帧为 "文件名:行号 函数名"
+        """
+        frame = sys._current_frames().get(self._main_thread_id)
+        if frame is None:
+            return []
+        # 不读取源代码行，监视线程不做多余的磁盘读取（打包后的程序也没有源文件）
+        summary = traceback.StackSummary.extract(traceback.walk_stack(frame), limit=self.MAX_FRAMES,
+                                                 lookup_lines=False)
+        return [f"{os.path.basename(entry.filename)}:{entry.lineno} {entry.name}" for entry in reversed(summary)]
+
+    def _finish(self, stall, ended):
+        """
+        记录一次已结束的卡顿
+
+        Args:
+            stall (dict): 卡顿记录
+            ended (float): 卡顿结束后第一次心跳的时间（time.monotonic()）
+        """
+        started = stall.pop('_started')
+        stall['duration_ms'] = round((ended - started) * 1000 - self.HEARTBEAT_MS)
+        try:
+            with open(self.report_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(stall, ensure_ascii=False) + '\n')
+        except OSError:
+            pass
+        self.stall_recorded.emit(stall)
+
+    def report(self):
+        """
+        生成最近记录的卡顿报告
+
+        Returns:
+            str: 报告文本
+        """
+        return format_report(load_stalls(self.report_path, self.REPORT_LIMIT))
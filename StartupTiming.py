@@ -0,0 +1,54 @@
+"""
+启动耗时模块
+
+记录启动过程中各个阶段的起止时间，在“帮助 → 启动耗时”中显示每个阶段用了多少毫秒。
+计时从本模块被导入时开始（main.py 最先导入本模块），
+不包括 Python 解释器启动和打包程序加载动态库的时间。
+
+本模块只依赖标准库，可以在导入 Qt 之前使用。
+"""
+
+import threading
+import time
+
+# 计时起点
+_origin = time.perf_counter()
+# 已记录的阶段：[(阶段名称, 开始时间, 结束时间), ...]
+_stages = []
+# 上一个主线程阶段的结束时间，下一个阶段默认从这里开始
+_last_end = _origin
+_lock = threading.Lock()
+
+
+def mark(stage, started=None):
+    """
+    记录一个阶段结束
+
+    主线程中按顺序执行的阶段不必提供开始时间，默认从上一个阶段结束时开始；
+    后台线程中的阶段与主线程并行，需要提供自己的开始时间。
+
+    Args:
+        stage (str): 阶段名称
+        started (float): 阶段开始时的 time.perf_counter()，为 None 时表示紧接上一个阶段
+    """
+    global _last_end
+    now = time.perf_counter()
+    with _lock:
+        if started is None:
+            started, _last_end = _last_end, now
+        _stages.append((stage, started, now))
+
+
+def report():
+    """
+    生成启动耗时报告
+
+    Returns:
+        str: 每行为 阶段结束时的累计毫秒数、阶段耗时和阶段名称
+    """
+    with _lock:
+        stages = list(_stages)
+    lines = [f"{'累计':>9}  {'耗时':>8}  阶段"]
+    for stage, started, ended in stages:
+        lines.append(f"{(ended - _origin) * 1000:7.1f}ms  {(ended - started) * 1000:6.1f}ms  {stage}")
+    return "\n".join(lines)
@@ -0,0 +1,184 @@
+"""
+标签页休眠模块
+
+长时间未激活的标签页会释放编辑器控件、文档布局和高亮数据，只保留压缩后的文本快照
+以及光标、撤销等元数据；再次激活时由 TabEditor.ensure_editor 透明地重建。
+"""
+
+import time
+from PySide6.QtCore import QObject, QTimer
+
+
+# 内存估算参数（字节）
+BYTES_PER_CHAR = 2          # QString 使用 UTF-16 存储
+BYTES_PER_BLOCK = 160       # QTextBlock 及其布局的固定开销
+BYTES_PER_FORMAT_CHAR = 2   # 高亮格式数据，按字符数粗略估算
+
+
+def estimate_tab_memory(tab_editor):
+    """
+    粗略估算标签页占用的内存
+
+    只使用 O(1) 的文档属性，可以在定时检查中对所有标签页调用。
+
+    Args:
+        tab_editor (TabEditor): 标签页编辑器
+
+    Returns:
+        int: 估算的字节数。未创建编辑器的标签页返回快照大小
+    """
+    if not tab_editor.is_materialized():
+        return tab_editor.snapshot_size()
+    document = tab_editor.editor.document()
+    chars = document.characterCount()
+    return (chars * (BYTES_PER_CHAR + BYTES_PER_FORMAT_CHAR)
+            + document.blockCount() * BYTES_PER_BLOCK
+            + tab_editor.editor.undo_tracker.bytes)
+
+
+def tab_memory_details(tab_editor):
+    """
+    按组成部分统计已创建编辑器的标签页的内存，供标签页内存视图显示
+
+    与 estimate_tab_memory 一样只读取文档属性和缓存大小，不遍历文本块；
+    查找索引的大小与分块数成正比。
+
+    Args:
+        tab_editor (TabEditor): 已创建编辑器的标签页
+
+    Returns:
+        dict: text_bytes（文本）、blocks（块数）、format_bytes（高亮格式，估算）、
+            whitespace_entries（空白字符渲染缓存的块数）、undo_steps、undo_bytes（撤销栈）、
+            search_bytes（查找索引和查找结果）
+    """
+    editor = tab_editor.editor
+    document = editor.document()
+    chars = document.characterCount()
+    search_bytes = 0
+    if editor.text_index is not None:
+        search_bytes += editor.text_index.memory_size()
+    if editor.search_matches is not None:
+        search_bytes += editor.search_matches.memory_size()
+    return {
+        'text_bytes': chars * BYTES_PER_CHAR,
+        'blocks': document.blockCount(),
+        'format_bytes': chars * BYTES_PER_FORMAT_CHAR,
+        'whitespace_entries': len(editor.precise_renderer.layout_cache),
+        'undo_steps': editor.undo_tracker.commands,
+        'undo_bytes': editor.undo_tracker.bytes,
+        'search_bytes': search_bytes,
+    }
+
+
+class HibernationPolicy(QObject):
+    """
+    标签页休眠策略
+
+    定时检查所有标签页：空闲超过 idle_timeout 秒且没有撤销历史的标签页会被休眠；
+    已创建编辑器的标签页总内存超过 memory_budget 时，按最久未激活的顺序继续休眠，
+    直到回到预算以内（此时撤销历史会被释放）。
+    """
+
+    DEFAULT_IDLE_TIMEOUT = 30 * 60          # 30分钟
+    DEFAULT_MEMORY_BUDGET = 512 * 1024 * 1024  # 512MB
+    CHECK_INTERVAL_MS = 60 * 1000
+
+    def __init__(self, tabs_provider, can_hibernate, parent=None):
+        """
+        初始化休眠策略
+
+        Args:
+            tabs_provider (callable): 返回所有 TabEditor 的函数
+            can_hibernate (callable): 判断标签页当前能否休眠的函数（例如不是当前标签页）
+            parent (QObject): 父对象
+        """
+        super().__init__(parent)
+        self.tabs_provider = tabs_provider
+        self.can_hibernate = can_hibernate
+        self.idle_timeout = self.DEFAULT_IDLE_TIMEOUT
+        self.memory_budget = self.DEFAULT_MEMORY_BUDGET
+        self.enabled = True
+
+        self.timer = QTimer(self)
+        self.timer.setInterval(self.CHECK_INTERVAL_MS)
+        self.timer.timeout.connect(self.check)
+        self.timer.start()
+
+    def set_enabled(self, enabled):
+        """
+        启用或停用自动休眠
+
+        Args:
+            enabled (bool): 是否启用
+        """
+        self.enabled = enabled
+        if enabled:
+            self.timer.start()
+        else:
+            self.timer.stop()
+
+    def check(self):
+        """
+        执行一次休眠检查
+
+        Returns:
+            int: 本次休眠的标签页数量
+        """
+        if not self.enabled:
+            return 0
+
+        now = time.monotonic()
+        candidates = [tab for tab in self.tabs_provider()
+                      if tab.is_materialized() and self.can_hibernate(tab)]
+        hibernated = 0
+
+        # 按空闲时间休眠，有撤销历史的标签页保留
+        for tab in list(candidates):
+            idle = now - tab.last_active
+            if idle >= self.idle_timeout and not tab.editor.document().isUndoAvailable():
+                tab.hibernate()
+                candidates.remove(tab)
+                hibernated += 1
+
+        # 按内存预算休眠，最久未激活的优先
+        total = sum(estimate_tab_memory(tab) for tab in self.tabs_provider()
+                    if tab.is_materialized())
+        for tab in sorted(candidates, key=lambda t: t.last_active):
+            if total <= self.memory_budget:
+                break
+            total -= estimate_tab_memory(tab)
+            tab.hibernate()
+            hibernated += 1
+
+        return hibernated
+
+    def hibernate_all_inactive(self):
+        """
+        立即休眠所有可以休眠的标签页
+
+        Returns:
+            int: 休眠的标签页数量
+        """
+        count = 0
+        for tab in self.tabs_provider():
+            if tab.is_materialized() and self.can_hibernate(tab):
+                tab.hibernate()
+                count += 1
+        return count
+
+
+def format_size(size):
+    """
+    将字节数格式化为便于阅读的字符串
+
+    Args:
+        size (int): 字节数
+
+    Returns:
+        str: 例如 "1.5 MB"
+    """
+    for unit in ('B', 'KB', 'MB'):
+        if abs(size) < 1024:
+            return f"{size:.0f} {unit}" if unit == 'B' else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GB"
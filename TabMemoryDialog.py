@@ -0,0 +1,162 @@
+"""
+标签页内存视图模块
+"""
+
+from PySide6.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QTableWidget, QGroupBox, QCheckBox,
+                               QTableWidgetItem, QPushButton, QLabel, QHeaderView)
+from PySide6.QtCore import Qt
+from TabHibernation import estimate_tab_memory, format_size, tab_memory_details
+import PerfMonitor
+
+
+class TabMemoryDialog(QDialog):
+    """
+    标签页内存对话框
+
+    列出每个标签页的状态、估算内存及其组成（文本、块数、高亮格式、空白字符缓存、撤销栈、查找数据），
+    以及休眠后释放的内存；打开 tracemalloc 跟踪后还列出最近操作的 Python 内存分配。
+    只在打开对话框和点击刷新时统计。
+    """
+
+    COLUMNS = ["标签页", "状态", "估算内存", "文本", "块数", "高亮格式", "空白缓存", "撤销",
+               "查找", "快照大小", "已释放", "释放的撤销步数"]
+    ACTION_COLUMNS = ["操作", "结束时增量", "峰值增量"]
+    ALLOCATION_COLUMNS = ["代码位置", "存活内存", "分配次数"]
+
+    def __init__(self, parent=None, tabs_provider=None, hibernate_inactive=None):
+        """
+        初始化标签页内存对话框
+
+        Args:
+            parent (QWidget): 父组件
+            tabs_provider (callable): 返回所有 TabEditor 的函数
+            hibernate_inactive (callable): 立即休眠非活动标签页的函数
+        """
+        super().__init__(parent)
+        self.tabs_provider = tabs_provider
+        self.hibernate_inactive = hibernate_inactive
+
+        self.setWindowTitle("标签页内存")
+        self.resize(1100, 600)
+
+        layout = QVBoxLayout(self)
+        self.table = self._create_table(self.COLUMNS)
+        layout.addWidget(self.table, 3)
+
+        # Python 内存分配（tracemalloc）
+        python_group = QGroupBox("Python 内存分配")
+        python_layout = QVBoxLayout(python_group)
+        self.tracing_checkbox = QCheckBox("记录每个操作的 Python 内存分配（tracemalloc，打开期间程序会变慢）")
+        self.tracing_checkbox.setChecked(PerfMonitor.memory_tracing)
+        python_layout.addWidget(self.tracing_checkbox)
+        tables_layout = QHBoxLayout()
+        self.action_table = self._create_table(self.ACTION_COLUMNS)
+        self.allocation_table = self._create_table(self.ALLOCATION_COLUMNS)
+        tables_layout.addWidget(self.action_table)
+        tables_layout.addWidget(self.allocation_table)
+        python_layout.addLayout(tables_layout)
+        layout.addWidget(python_group, 2)
+
+        footer_layout = QHBoxLayout()
+        self.summary_label = QLabel()
+        self.refresh_button = QPushButton("刷新")
+        self.hibernate_button = QPushButton("休眠非活动标签页")
+        self.close_button = QPushButton("关闭")
+        footer_layout.addWidget(self.summary_label)
+        footer_layout.addStretch()
+        footer_layout.addWidget(self.refresh_button)
+        footer_layout.addWidget(self.hibernate_button)
+        footer_layout.addWidget(self.close_button)
+        layout.addLayout(footer_layout)
+
+        self.refresh_button.clicked.connect(self.refresh)
+        self.hibernate_button.clicked.connect(self.on_hibernate_clicked)
+        self.close_button.clicked.connect(self.close)
+        self.tracing_checkbox.toggled.connect(self.on_tracing_toggled)
+
+        self.refresh()
+
+    def _create_table(self, columns):
+        """创建只读表格，第一列占据剩余宽度"""
+        table = QTableWidget(0, len(columns))
+        table.setHorizontalHeaderLabels(columns)
+        table.setEditTriggers(QTableWidget.NoEditTriggers)
+        table.horizontalHeader().setSectionResizeMode(0, QHeaderView.Stretch)
+        return table
+
+    def _set_row(self, table, row, values, numeric_from=1):
+        """填充一行，从 numeric_from 列开始的数值右对齐"""
+        for column, value in enumerate(values):
+            item = QTableWidgetItem(value)
+            if column >= numeric_from:
+                item.setTextAlignment(Qt.AlignRight | Qt.AlignVCenter)
+            table.setItem(row, column, item)
+
+    def refresh(self):
+        """重新统计所有标签页的内存和最近操作的 Python 内存分配"""
+        self.refresh_tabs()
+        self.refresh_python_allocations()
+
+    def refresh_tabs(self):
+        """重新统计所有标签页的内存"""
+        tabs = self.tabs_provider()
+        self.table.setRowCount(len(tabs))
+        total = 0
+        reclaimed_total = 0
+
+        for row, tab in enumerate(tabs):
+            memory = estimate_tab_memory(tab)
+            total += memory
+            info = tab.hibernation_info()
+            details = ["", "", "", "", "", ""]
+            if tab.is_materialized():
+                state = "活动"
+                snapshot = reclaimed = undo_steps = ""
+                parts = tab_memory_details(tab)
+                details = [format_size(parts['text_bytes']), str(parts['blocks']),
+                           format_size(parts['format_bytes']), f"{parts['whitespace_entries']} 块",
+                           f"{parts['undo_steps']} 步 / {format_size(parts['undo_bytes'])}",
+                           format_size(parts['search_bytes']) if parts['search_bytes'] else ""]
+            elif info:
+                state = "已休眠"
+                snapshot = format_size(info['snapshot_size'])
+                reclaimed_bytes = max(info['memory_before'] - info['snapshot_size'], 0)
+                reclaimed_total += reclaimed_bytes
+                reclaimed = format_size(reclaimed_bytes)
+                undo_steps = str(info['undo_steps'])
+            else:
+                state = "未加载"
+                snapshot = format_size(tab.snapshot_size())
+                reclaimed = undo_steps = ""
+
+            self._set_row(self.table, row, [tab.get_display_name(), state, format_size(memory), *details,
+                                            snapshot, reclaimed, undo_steps], numeric_from=2)
+
+        self.summary_label.setText(f"合计 {format_size(total)}，休眠已释放 {format_size(reclaimed_total)}")
+
+    def refresh_python_allocations(self):
+        """列出最近操作的 Python 内存分配增量，以及当前存活内存最多的代码行"""
+        deltas = PerfMonitor.memory_deltas()
+        self.action_table.setRowCount(len(deltas))
+        for row, (name, delta, peak) in enumerate(deltas):
+            self._set_row(self.action_table, row, [name, format_size(delta), format_size(peak)])
+        allocations = PerfMonitor.top_allocations()
+        self.allocation_table.setRowCount(len(allocations))
+        for row, (location, size, count) in enumerate(allocations):
+            self._set_row(self.allocation_table, row, [location, format_size(size), str(count)])
+
+    def on_tracing_toggled(self, checked):
+        """
+        打开或关闭 Python 内存分配跟踪
+
+        Args:
+            checked (bool): 是否跟踪
+        """
+        PerfMonitor.set_memory_tracing(checked)
+        self.refresh_python_allocations()
+
+    def on_hibernate_clicked(self):
+        """立即休眠非活动标签页并刷新"""
+        if self.hibernate_inactive:
+            self.hibernate_inactive()
+        self.refresh()
@@ -0,0 +1,351 @@
+"""
+文本差异模块
+
+计算两段文本之间按行的最小替换区间，并把这些区间作为一次可撤销的编辑应用到文档，
+只有变化的部分会被修改，撤销记录也只保存变化的片段。
+OrderedEdits 用于在多次事件循环中分批应用后台陆续算出的编辑。
+"""
+
+import bisect
+import difflib
+import time
+from PySide6.QtGui import QTextCursor
+
+
+# 差异区间的行数乘积不超过该值时直接使用 SequenceMatcher，否则先用唯一行做锚点拆分
+SMALL_DIFF_COMPLEXITY = 1_000_000
+
+
+def normalize_newlines(text):
+    """
+    把 \\r\\n 和 \\r 统一为 \\n，与 QTextDocument 保存的文本保持一致
+
+    Args:
+        text (str): 原始文本
+
+    Returns:
+        str: 换行符统一后的文本
+    """
+    if '\r' not in text:
+        return text
+    return text.replace('\r\n', '\n').replace('\r', '\n')
+
+
+def _split_lines(text):
+    """按 \\n 分行并保留换行符，不会像 str.splitlines 那样在其他分隔符处分行"""
+    parts = text.split('\n')
+    lines = [part + '\n' for part in parts[:-1]]
+    if parts[-1]:
+        lines.append(parts[-1])
+    return lines
+
+
+def _common_prefix_length(a, b):
+    """用二分法比较切片求公共前缀长度，比较在 C 层完成"""
+    lo, hi = 0, min(len(a), len(b))
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[:mid] == b[:mid]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+
+def _common_suffix_length(a, b, limit):
+    """用二分法求不超过 limit 的公共后缀长度"""
+    lo, hi = 0, min(len(a), len(b), limit)
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[len(a) - mid:] == b[len(b) - mid:]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+
+def _common_line_affixes(old_text, new_text):
+    """
+    求两段文本公共的整行前缀和整行后缀长度
+
+    Returns:
+        tuple: (前缀字符数, 后缀字符数)，前缀以换行结束，后缀从行首开始
+    """
+    prefix = _common_prefix_length(old_text, new_text)
+    prefix = old_text.rfind('\n', 0, prefix) + 1
+    suffix = _common_suffix_length(old_text, new_text, min(len(old_text), len(new_text)) - prefix)
+    if suffix:
+        start = len(old_text) - suffix
+        if start > 0 and old_text[start - 1] != '\n':
+            newline = old_text.find('\n', start)
+            suffix = 0 if newline == -1 else len(old_text) - (newline + 1)
+    return prefix, suffix
+
+
+def _unique_anchors(old_lines, new_lines, o_lo, o_hi, n_lo, n_hi):
+    """
+    查找两侧都只出现一次的行，并取位置单调递增的最长序列作为锚点（patience diff）
+
+    Returns:
+        list: [(old_index, new_index), ...]，按位置升序
+    """
+    old_count = {}
+    for i in range(o_lo, o_hi):
+        line = old_lines[i]
+        old_count[line] = -1 if line in old_count else i
+    new_count = {}
+    for j in range(n_lo, n_hi):
+        line = new_lines[j]
+        new_count[line] = -1 if line in new_count else j
+
+    pairs = []
+    for j in range(n_lo, n_hi):
+        line = new_lines[j]
+        i = old_count.get(line, -1)
+        if i >= 0 and new_count[line] == j:
+            pairs.append((i, j))
+    pairs.sort()
+
+    # 按 new_index 求最长递增子序列
+    tails = []
+    tail_index = []
+    previous = [-1] * len(pairs)
+    for k, (_, j) in enumerate(pairs):
+        pos = bisect.bisect_left(tails, j)
+        if pos == len(tails):
+            tails.append(j)
+            tail_index.append(k)
+        else:
+            tails[pos] = j
+            tail_index[pos] = k
+        previous[k] = tail_index[pos - 1] if pos > 0 else -1
+
+    anchors = []
+    k = tail_index[-1] if tail_index else -1
+    while k >= 0:
+        anchors.append(pairs[k])
+        k = previous[k]
+    anchors.reverse()
+    return anchors
+
+
+def _diff_line_ranges(old_lines, new_lines, o_lo, o_hi, n_lo, n_hi, out):
+    """
+    计算行区间内的差异，把需要替换的 (o_lo, o_hi, n_lo, n_hi) 行区间追加到 out
+    """
+    # 去掉首尾相同的行，外部修改通常只涉及很小的一段
+    while o_lo < o_hi and n_lo < n_hi and old_lines[o_lo] == new_lines[n_lo]:
+        o_lo += 1
+        n_lo += 1
+    while o_lo < o_hi and n_lo < n_hi and old_lines[o_hi - 1] == new_lines[n_hi - 1]:
+        o_hi -= 1
+        n_hi -= 1
+    if o_lo == o_hi or n_lo == n_hi:
+        if o_lo != o_hi or n_lo != n_hi:
+            out.append((o_lo, o_hi, n_lo, n_hi))
+        return
+
+    if (o_hi - o_lo) * (n_hi - n_lo) <= SMALL_DIFF_COMPLEXITY:
+        matcher = difflib.SequenceMatcher(None, old_lines[o_lo:o_hi], new_lines[n_lo:n_hi], autojunk=False)
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+            if tag != 'equal':
+                out.append((o_lo + i1, o_lo + i2, n_lo + j1, n_lo + j2))
+        return
+
+    anchors = _unique_anchors(old_lines, new_lines, o_lo, o_hi, n_lo, n_hi)
+    if not anchors:
+        out.append((o_lo, o_hi, n_lo, n_hi))
+        return
+    prev_o, prev_n = o_lo, n_lo
+    for i, j in anchors:
+        _diff_line_ranges(old_lines, new_lines, prev_o, i, prev_n, j, out)
+        prev_o, prev_n = i + 1, j + 1
+    _diff_line_ranges(old_lines, new_lines, prev_o, o_hi, prev_n, n_hi, out)
+
+
+def compute_line_edits(old_text, new_text):
+    """
+    计算把 old_text 变为 new_text 所需的按行替换区间
+
+    Args:
+        old_text (str): 原文本
+        new_text (str): 新文本
+
+    Returns:
+        list: 按位置升序排列、互不重叠的 (start, end, replacement) 列表，
+              start/end 是 old_text 中的字符偏移
+    """
+    if old_text == new_text:
+        return []
+
+    # 先在字符级别截掉首尾相同的整行，只对中间部分分行比较
+    prefix, suffix = _common_line_affixes(old_text, new_text)
+    base = prefix
+    old_text = old_text[prefix:len(old_text) - suffix]
+    new_text = new_text[prefix:len(new_text) - suffix]
+
+    old_lines = _split_lines(old_text)
+    new_lines = _split_lines(new_text)
+    ranges = []
+    _diff_line_ranges(old_lines, new_lines, 0, len(old_lines), 0, len(new_lines), ranges)
+    if not ranges:
+        return []
+
+    # 只计算用到的行的字符偏移
+    edits = []
+    offset = base
+    line_index = 0
+    for o_lo, o_hi, n_lo, n_hi in ranges:
+        while line_index < o_lo:
+            offset += len(old_lines[line_index])
+            line_index += 1
+        start = offset
+        while line_index < o_hi:
+            offset += len(old_lines[line_index])
+            line_index += 1
+        edits.append((start, offset, ''.join(new_lines[n_lo:n_hi])))
+    return edits
+
+
+def compute_minimal_edit(old_text, new_text):
+    """
+    计算把 old_text 变为 new_text 的单个最小替换区间（去掉公共前缀和后缀）
+
+    Args:
+        old_text (str): 原文本
+        new_text (str): 新文本
+
+    Returns:
+        tuple: (start, end, replacement)，start/end 是 old_text 中的字符偏移；文本相同时返回 None
+    """
+    if old_text == new_text:
+        return None
+    prefix = _common_prefix_length(old_text, new_text)
+    suffix = _common_suffix_length(old_text, new_text, min(len(old_text), len(new_text)) - prefix)
+    return prefix, len(old_text) - suffix, new_text[prefix:len(new_text) - suffix]
+
+
+def edit_chars(edits):
+    """
+    编辑删除和插入的字符数之和，用于在应用前估算撤销内存
+
+    Args:
+        edits (list): compute_line_edits 返回的 (start, end, replacement) 列表
+
+    Returns:
+        int: 字符数
+    """
+    return sum(end - start + len(replacement) for start, end, replacement in edits)
+
+
+def apply_edits(document, edits):
+    """
+    把替换区间作为一次可撤销的编辑应用到文档
+
+    Args:
+        document (QTextDocument): 目标文档
+        edits (list): compute_line_edits 返回的 (start, end, replacement) 列表
+
+    Returns:
+        int: 应用的编辑数量
+    """
+    if not edits:
+        return 0
+    cursor = QTextCursor(document)
+    # 从后往前应用，前面区间的偏移不受影响。
+    # 同一个编辑块内的多处修改会被 Qt 合并成一个覆盖首尾之间全部文本的 contentsChange，
+    # 导致高亮器重新处理中间所有未变化的行；因此每处修改单独结束编辑块，
+    # 再用 joinPreviousEditBlock 合并到同一个撤销步骤中。
+    for index, (start, end, replacement) in enumerate(reversed(edits)):
+        if index == 0:
+            cursor.beginEditBlock()
+        else:
+            cursor.joinPreviousEditBlock()
+        cursor.setPosition(start)
+        cursor.setPosition(end, QTextCursor.KeepAnchor)
+        cursor.insertText(replacement)
+        cursor.endEditBlock()
+    return len(edits)
+
+
+class OrderedEdits:
+    """
+    按文档顺序分批应用基于同一文本快照的编辑
+
+    编辑的位置都是快照中的位置，按位置升序、互不重叠地陆续加入，
+    应用时加上此前的编辑造成的长度变化。可以在多次事件循环中分批应用，
+    全部编辑仍合并为一次可撤销的编辑（与 apply_edits 一样，每处修改单独结束编辑块再合并）。
+    应用期间文档不能有其他修改，否则位置不再对应。
+    """
+
+    def __init__(self, document):
+        """
+        Args:
+            document (QTextDocument): 目标文档
+        """
+        self.document = document
+        self.cursor = QTextCursor(document)
+        # 尚未应用的批次：[(起始位置数组, 结束位置数组, 替换内容列表, 下一个要应用的序号), ...]
+        self.pending = []
+        self.applied = 0
+        # 已应用的编辑造成的长度变化，以及最后一个已应用编辑在快照中的结束位置
+        self.shift = 0
+        self.position = 0
+
+    def add(self, starts, ends, replacements):
+        """
+        加入一批编辑
+
+        Args:
+            starts (array): 快照中的起始位置
+            ends (array): 快照中的结束位置
+            replacements (list): 替换内容
+        """
+        if starts:
+            self.pending.append([starts, ends, replacements, 0])
+
+    def apply(self, deadline):
+        """
+        应用尚未应用的编辑，直到全部应用或到达 deadline
+
+        Args:
+            deadline (float): time.monotonic() 的截止时间
+
+        Returns:
+            bool: 是否还有尚未应用的编辑
+        """
+        cursor = self.cursor
+        while self.pending:
+            batch = self.pending[0]
+            starts, ends, replacements, index = batch
+            shift = self.shift
+            while index < len(starts):
+                if self.applied == 0:
+                    cursor.beginEditBlock()
+                else:
+                    cursor.joinPreviousEditBlock()
+                start, end, replacement = starts[index], ends[index], replacements[index]
+                cursor.setPosition(start + shift)
+                cursor.setPosition(end + shift, QTextCursor.KeepAnchor)
+                cursor.insertText(replacement)
+                cursor.endEditBlock()
+                shift += len(replacement) - (end - start)
+                self.applied += 1
+                self.position = end
+                index += 1
+                # 每次检查时间的开销不可忽略，每 64 处修改检查一次
+                if index % 64 == 0 and time.monotonic() >= deadline:
+                    break
+            self.shift = shift
+            batch[3] = index
+            if index < len(starts):
+                return True
+            self.pending.pop(0)
+        return False
+
+    def revert(self):
+        """撤销已经应用的编辑，尚未应用的编辑不再应用"""
+        self.pending = []
+        if self.applied:
+            self.document.undo()
+            self.applied = 0
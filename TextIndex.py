@@ -0,0 +1,354 @@
+"""
+文档查找索引模块
+
+把大文档按行边界分成约 CHUNK_SIZE 个字符的文本块，保存每个文本块的文本及其小写文本中
+连续3个和连续5个字符的片段的布隆过滤器（标识符多由少量常见词拼成，
+只用3个字符的片段几乎每个文本块都会命中，5个字符的片段能区分不同的组合）。
+查找普通文字或含有固定文字的正则表达式时，先用查找内容的片段排除不可能匹配的文本块，再只在候选文本块中执行查找，
+结果与在整个文档中查找完全相同，而查找的文本通常只有文档的很小一部分。
+文本块的文本直接保存在索引中，查找时不必再通过 QTextCursor 从文档读取（读取大量文本比查找本身慢得多）。
+
+索引在后台线程中根据文本快照建立；文档变化时只把受影响的文本块标记为待更新，
+在下一次查找时才从文档中重新读取这些文本块。
+"""
+
+import sys
+import threading
+from array import array
+from bisect import bisect_right
+from functools import lru_cache
+from itertools import accumulate
+from re import _casefix
+from PySide6.QtCore import QObject, Signal
+from BlockTransform import range_text
+
+# 忽略大小写时与其他字符等价、但 str.lower() 不能体现这种等价关系的字符（例如 ſ 与 s），
+# 以及小写形式不止一个字符或与上下文有关的字符。文本块含有这些字符时总是作为候选，
+# 查找内容含有这些字符时不使用索引
+_FOLD_SPECIAL = frozenset(
+    {chr(equivalent) for code, equivalents in _casefix._EXTRA_CASES.items()
+     for equivalent in (code, *equivalents) if equivalent >= 128} | {'İ', 'Σ'})
+
+
+def has_fold_special(text):
+    """
+    判断文本是否含有 _FOLD_SPECIAL 中的字符，含有时按小写文本建立的索引不能用于筛选
+
+    Args:
+        text (str): 文本
+
+    Returns:
+        bool: 是否含有这类字符
+    """
+    return not text.isascii() and not _FOLD_SPECIAL.isdisjoint(text)
+
+
+def _ngrams(lower):
+    """
+    小写文本中所有连续3个和连续5个字符的片段（以元组表示，两种长度的元组不会相同）
+
+    Args:
+        lower (str): 小写文本
+
+    Returns:
+        set: 片段集合
+    """
+    grams = set(zip(lower, lower[1:], lower[2:]))
+    grams.update(zip(lower, lower[1:], lower[2:], lower[3:], lower[4:]))
+    return grams
+
+
+@lru_cache(maxsize=256)
+def _bit_table(bits):
+    """
+    bytes.translate 使用的转换表：含有 bits 中所有位的字节转换为 1，其他字节转换为 0
+
+    Args:
+        bits (int): 同一字节中要检查的位
+
+    Returns:
+        bytes: 256 字节的转换表
+    """
+    return bytes(int(value & bits == bits) for value in range(256))
+
+
+class TextIndex(QObject):
+    """
+    单个文档的文本块片段索引
+
+    lengths 为各文本块的长度，texts 为各文本块的文本，待更新的文本块的文本为 None。
+    布隆过滤器按字节转置保存：columns[i] 依次是每个文本块过滤器的第 i 个字节，
+    查找时对每个要检查的字节只需处理一个连续的 bytearray，不必在 Python 中逐块检查。
+    文本块的边界总是在行首，不含换行符的匹配不会跨越文本块。
+    """
+
+    # 后台建立完成，参数为 (长度数组, 文本列表, 过滤器各字节)；在工作线程中发出，由主线程安装
+    _built = Signal(object, object, object)
+
+    # 文档达到该字符数时才值得建立索引，更小的文档直接查找已经足够快
+    MIN_LENGTH = 256 * 1024
+    CHUNK_SIZE = 1024
+    BLOOM_BITS = 4096
+    # 待更新的文本超过该字符数（例如重新加载了整个文件）时在后台重新建立索引，而不是在查找时读取
+    REBUILD_LIMIT = 1024 * 1024
+
+    def __init__(self, document):
+        """
+        初始化索引并开始跟踪文档变化，调用 build 后才可以使用
+
+        Args:
+            document (QTextDocument): 文档，同时作为父对象
+        """
+        super().__init__(document)
+        self.document = document
+        self.ready = False
+        self.lengths = array('q')
+        self.texts = []
+        self.columns = []
+        self._starts = None
+        self._building = False
+        # 是否有待更新的文本块，以及待更新的文本块的字符数（重叠的变化会重复计算）
+        self._dirty = False
+        self._dirty_chars = 0
+        # 建立索引期间文档发生的变化合并为一个区域：(起始位置, 快照中的结束位置, 当前的结束位置)
+        self._pending_change = None
+        self._built.connect(self._install)
+        document.contentsChange.connect(self.on_contents_change)
+
+    def build(self, text):
+        """
+        在后台线程中根据文本快照建立索引
+
+        Args:
+            text (str): 文档当前的纯文本
+        """
+        self._building = True
+        self._pending_change = None
+        threading.Thread(target=self._build, args=(text,), daemon=True).start()
+
+    def _build(self, text):
+        """把快照分块并计算过滤器，在工作线程中执行"""
+        lengths, texts, blooms = self._split(text)
+        size = self.BLOOM_BITS // 8
+        self._built.emit(lengths, texts, [blooms[byte::size] for byte in range(size)])
+
+    def _install(self, lengths, texts, columns):
+        """安装后台建立的索引，并应用建立期间文档发生的变化"""
+        self.lengths = lengths
+        self.texts = texts
+        self.columns = columns
+        self._starts = None
+        self._building = False
+        self._dirty = False
+        self._dirty_chars = 0
+        self.ready = True
+        if self._pending_change is not None:
+            start, old_end, new_end = self._pending_change
+            self._pending_change = None
+            self._mark_dirty(start, old_end - start, new_end - start)
+
+    @classmethod
+    def _split(cls, text):
+        """
+        在行边界处把文本分成不超过 CHUNK_SIZE 的块（超长的行单独成块）并计算过滤器
+
+        Returns:
+            tuple: (长度数组, 文本列表, 依次连接的各文本块过滤器)
+        """
+        lengths, texts, blooms = array('q'), [], bytearray()
+        position, size = 0, len(text)
+        while True:
+            end = size
+            if size - position > cls.CHUNK_SIZE:
+                end = text.rfind('\n', position, position + cls.CHUNK_SIZE) + 1
+                if end <= position:
+                    end = text.find('\n', position + cls.CHUNK_SIZE) + 1 or size
+            chunk = text[position:end]
+            lengths.append(len(chunk))
+            texts.append(chunk)
+            blooms += cls._bloom(chunk)
+            position = end
+            if position >= size:
+                return lengths, texts, blooms
+
+    @classmethod
+    def _bloom(cls, chunk):
+        """
+        计算文本块小写文本中所有片段的布隆过滤器，含有特殊大小写字符的文本块返回全部置位的过滤器
+
+        Args:
+            chunk (str): 文本块
+
+        Returns:
+            bytes: 过滤器
+        """
+        if has_fold_special(chunk):
+            return b'\xff' * (cls.BLOOM_BITS // 8)
+        bits = bytearray(cls.BLOOM_BITS // 8)
+        mask = cls.BLOOM_BITS - 1
+        for gram in _ngrams(chunk.lower()):
+            bit = hash(gram) & mask
+            bits[bit >> 3] |= 1 << (bit & 7)
+        return bits
+
+    def _chunk_starts(self):
+        """各文本块的起始位置，文本块变化后重新计算"""
+        if self._starts is None:
+            self._starts = array('q', accumulate(self.lengths, initial=0))
+        return self._starts
+
+    def on_contents_change(self, position, chars_removed, chars_added):
+        """
+        文档变化时把受影响的文本块合并为一个待更新的文本块，建立索引期间只记录变化区域
+
+        Args:
+            position (int): 变化位置
+            chars_removed (int): 删除的字符数
+            chars_added (int): 插入的字符数
+        """
+        if self._building:
+            self._record_pending(position, chars_removed, chars_added)
+        elif self.ready:
+            self._mark_dirty(position, chars_removed, chars_added)
+
+    def _record_pending(self, position, chars_removed, chars_added):
+        """把一次变化合并到建立索引期间的变化区域中"""
+        if self._pending_change is None:
+            self._pending_change = (position, position + chars_removed, position + chars_added)
+            return
+        start, old_end, new_end = self._pending_change
+        # 变化超出区域末尾时，超出部分在快照中的位置与当前位置相差区域的长度变化
+        change_end = position + chars_removed
+        if change_end > new_end:
+            old_end += change_end - new_end
+            new_end = change_end
+        self._pending_change = (min(start, position), old_end, new_end + chars_added - chars_removed)
+
+    def _mark_dirty(self, position, chars_removed, chars_added):
+        """把与变化区域重叠的文本块合并为一个待更新的文本块"""
+        starts = self._chunk_starts()
+        count = len(self.lengths)
+        first = max(bisect_right(starts, position, 0, count) - 1, 0)
+        last = first
+        if chars_removed:
+            last = max(bisect_right(starts, position + chars_removed - 1, 0, count) - 1, first)
+            # 删除了文本块末尾的换行符时，下一个文本块的开头不再是行首，需要一起更新
+            if position + chars_removed >= starts[last + 1] and last + 1 < count:
+                last += 1
+        length = starts[last + 1] - starts[first] + chars_added - chars_removed
+        self.lengths[first:last + 1] = array('q', [length])
+        self.texts[first:last + 1] = [None]
+        if last > first:
+            # 待更新的文本块的过滤器在重新读取时才计算，这里只保持各字节的长度与文本块数量一致
+            for column in self.columns:
+                del column[first + 1:last + 1]
+        self._starts = None
+        self._dirty = True
+        self._dirty_chars += length
+
+    def _refresh(self):
+        """从文档中重新读取待更新的文本块，重新分块并计算过滤器"""
+        if not self._dirty:
+            return
+        self._dirty = False
+        self._dirty_chars = 0
+        size = self.BLOOM_BITS // 8
+        index = 0
+        while True:
+            try:
+                index = self.texts.index(None, index)
+            except ValueError:
+                return
+            start = self._chunk_starts()[index]
+            text = range_text(self.document, start, start + self.lengths[index])
+            lengths, texts, blooms = self._split(text)
+            self.lengths[index:index + 1] = lengths
+            self.texts[index:index + 1] = texts
+            for byte, column in enumerate(self.columns):
+                column[index:index + 1] = blooms[byte::size]
+            self._starts = None
+            index += len(texts)
+
+    def memory_size(self):
+        """
+        估算索引占用的内存（分块文本、过滤器和块长度）
+
+        Returns:
+            int: 字节数
+        """
+        return (sum(sys.getsizeof(text) for text in self.texts if text is not None)
+                + sum(len(column) for column in self.columns)
+                + len(self.lengths) * self.lengths.itemsize)
+
+    def candidate_regions(self, literals):
+        """
+        求可能含有所有文字片段的文本块，相邻的文本块合并为一个区域
+
+        Args:
+            literals (list): 匹配中必定出现的文字片段（小写）
+
+        Returns:
+            list: [(起始位置, 文本), ...]，无法用索引筛选时返回 None
+        """
+        if not self.ready:
+            return None
+        if (self._dirty_chars > self.REBUILD_LIMIT
+                or self._chunk_starts()[-1] != self.document.characterCount() - 1):
+            # 变化太多，或文本块的总长度与文档不一致（不应发生）
+            self.ready = False
+            self.build(self.document.toPlainText())
+            return None
+        # 同一字节中要检查的位合并在一起：{字节位置: 位}
+        probes = {}
+        mask = self.BLOOM_BITS - 1
+        for literal in literals:
+            if has_fold_special(literal):
+                return None
+            for gram in _ngrams(literal.lower()):
+                bit = hash(gram) & mask
+                probes[bit >> 3] = probes.get(bit >> 3, 0) | 1 << (bit & 7)
+        if not probes:
+            return None
+
+        self._refresh()
+        count = len(self.texts)
+        # 把各文本块过滤器的同一字节转换为 0/1，按整数相与后为 1 的文本块即候选文本块
+        hits = -1
+        for byte, bits in probes.items():
+            hits &= int.from_bytes(self.columns[byte].translate(_bit_table(bits)))
+            if not hits:
+                return []
+        flags = hits.to_bytes(count)
+        starts = self._chunk_starts()
+        texts = self.texts
+        regions = []
+        previous = None
+        index = flags.find(1)
+        while index >= 0:
+            if index - 1 == previous:
+                regions[-1][1].append(texts[index])
+            else:
+                regions.append((starts[index], [texts[index]]))
+            previous = index
+            index = flags.find(1, index + 1)
+        return [(start, ''.join(parts)) for start, parts in regions]
+
+def find_in_regions(pattern, regions):
+    """
+    在各区域中查找所有长度不为0的匹配项
+
+    Args:
+        pattern (re.Pattern): 正则表达式
+        regions (list): [(起始位置, 文本), ...]
+
+    Returns:
+        tuple: (起始位置数组, 结束位置数组)
+    """
+    starts, ends = array('q'), array('q')
+    for offset, text in regions:
+        for match in pattern.finditer(text):
+            start, end = match.span()
+            if end > start:
+                starts.append(offset + start)
+                ends.append(offset + end)
+    return starts, ends
@@ -0,0 +1,267 @@
+"""
+撤销内存模块
+
+QTextDocument 的撤销栈只保存每次编辑删除和插入的文本片段，但没有提供查询占用内存的接口。
+这里根据 contentsChange 报告的字符数累计估算每个文档的撤销内存，
+并在超出单个标签页或全局预算时释放撤销历史。工具结果、全部替换等较大的编辑在应用前
+调用 UndoMemoryTracker.reserve 预先检查，需要释放时先清空之前的历史，这次编辑仍可撤销。
+"""
+
+import time
+from PySide6.QtCore import QObject, QTimer, Signal
+
+
+# 每个字符按 UTF-16 的2字节计，另加每条撤销命令的固定开销
+BYTES_PER_CHAR = 2
+BYTES_PER_COMMAND = 64
+
+
+class UndoMemoryTracker(QObject):
+    """
+    单个文档的撤销内存估算
+
+    普通编辑按删除与插入字符数之和累加；撤销、重做只是在已有命令之间移动，不会新增内存，
+    由编辑器在执行前后调用 begin_undo_redo/end_undo_redo 标记并跳过，同时记录有多少移到了重做栈，
+    之后的新编辑丢弃重做栈时从估算值中减去。
+    Qt 无法删除撤销栈中最早的单条记录，超过预算时只能整体清空撤销历史。
+    """
+
+    # 估算值变化，参数为新的字节数
+    usage_changed = Signal(int)
+    # 撤销历史因超出预算被清空，参数为释放的字节数
+    trimmed = Signal(int)
+
+    def __init__(self, document, budget=0, parent=None):
+        """
+        初始化撤销内存估算
+
+        Args:
+            document (QTextDocument): 被跟踪的文档
+            budget (int): 单个文档的预算（字节），0 表示不限制
+            parent (QObject): 父对象
+        """
+        super().__init__(parent)
+        self.document = document
+        self.budget = budget
+        self.bytes = 0
+        self.commands = 0
+        self.last_trimmed = None
+        # 重做栈中的估算字节数和命令数，新编辑会丢弃重做栈
+        self.redo_bytes = 0
+        self.redo_commands = 0
+        # 经 reserve 预先检查、单独就超出预算的最近一次编辑的估算字节数，不参与单个文档的预算检查
+        self.exempt_bytes = 0
+        self._undo_redo_depth = 0
+        self._undo_redo_bytes = 0
+        self._undo_steps_before = 0
+        self._trim_pending = False
+        document.contentsChange.connect(self._on_contents_change)
+        document.undoCommandAdded.connect(self._on_undo_command_added)
+        document.undoAvailable.connect(self._on_undo_available)
+
+    def begin_undo_redo(self):
+        """标记接下来的文档变化来自撤销或重做"""
+        if not self._undo_redo_depth:
+            self._undo_redo_bytes = 0
+            self._undo_steps_before = self.document.availableUndoSteps()
+        self._undo_redo_depth += 1
+
+    def end_undo_redo(self):
+        """结束撤销或重做标记，按重做栈的变化记录移入或移出重做栈的估算值"""
+        self._undo_redo_depth -= 1
+        if self._undo_redo_depth:
+            return
+        # 按可撤销步数的变化判断方向（Qt 的可重做步数在第一次撤销后不会更新）；
+        # Qt 的步数按内部的编辑块计算，一次撤销或重做按一条命令计
+        steps = self._undo_steps_before - self.document.availableUndoSteps()
+        if steps > 0:
+            self.redo_bytes = min(self.bytes, self.redo_bytes + self._undo_redo_bytes + BYTES_PER_COMMAND)
+            self.redo_commands = min(self.commands, self.redo_commands + 1)
+        elif steps < 0:
+            self.redo_bytes = max(0, self.redo_bytes - self._undo_redo_bytes - BYTES_PER_COMMAND)
+            self.redo_commands = max(0, self.redo_commands - 1)
+
+    def reserve(self, chars):
+        """
+        在应用较大的编辑之前调用：加上这次编辑会超出预算时，先清空已有的撤销历史，
+        这样这次编辑本身仍可撤销；这次编辑单独就超出预算时，在下一次清空之前不因它再次清空
+
+        Args:
+            chars (int): 这次编辑删除和插入的字符数（估计值）
+        """
+        estimate = chars * BYTES_PER_CHAR + BYTES_PER_COMMAND
+        if self.budget and self.bytes - self.exempt_bytes + estimate > self.budget:
+            self.trim()
+        self.exempt_bytes = estimate if self.budget and estimate > self.budget else 0
+
+    def _on_undo_command_added(self):
+        """新的撤销命令"""
+        self.commands += 1
+        self.bytes += BYTES_PER_COMMAND
+
+    def _on_contents_change(self, position, chars_removed, chars_added):
+        """
+        按变化的字符数累计估算值
+
+        Args:
+            position (int): 变化位置
+            chars_removed (int): 删除的字符数
+            chars_added (int): 插入的字符数
+        """
+        if not self.document.isUndoRedoEnabled():
+            return
+        if self._undo_redo_depth:
+            self._undo_redo_bytes += (chars_removed + chars_added) * BYTES_PER_CHAR
+            return
+        if self.redo_bytes or self.redo_commands:
+            # 新的编辑丢弃了重做栈
+            self.bytes = max(0, self.bytes - self.redo_bytes)
+            self.commands = max(0, self.commands - self.redo_commands)
+            self.redo_bytes = self.redo_commands = 0
+        self.bytes += (chars_removed + chars_added) * BYTES_PER_CHAR
+        self.usage_changed.emit(self.bytes)
+        if self.over_budget() and not self._trim_pending:
+            # 不能在 contentsChange 处理过程中修改撤销栈，推迟到事件循环
+            self._trim_pending = True
+            QTimer.singleShot(0, self._trim_if_over_budget)
+
+    def _on_undo_available(self, available):
+        """
+        撤销栈被清空（例如 setPlainText）时重置估算值
+
+        Args:
+            available (bool): 是否还能撤销
+        """
+        if not available and not self.document.isRedoAvailable():
+            self.reset()
+
+    def over_budget(self):
+        """除 reserve 豁免的编辑外，估算值是否超出预算"""
+        return bool(self.budget) and self.bytes - self.exempt_bytes > self.budget
+
+    def _trim_if_over_budget(self):
+        """超出预算时清空撤销历史"""
+        self._trim_pending = False
+        if self.over_budget():
+            self.trim()
+
+    def reset(self):
+        """把估算值清零"""
+        self.redo_bytes = self.redo_commands = self.exempt_bytes = 0
+        if self.bytes or self.commands:
+            self.bytes = 0
+            self.commands = 0
+            self.usage_changed.emit(0)
+
+    def trim(self):
+        """
+        清空撤销和重做历史
+
+        Returns:
+            int: 释放的估算字节数
+        """
+        freed = self.bytes
+        if not freed:
+            return 0
+        self.document.clearUndoRedoStacks()
+        self.reset()
+        self.last_trimmed = time.monotonic()
+        self.trimmed.emit(freed)
+        return freed
+
+
+class UndoBudget(QObject):
+    """
+    全局撤销内存预算
+
+    汇总所有已创建编辑器的标签页的估算值；超过全局预算时，
+    按最久未激活的顺序清空其他标签页的撤销历史，当前标签页最后处理。
+    汇总和检查通过定时器合并，连续输入时不会每次按键都遍历所有标签页。
+    """
+
+    DEFAULT_TAB_BUDGET = 64 * 1024 * 1024       # 64MB
+    DEFAULT_GLOBAL_BUDGET = 256 * 1024 * 1024   # 256MB
+    UPDATE_INTERVAL_MS = 500
+
+    # 汇总值变化，参数为 (当前标签页字节数, 全部标签页字节数)
+    usage_changed = Signal(int, int)
+
+    def __init__(self, tabs_provider, current_tab_provider, parent=None):
+        """
+        初始化全局撤销内存预算
+
+        Args:
+            tabs_provider (callable): 返回所有 TabEditor 的函数
+            current_tab_provider (callable): 返回当前 TabEditor 的函数
+            parent (QObject): 父对象
+        """
+        super().__init__(parent)
+        self.tabs_provider = tabs_provider
+        self.current_tab_provider = current_tab_provider
+        self.tab_budget = self.DEFAULT_TAB_BUDGET
+        self.global_budget = self.DEFAULT_GLOBAL_BUDGET
+
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(self.UPDATE_INTERVAL_MS)
+        self.timer.timeout.connect(self.update)
+
+    def attach(self, tracker):
+        """
+        接管一个文档的撤销内存估算
+
+        Args:
+            tracker (UndoMemoryTracker): 文档的估算对象
+        """
+        tracker.budget = self.tab_budget
+        tracker.usage_changed.connect(self.schedule_update)
+        self.schedule_update()
+
+    def set_budgets(self, tab_budget, global_budget):
+        """
+        修改预算并立即检查
+
+        Args:
+            tab_budget (int): 单个标签页的预算（字节）
+            global_budget (int): 全局预算（字节）
+        """
+        self.tab_budget = tab_budget
+        self.global_budget = global_budget
+        for tracker in self._trackers():
+            tracker.budget = tab_budget
+            if tracker.over_budget():
+                tracker.trim()
+        self.update()
+
+    def schedule_update(self, *args):
+        """推迟到下一个定时周期汇总，已在等待时不重复启动"""
+        if not self.timer.isActive():
+            self.timer.start()
+
+    def _trackers(self):
+        """返回所有已创建编辑器的标签页的估算对象"""
+        return [tab.editor.undo_tracker for tab in self.tabs_provider() if tab.is_materialized()]
+
+    def total_bytes(self):
+        """
+        所有标签页的撤销内存估算值之和
+
+        Returns:
+            int: 字节数
+        """
+        return sum(tracker.bytes for tracker in self._trackers())
+
+    def update(self):
+        """汇总估算值，超出全局预算时释放撤销历史"""
+        total = self.total_bytes()
+        current = self.current_tab_provider()
+        if total > self.global_budget:
+            tabs = sorted((tab for tab in self.tabs_provider() if tab.is_materialized()),
+                          key=lambda t: (t is current, t.last_active))
+            for tab in tabs:
+                if total <= self.global_budget:
+                    break
+                total -= tab.editor.undo_tracker.trim()
+        current_bytes = (current.editor.undo_tracker.bytes
+                         if current is not None and current.is_materialized() else 0)
+        self.usage_changed.emit(current_bytes, total)
@@ -0,0 +1,294 @@
+"""
+文件夹查找索引模块
+
+为一个目录下的所有 .sql 文件建立三元组（连续3个字符）索引并保存在应用数据目录中。
+每个文件只保存小写文本中出现过的三元组编码（有序 array），按修改时间和大小增量更新。
+查找时先从查找内容中提取必须出现的文字，用其三元组筛选候选文件，
+再用内存映射读取候选文件进行验证，得到匹配的行。
+与 TextIndex 相同，含有忽略大小写时 str.lower() 不能体现等价关系的字符的文件总是作为候选，
+查找内容含有这类字符时不筛选。
+"""
+
+import hashlib
+import mmap
+import os
+import pickle
+import re
+import tempfile
+import threading
+from array import array
+from bisect import bisect_left
+from PySide6.QtCore import QObject, Signal
+from AppPaths import app_data_dir
+from FileCodec import decode_bytes
+from SearchIndex import required_literals
+from TextIndex import has_fold_special
+
+INDEX_VERSION = 2
+FILE_EXTENSION = '.sql'
+
+
+def trigram_codes(text):
+    """
+    计算文本（已转小写）中所有三元组的编码，每个字符占21位
+
+    Args:
+        text (str): 文本
+
+    Returns:
+        array: 去重后升序排列的编码
+    """
+    trigrams = set(zip(text, text[1:], text[2:]))
+    return array('q', sorted((ord(a) << 42) | (ord(b) << 21) | ord(c) for a, b, c in trigrams))
+
+
+class WorkspaceIndex:
+    """
+    一个目录的三元组索引
+
+    files 为 相对路径 -> (修改时间纳秒, 文件大小, 编码, 三元组编码)，
+    不能按小写文本筛选的文件三元组编码为 None。
+    """
+
+    def __init__(self, root, index_dir=None):
+        """
+        初始化索引，已保存过的索引会被读入
+
+        Args:
+            root (str): 目录
+            index_dir (str): 保存索引的目录，默认位于应用数据目录
+        """
+        self.root = os.path.abspath(root)
+        if index_dir is None:
+            index_dir = app_data_dir('workspace_index')
+        digest = hashlib.sha1(os.path.normcase(self.root).encode('utf-8')).hexdigest()[:16]
+        self.index_path = os.path.join(index_dir, digest + '.pickle')
+        self.files = {}
+        self.load()
+
+    def load(self):
+        """读取保存的索引，版本或目录不符、文件损坏时从空索引开始"""
+        try:
+            with open(self.index_path, 'rb') as f:
+                data = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ValueError):
+            return
+        if data.get('version') == INDEX_VERSION and data.get('root') == self.root:
+            self.files = data['files']
+
+    def save(self):
+        """
+        保存索引，先写临时文件再替换，避免中途退出留下损坏的索引；
+        临时文件名各不相同，已取消但仍在保存的任务不会与新任务写同一个文件
+        """
+        data = {'version': INDEX_VERSION, 'root': self.root, 'files': self.files}
+        descriptor, temp_path = tempfile.mkstemp(suffix='.tmp', dir=os.path.dirname(self.index_path))
+        try:
+            with os.fdopen(descriptor, 'wb') as f:
+                pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_path, self.index_path)
+        except Exception:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            raise
+
+    def update(self, progress=None, cancelled=None):
+        """
+        扫描目录，只重新索引新增或修改时间、大小变化的文件，并移除已删除的文件
+
+        Args:
+            progress (callable): 进度回调，参数为 (已处理文件数, 文件总数)
+            cancelled (callable): 返回是否已取消的函数
+
+        Returns:
+            int: 重新索引的文件数
+        """
+        signatures = {}
+        for directory, _, names in os.walk(self.root):
+            for name in names:
+                if not name.lower().endswith(FILE_EXTENSION):
+                    continue
+                path = os.path.join(directory, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                signatures[os.path.relpath(path, self.root)] = (stat.st_mtime_ns, stat.st_size)
+
+        for relative_path in list(self.files):
+            if relative_path not in signatures:
+                del self.files[relative_path]
+
+        changed = [path for path, signature in signatures.items()
+                   if self.files.get(path, (None, None))[:2] != signature]
+        for count, relative_path in enumerate(changed, 1):
+            if cancelled and cancelled():
+                break
+            try:
+                with open(os.path.join(self.root, relative_path), 'rb') as f:
+                    text, encoding = decode_bytes(f.read())
+            except OSError:
+                continue
+            codes = None if has_fold_special(text) else trigram_codes(text.lower())
+            self.files[relative_path] = signatures[relative_path] + (encoding, codes)
+            if progress:
+                progress(count, len(changed))
+        if changed:
+            self.save()
+        return len(changed)
+
+    def candidates(self, literals):
+        """
+        筛选包含所有文字片段的全部三元组的文件
+
+        Args:
+            literals (list): 文字片段（小写）
+
+        Returns:
+            list: 候选文件的相对路径
+        """
+        codes = set()
+        for literal in literals:
+            if has_fold_special(literal):
+                return sorted(self.files)
+            codes.update(trigram_codes(literal))
+        if not codes:
+            return sorted(self.files)
+        result = []
+        for relative_path, (_, _, _, file_codes) in self.files.items():
+            if file_codes is None:
+                result.append(relative_path)
+                continue
+            size = len(file_codes)
+            for code in codes:
+                position = bisect_left(file_codes, code)
+                if position == size or file_codes[position] != code:
+                    break
+            else:
+                result.append(relative_path)
+        return sorted(result)
+
+    def verify(self, relative_path, pattern, literal=None, sandbox=None):
+        """
+        用内存映射读取候选文件，返回所有匹配所在的行
+
+        Args:
+            relative_path (str): 文件的相对路径
+            pattern (re.Pattern): 正则表达式
+            literal (str): 区分大小写的普通查找内容，提供时先在原始字节中查找以快速排除
+            sandbox (RegexSandbox): 提供时在工作进程中查找
+
+        Returns:
+            list: [(行号, 行内容), ...]，行号从1开始
+
+        Raises:
+            RegexSandboxError: 在工作进程中查找超时或失败
+        """
+        encoding = self.files[relative_path][2]
+        try:
+            with open(os.path.join(self.root, relative_path), 'rb') as f:
+                if os.fstat(f.fileno()).st_size == 0:
+                    return []
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                    if literal is not None and not encoding.lower().startswith(('utf-16', 'utf-32')):
+                        try:
+                            needle = literal.encode(encoding)
+                        except (UnicodeEncodeError, LookupError):
+                            needle = None
+                        if needle and data.find(needle) == -1:
+                            return []
+                    text = data[:].decode(encoding, errors='replace')
+        except (OSError, LookupError):
+            return []
+
+        if sandbox is not None:
+            starts = sandbox.spans(pattern, text)[0]
+        else:
+            starts = [match.start() for match in pattern.finditer(text)]
+        lines = []
+        last_line_end = -1
+        line_number = 1
+        line_start = 0
+        for start in starts:
+            if start < last_line_end:
+                continue
+            line_number += text.count('\n', line_start, start)
+            line_start = text.rfind('\n', 0, start) + 1
+            line_end = text.find('\n', start)
+            if line_end == -1:
+                line_end = len(text)
+            lines.append((line_number, text[line_start:line_end].strip()))
+            last_line_end = line_end
+        return lines
+
+
+class WorkspaceSearchTask(QObject):
+    """
+    后台文件夹查找任务
+
+    先增量更新索引，再筛选并验证候选文件；每个有匹配的文件发出一次 file_matched。
+    """
+
+    # 索引更新进度，参数为 (已处理文件数, 需要处理的文件数)
+    progress = Signal(int, int)
+    # 一个文件中的匹配，参数为 (文件绝对路径, [(行号, 行内容), ...])
+    file_matched = Signal(str, object)
+    # 查找结束，参数为结果字典：files, candidates, indexed, cancelled, error
+    finished = Signal(object)
+
+    def __init__(self, root, find_text, use_regex, case_sensitive, parent=None, sandbox=None):
+        """
+        初始化查找任务
+
+        Args:
+            root (str): 目录
+            find_text (str): 查找内容，为空时只更新索引
+            use_regex (bool): 是否为正则表达式
+            case_sensitive (bool): 是否区分大小写
+            parent (QObject): 父对象
+            sandbox (RegexSandbox): 提供时正则表达式在工作进程中执行
+        """
+        super().__init__(parent)
+        self.root = root
+        self.find_text = find_text
+        self.use_regex = use_regex
+        self.case_sensitive = case_sensitive
+        self.sandbox = sandbox if use_regex else None
+        self.cancelled = False
+
+    def start(self):
+        """在后台线程中开始执行"""
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def cancel(self):
+        """取消任务"""
+        self.cancelled = True
+
+    def _run(self):
+        """更新索引并查找"""
+        result = {'files': 0, 'candidates': 0, 'indexed': 0, 'cancelled': False, 'error': None}
+        try:
+            index = WorkspaceIndex(self.root)
+            result['files'] = len(index.files)
+            result['indexed'] = index.update(self.progress.emit, lambda: self.cancelled)
+            result['files'] = len(index.files)
+            if self.find_text and not self.cancelled:
+                flags = 0 if self.case_sensitive else re.IGNORECASE
+                find_text = self.find_text if self.use_regex else re.escape(self.find_text)
+                pattern = re.compile(find_text, flags)
+                literal = self.find_text if not self.use_regex and self.case_sensitive else None
+                candidates = index.candidates(
+                    required_literals(self.find_text, self.use_regex, self.case_sensitive))
+                result['candidates'] = len(candidates)
+                for relative_path in candidates:
+                    if self.cancelled:
+                        break
+                    lines = index.verify(relative_path, pattern, literal, self.sandbox)
+                    if lines:
+                        self.file_matched.emit(os.path.join(index.root, relative_path), lines)
+        except Exception as e:
+            result['error'] = str(e)
+        result['cancelled'] = self.cancelled
+        self.finished.emit(result)
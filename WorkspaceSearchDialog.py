@@ -0,0 +1,231 @@
+"""
+文件夹查找对话框模块
+"""
+
+import os
+import re
+from PySide6.QtWidgets import (QDialog, QVBoxLayout, QGridLayout, QHBoxLayout, QLabel,
+                               QLineEdit, QCheckBox, QPushButton, QTreeWidget,
+                               QTreeWidgetItem, QFileDialog)
+from PySide6.QtCore import Qt, Signal
+from WorkspaceIndex import WorkspaceSearchTask
+
+
+class WorkspaceSearchDialog(QDialog):
+    """
+    文件夹查找对话框
+
+    在选定目录下的所有 .sql 文件中查找，索引在后台增量更新后用于筛选候选文件。
+    结果按文件分组，双击结果行在标签页中打开文件并定位到匹配的行。
+    """
+
+    # 激活了一条结果，参数为 (文件路径, 行号)
+    location_activated = Signal(str, int)
+
+    # 最多显示的匹配行数，超过后停止添加结果
+    MAX_RESULTS = 5000
+
+    def __init__(self, parent=None, directory='', regex_sandbox=None):
+        """
+        初始化文件夹查找对话框
+
+        Args:
+            parent (QWidget): 父组件
+            directory (str): 初始目录
+            regex_sandbox (RegexSandbox): 执行正则表达式的沙箱
+        """
+        super().__init__(parent)
+        self.regex_sandbox = regex_sandbox
+        self.search_task = None
+        self.result_count = 0
+        self.file_count = 0
+
+        self.setWindowTitle("在文件夹中查找")
+        self.setModal(False)
+        self.resize(700, 500)
+
+        layout = QVBoxLayout(self)
+        grid = QGridLayout()
+        grid.addWidget(QLabel("文件夹:"), 0, 0)
+        self.directory_edit = QLineEdit(directory)
+        grid.addWidget(self.directory_edit, 0, 1)
+        self.browse_button = QPushButton("浏览...")
+        grid.addWidget(self.browse_button, 0, 2)
+
+        grid.addWidget(QLabel("查找内容:"), 1, 0)
+        self.find_edit = QLineEdit()
+        self.find_edit.setPlaceholderText("输入要查找的内容，回车开始查找...")
+        grid.addWidget(self.find_edit, 1, 1)
+        self.search_button = QPushButton("查找")
+        grid.addWidget(self.search_button, 1, 2)
+
+        options_layout = QHBoxLayout()
+        self.regex_checkbox = QCheckBox("使用正则表达式")
+        self.case_sensitive_checkbox = QCheckBox("区分大小写")
+        options_layout.addWidget(self.regex_checkbox)
+        options_layout.addWidget(self.case_sensitive_checkbox)
+        options_layout.addStretch()
+        grid.addLayout(options_layout, 2, 1)
+        self.update_index_button = QPushButton("更新索引")
+        grid.addWidget(self.update_index_button, 2, 2)
+        layout.addLayout(grid)
+
+        self.results_tree = QTreeWidget()
+        self.results_tree.setHeaderHidden(True)
+        self.results_tree.setUniformRowHeights(True)
+        layout.addWidget(self.results_tree, 1)
+
+        footer_layout = QHBoxLayout()
+        self.status_label = QLabel("就绪")
+        self.stop_button = QPushButton("停止")
+        self.stop_button.setEnabled(False)
+        self.close_button = QPushButton("关闭")
+        footer_layout.addWidget(self.status_label)
+        footer_layout.addStretch()
+        footer_layout.addWidget(self.stop_button)
+        footer_layout.addWidget(self.close_button)
+        layout.addLayout(footer_layout)
+
+        self.browse_button.clicked.connect(self.browse_directory)
+        self.search_button.clicked.connect(self.start_search)
+        self.find_edit.returnPressed.connect(self.start_search)
+        self.update_index_button.clicked.connect(self.update_index)
+        self.stop_button.clicked.connect(self.cancel_search)
+        self.close_button.clicked.connect(self.close)
+        self.results_tree.itemActivated.connect(self.on_item_activated)
+
+    def browse_directory(self):
+        """选择要查找的文件夹"""
+        directory = QFileDialog.getExistingDirectory(self, "选择文件夹", self.directory_edit.text())
+        if directory:
+            self.directory_edit.setText(directory)
+
+    def directory(self):
+        """
+        返回输入的文件夹，不存在时提示并返回 None
+
+        Returns:
+            str: 文件夹路径
+        """
+        directory = self.directory_edit.text().strip()
+        if not directory or not os.path.isdir(directory):
+            self.status_label.setText("文件夹不存在")
+            return None
+        return directory
+
+    def start_search(self):
+        """更新索引后查找"""
+        directory = self.directory()
+        find_text = self.find_edit.text()
+        if directory is None or not find_text:
+            return
+        if self.regex_checkbox.isChecked():
+            try:
+                re.compile(find_text)
+            except re.error as e:
+                self.status_label.setText(f"正则表达式错误: {str(e)}")
+                return
+        self._start_task(directory, find_text)
+
+    def update_index(self):
+        """只更新索引，不查找"""
+        directory = self.directory()
+        if directory is not None:
+            self._start_task(directory, '')
+
+    def _start_task(self, directory, find_text):
+        """
+        取消上一个任务并开始新的后台任务
+
+        Args:
+            directory (str): 文件夹
+            find_text (str): 查找内容，为空时只更新索引
+        """
+        self.cancel_search()
+        self.results_tree.clear()
+        self.result_count = 0
+        self.file_count = 0
+        self.search_task = WorkspaceSearchTask(directory, find_text, self.regex_checkbox.isChecked(),
+                                               self.case_sensitive_checkbox.isChecked(), self,
+                                               self.regex_sandbox)
+        self.search_task.progress.connect(self.on_progress)
+        self.search_task.file_matched.connect(self.on_file_matched)
+        self.search_task.finished.connect(self.on_search_finished)
+        self.stop_button.setEnabled(True)
+        self.status_label.setText("正在扫描文件夹...")
+        self.search_task.start()
+
+    def cancel_search(self):
+        """取消正在执行的任务"""
+        if self.search_task is not None:
+            self.search_task.cancel()
+            self.search_task = None
+        self.stop_button.setEnabled(False)
+
+    def on_progress(self, done, total):
+        """显示索引更新进度"""
+        if self.sender() is self.search_task:
+            self.status_label.setText(f"正在更新索引: {done}/{total}")
+
+    def on_file_matched(self, path, lines):
+        """
+        添加一个文件的匹配行
+
+        Args:
+            path (str): 文件路径
+            lines (list): [(行号, 行内容), ...]
+        """
+        if self.sender() is not self.search_task or self.result_count >= self.MAX_RESULTS:
+            return
+        lines = lines[:self.MAX_RESULTS - self.result_count]
+        file_item = QTreeWidgetItem([f"{path} ({len(lines)})"])
+        file_item.setData(0, Qt.UserRole, (path, 1))
+        for number, text in lines:
+            item = QTreeWidgetItem([f"{number}: {text}"])
+            item.setData(0, Qt.UserRole, (path, number))
+            file_item.addChild(item)
+        self.results_tree.addTopLevelItem(file_item)
+        self.result_count += len(lines)
+        self.file_count += 1
+        self.status_label.setText(f"在 {self.file_count} 个文件中找到 {self.result_count} 行")
+        if self.result_count >= self.MAX_RESULTS:
+            self.search_task.cancel()
+
+    def on_search_finished(self, result):
+        """
+        显示查找结果的统计
+
+        Args:
+            result (dict): WorkspaceSearchTask 的结果
+        """
+        task = self.sender()
+        if task is not self.search_task:
+            return
+        self.search_task = None
+        self.stop_button.setEnabled(False)
+        if result['error']:
+            self.status_label.setText(f"查找失败: {result['error']}")
+            return
+        summary = f"共 {result['files']} 个文件，重新索引 {result['indexed']} 个"
+        if not task.find_text:
+            self.status_label.setText(("已停止，" if result['cancelled'] else "索引已更新，") + summary)
+            return
+        if self.result_count >= self.MAX_RESULTS:
+            state = f"结果过多，只显示前 {self.MAX_RESULTS} 行"
+        elif result['cancelled']:
+            state = "已停止"
+        else:
+            state = "查找完成"
+        self.status_label.setText(
+            f"{state}：在 {self.file_count} 个文件中找到 {self.result_count} 行"
+            f"（{summary}，验证候选文件 {result['candidates']} 个）")
+
+    def on_item_activated(self, item, column):
+        """在标签页中打开结果所在的文件并定位到行"""
+        path, number = item.data(0, Qt.UserRole)
+        self.location_activated.emit(path, number)
+
+    def closeEvent(self, event):
+        """关闭时取消正在执行的任务"""
+        self.cancel_search()
+        super().closeEvent(event)
@@ -0,0 +1,95 @@
+"""
+按键到绘制延迟基准测试
+
+打开多个标签页（默认50个，全部创建编辑器），在当前编辑器中模拟连续按键，
+统计每次按键从事件分发到界面绘制完成的耗时。
+
+用法:
+    QT_QPA_PLATFORM=offscreen python benchmarks/bench_keystroke_latency.py --tabs 50 --keys 300
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PySide6.QtWidgets import QApplication
+from PySide6.QtTest import QTest
+from PySide6.QtCore import Qt
+
+
+def make_sql(lines):
+    """生成指定行数的示例SQL"""
+    row = "SELECT t.id,\tt.name, 'value' FROM table_{0} t WHERE t.id = {0}; -- comment\n"
+    return ''.join(row.format(i) for i in range(lines))
+
+
+def percentile(values, fraction):
+    """返回排序后指定分位的值"""
+    ordered = sorted(values)
+    index = min(int(len(ordered) * fraction), len(ordered) - 1)
+    return ordered[index]
+
+
+def run(tabs, keys, lines):
+    """
+    执行基准测试
+
+    Returns:
+        dict: 延迟统计（毫秒）
+    """
+    app = QApplication.instance() or QApplication(sys.argv)
+    # 使用独立的应用名称，避免恢复或覆盖真实会话
+    app.setApplicationName("SQLFormatterAppBenchmark")
+
+    from SQLFormatterApp import SQLFormatterApp
+
+    window = SQLFormatterApp()
+    window.show()
+    content = make_sql(lines)
+    for _ in range(tabs):
+        window.new_tab(None, content)
+    # 确保所有标签页都已创建编辑器，模拟最坏情况
+    for tab in window.get_tab_editors():
+        tab.ensure_editor()
+    app.processEvents()
+
+    editor = window.get_current_editor()
+    editor.setFocus()
+    app.processEvents()
+
+    latencies = []
+    for i in range(keys):
+        key = Qt.Key_Return if i % 40 == 39 else Qt.Key_A
+        start = time.perf_counter()
+        QTest.keyClick(editor, key)
+        app.processEvents()
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    window.close()
+    return {
+        'tabs': tabs,
+        'keys': keys,
+        'lines_per_tab': lines,
+        'p50_ms': round(statistics.median(latencies), 3),
+        'p95_ms': round(percentile(latencies, 0.95), 3),
+        'max_ms': round(max(latencies), 3),
+        'mean_ms': round(statistics.mean(latencies), 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="按键到绘制延迟基准测试")
+    parser.add_argument('--tabs', type=int, default=50, help="打开的标签页数量")
+    parser.add_argument('--keys', type=int, default=300, help="模拟按键次数")
+    parser.add_argument('--lines', type=int, default=2000, help="每个标签页的行数")
+    args = parser.parse_args()
+    print(json.dumps(run(args.tabs, args.keys, args.lines), ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
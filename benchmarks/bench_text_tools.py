@@ -0,0 +1,418 @@
+"""
+文本工具基准测试
+
+用固定随机种子生成 1KB 到 50MB 的 SQL、Java 和 tab 分隔数据，统计各个文本工具的耗时
+（多次运行取最小值和中位数）以及 Python 内存分配峰值（tracemalloc，单独运行一次，
+不包括 Qt 在 C++ 中分配的内存）：
+
+- format_sql、convert_to_java_format、convert_back_to_sql、fill_sql_parameters、
+  align_comments、fill_code：SQLTools 中对应菜单命令的函数
+- apply_tool_result：把工具结果按行差异写回 QTextDocument（所有工具共用的最后一步，
+  文档和工具结果在计时之外准备）
+- open_file_utf8、open_file_gbk：读取并识别文件编码（GBK 文件会经过 chardet）
+- find_literal、find_regex、replace_literal、replace_regex：建立查找结果索引和计算替换后的文本
+- replace_all_literal_document、replace_all_regex_document：与查找替换对话框的全部替换相同，
+  ReplaceTask 在后台线程中计算替换，界面线程用 OrderedEdits 分片写入 QTextDocument
+
+sqlparse 格式化很慢（约 35KB/s），默认只测到 64KB，可用 --no-limits 取消各项的大小上限。
+
+结果以 JSON 输出。--save-baseline 保存为基准，发布前用 --baseline 与基准比较，
+耗时或内存超过基准的 (1 + --tolerance) 倍时列为退化，退出码为 1。
+基准只在同一台机器、同一环境下比较才有意义。
+
+用法:
+    QT_QPA_PLATFORM=offscreen python benchmarks/bench_text_tools.py --save-baseline benchmarks/baseline.json
+    QT_QPA_PLATFORM=offscreen python benchmarks/bench_text_tools.py --baseline benchmarks/baseline.json
+    QT_QPA_PLATFORM=offscreen python benchmarks/bench_text_tools.py --sizes 1K,1M --cases format_sql,find_regex
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PySide6.QtCore import QCoreApplication, QEventLoop
+from PySide6.QtWidgets import QApplication
+
+
+DEFAULT_SIZES = "1K,64K,1M,10M,50M"
+SEED = 20250101
+
+_TABLES = ("orders", "customers", "order_items", "products", "inventory", "shipments")
+_COLUMNS = ("id", "name", "status", "amount", "created_at", "updated_by", "region", "qty")
+_COMMENTS = ("查询有效订单", "按地区汇总", "temporary fix", "待确认", "注意：金额为含税价")
+
+
+def parse_size(text):
+    """把 1K、64K、10M 这样的大小解析为字节数"""
+    units = {'K': 1024, 'M': 1024 * 1024}
+    text = text.strip().upper()
+    if text[-1:] in units:
+        return int(float(text[:-1]) * units[text[-1]])
+    return int(text)
+
+
+def format_size(size):
+    """把字节数格式化为 1K、64K、10M 这样的大小，作为结果的键"""
+    for unit, factor in (('M', 1024 * 1024), ('K', 1024)):
+        if size >= factor and size % factor == 0:
+            return f"{size // factor}{unit}"
+    return str(size)
+
+
+def _generate(size, make_line):
+    """
+    用固定种子逐行生成文本，直到达到指定字符数（保留完整的最后一行）
+
+    Args:
+        size (int): 目标字符数
+        make_line (callable): 根据随机数生成器和行号生成一行（不含换行符）
+
+    Returns:
+        str: 不少于 size 个字符的文本
+    """
+    rng = random.Random(SEED)
+    lines = []
+    total = 0
+    number = 0
+    while total < size:
+        line = make_line(rng, number) + "\n"
+        lines.append(line)
+        total += len(line)
+        number += 1
+    return "".join(lines)
+
+
+def _sql_line(rng, number):
+    """一行带 ? 占位符、字符串和注释的 SQL"""
+    table = rng.choice(_TABLES)
+    columns = ", ".join(f"t.{column}" for column in rng.sample(_COLUMNS, rng.randint(2, 5)))
+    line = (f"SELECT {columns} FROM {table} t WHERE t.{rng.choice(_COLUMNS)} = ? "
+            f"AND t.status = '{rng.choice(('A', 'B', '有效'))}'")
+    if rng.random() < 0.3:
+        line += f" ORDER BY t.{rng.choice(_COLUMNS)}"
+    line += ";"
+    if rng.random() < 0.4:
+        line += f" -- {rng.choice(_COMMENTS)}"
+    return line
+
+
+def _java_line(rng, number):
+    """一行 sql_to_java 格式的 Java 代码，部分带缩进和 // 注释"""
+    line = f'\tsb.append(" {_sql_line(rng, number).replace(chr(34), "")} ");'
+    if rng.random() < 0.5:
+        line += " " * rng.randint(0, 12) + f"// {rng.choice(_COMMENTS)}"
+    return line
+
+
+def _data_line(rng, number):
+    """一行 tab 分隔的数据，供代码填充使用"""
+    return "\t".join((str(number), rng.choice(_TABLES), rng.choice(_COLUMNS), str(rng.randint(0, 99999))))
+
+
+def make_corpora(size):
+    """
+    生成指定大小的 SQL、Java 和数据文本
+
+    Returns:
+        dict: {'sql': str, 'java': str, 'data': str}
+    """
+    return {
+        'sql': _generate(size, _sql_line),
+        'java': _generate(size, _java_line),
+        'data': _generate(size, _data_line),
+    }
+
+
+def _prepare_file(directory, name, text, encoding):
+    """把文本按指定编码写入临时文件，返回路径"""
+    path = os.path.join(directory, name)
+    with open(path, 'wb') as f:
+        f.write(text.encode(encoding, errors='replace'))
+    return path
+
+
+def _stream_replace_all(document, pattern, text, replacement, use_regex):
+    """
+    按 FindReplaceDialog.replace_all 的方式全部替换：ReplaceTask 在后台线程中计算替换，
+    界面线程收到一批就用 OrderedEdits 按 REPLACE_SLICE_MS 分片写入文档，直到全部应用
+
+    Args:
+        document (QTextDocument): 内容为 text 的文档
+        pattern (re.Pattern): 查找的表达式
+        text (str): 文档文本的快照
+        replacement (str): 替换内容
+        use_regex (bool): 是否为正则表达式模式
+
+    Raises:
+        RuntimeError: ReplaceTask 发出了 failed
+    """
+    from FindReplaceDialog import FindReplaceDialog
+    from SearchIndex import ReplaceTask
+    from TextDiff import OrderedEdits
+
+    slice_seconds = FindReplaceDialog.REPLACE_SLICE_MS / 1000
+    edits = OrderedEdits(document)
+    finished = []
+    task = ReplaceTask(pattern, text, replacement, use_regex)
+    # 与对话框相同，批次和完成信号从后台线程排队送到界面线程，完成信号在最后一批之后
+    task.edits_found.connect(edits.add)
+    task.finished.connect(finished.append)
+    task.failed.connect(finished.append)
+    task.start()
+    while True:
+        more = edits.apply(time.monotonic() + slice_seconds)
+        if finished and not more:
+            break
+        QCoreApplication.processEvents(QEventLoop.AllEvents if more else QEventLoop.WaitForMoreEvents)
+    # finished 送回替换总数，failed 送回错误信息
+    if isinstance(finished[0], str):
+        raise RuntimeError(f"全部替换失败: {finished[0]}")
+
+
+def build_cases(corpora, directory):
+    """
+    构造基准测试用例
+
+    Args:
+        corpora (dict): make_corpora 生成的文本
+        directory (str): 存放编码测试文件的临时目录
+
+    Returns:
+        list: [(名称, 输入字符数, 大小上限, 测试函数, 准备函数), ...]，大小上限为 None 表示不限制；
+            准备函数不为 None 时每次运行前在计时之外调用，返回值作为测试函数的参数
+    """
+    from PySide6.QtGui import QTextDocument
+    from SQLTools import (format_sql_text, sql_to_java, java_to_sql, fill_parameters,
+                          align_comment_lines, fill_template)
+    from FileCodec import read_text_file
+    from SearchIndex import MatchIndex, compile_search_pattern, replace_matches
+    from TextDiff import apply_edits, compute_line_edits
+
+    sql, java, data = corpora['sql'], corpora['java'], corpora['data']
+    params = ['1'] * sql.count('?')
+    utf8_path = _prepare_file(directory, 'utf8.sql', sql, 'utf-8')
+    gbk_path = _prepare_file(directory, 'gbk.sql', sql, 'gbk')
+    literal = compile_search_pattern("status", False, False)
+    regex = compile_search_pattern(r"t\.(\w+) = \?", True, True)
+
+    def new_document():
+        # 写回会修改文档，每次运行使用新的文档
+        document = QTextDocument()
+        document.setPlainText(sql)
+        return document
+
+    # 转换为 Java 格式会改动每一行，是写回的最坏情况；工具本身的耗时由 convert_to_java_format 统计
+    java_result = None
+
+    def apply_tool_result(document):
+        apply_edits(document, compute_line_edits(sql, java_result))
+
+    def prepare_apply_tool_result():
+        nonlocal java_result
+        if java_result is None:
+            java_result = sql_to_java(sql)
+        return new_document()
+
+    def stream_replace_all_case(pattern, replacement, use_regex):
+        """返回全部替换用例的 (测试函数, 准备函数)，第一次准备时在计时之外检查一次结果与 re.sub 相同"""
+        checked = False
+
+        def replace_all(document):
+            _stream_replace_all(document, pattern, sql, replacement, use_regex)
+
+        def prepare():
+            nonlocal checked
+            if not checked:
+                document = new_document()
+                replace_all(document)
+                expected = pattern.sub(replacement if use_regex else lambda match: replacement, sql)
+                if document.toPlainText() != expected:
+                    raise RuntimeError(f"全部替换的结果与 re.sub 不同: {pattern.pattern!r}")
+                checked = True
+            return new_document()
+
+        return replace_all, prepare
+
+    return [
+        ('format_sql', len(sql), 64 * 1024, lambda: format_sql_text(sql), None),
+        ('convert_to_java_format', len(sql), None, lambda: sql_to_java(sql), None),
+        ('convert_back_to_sql', len(java), None, lambda: java_to_sql(java), None),
+        ('fill_sql_parameters', len(sql), None, lambda: fill_parameters(sql, params), None),
+        ('align_comments', len(java), None, lambda: align_comment_lines(java), None),
+        ('fill_code', len(data), None,
+         lambda: fill_template(data, "INSERT INTO t VALUES ('{0}', '{1}', '{3}');"), None),
+        ('apply_tool_result', len(sql), 10 * 1024 * 1024, apply_tool_result, prepare_apply_tool_result),
+        ('open_file_utf8', len(sql), None, lambda: read_text_file(utf8_path), None),
+        ('open_file_gbk', len(sql), None, lambda: read_text_file(gbk_path), None),
+        ('find_literal', len(sql), None, lambda: MatchIndex.from_pattern(literal, sql), None),
+        ('find_regex', len(sql), None, lambda: MatchIndex.from_pattern(regex, sql), None),
+        ('replace_literal', len(sql), None, lambda: replace_matches(literal, sql, "state", False), None),
+        ('replace_regex', len(sql), None, lambda: replace_matches(regex, sql, r"t.\1 = :\1", True), None),
+        ('replace_all_literal_document', len(sql), 10 * 1024 * 1024,
+         *stream_replace_all_case(literal, "state", False)),
+        ('replace_all_regex_document', len(sql), 10 * 1024 * 1024,
+         *stream_replace_all_case(regex, r"t.\1 = :\1", True)),
+    ]
+
+
+def measure(func, repeat, setup=None):
+    """
+    统计耗时和 Python 内存分配峰值
+
+    Args:
+        func (callable): 测试函数
+        repeat (int): 计时的运行次数
+        setup (callable): 每次运行前在计时和内存统计之外调用，返回值作为 func 的参数；
+            为 None 时 func 不带参数
+
+    Returns:
+        dict: time_ms_min、time_ms_median、peak_bytes
+    """
+    def prepare():
+        return () if setup is None else (setup(),)
+
+    timings = []
+    for _ in range(repeat):
+        args = prepare()
+        start = time.perf_counter()
+        func(*args)
+        timings.append((time.perf_counter() - start) * 1000)
+    # tracemalloc 会拖慢运行，单独运行一次统计峰值
+    args = prepare()
+    tracemalloc.start()
+    try:
+        func(*args)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {
+        'time_ms_min': round(min(timings), 3),
+        'time_ms_median': round(statistics.median(timings), 3),
+        'peak_bytes': peak,
+    }
+
+
+def run(sizes, case_names, repeat, no_limits):
+    """
+    执行基准测试
+
+    Args:
+        sizes (list): 语料大小（字符数）
+        case_names (set): 要运行的用例名称，为 None 时运行全部
+        repeat (int): 每个用例的计时次数
+        no_limits (bool): 是否忽略各用例的大小上限
+
+    Returns:
+        dict: 环境信息和结果列表
+    """
+    app = QApplication.instance() or QApplication(sys.argv)
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for size in sizes:
+            corpora = make_corpora(size)
+            for name, input_chars, limit, func, setup in build_cases(corpora, directory):
+                if case_names is not None and name not in case_names:
+                    continue
+                entry = {'case': name, 'size': format_size(size), 'input_chars': input_chars}
+                if limit is not None and size > limit and not no_limits:
+                    entry['skipped'] = f"超过默认上限 {format_size(limit)}"
+                else:
+                    entry.update(measure(func, repeat, setup))
+                results.append(entry)
+                print(f"{name:<30} {entry['size']:>5} "
+                      + (entry.get('skipped') or f"{entry['time_ms_min']:10.2f}ms {entry['peak_bytes'] / 1048576:9.2f}MB"),
+                      file=sys.stderr)
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'repeat': repeat,
+        'results': results,
+    }
+
+
+def compare(report, baseline, tolerance, min_delta_ms):
+    """
+    与基准比较，列出耗时或内存超过基准 (1 + tolerance) 倍的用例
+
+    耗时的增量小于 min_delta_ms 时视为噪声，不算退化。
+
+    Args:
+        report (dict): 本次结果
+        baseline (dict): 基准结果
+        tolerance (float): 允许的相对增长
+        min_delta_ms (float): 计为退化的最小耗时增量（毫秒）
+
+    Returns:
+        list: [{'case', 'size', 'metric', 'baseline', 'current', 'ratio'}, ...]
+    """
+    previous = {(entry['case'], entry['size']): entry for entry in baseline.get('results', [])}
+    regressions = []
+    for entry in report['results']:
+        old = previous.get((entry['case'], entry['size']))
+        if old is None or 'skipped' in entry or 'skipped' in old:
+            continue
+        for metric in ('time_ms_min', 'peak_bytes'):
+            before, after = old[metric], entry[metric]
+            if after <= before * (1 + tolerance):
+                continue
+            if metric == 'time_ms_min' and after - before < min_delta_ms:
+                continue
+            regressions.append({
+                'case': entry['case'], 'size': entry['size'], 'metric': metric,
+                'baseline': before, 'current': after,
+                'ratio': round(after / before, 2) if before else None,
+            })
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="文本工具基准测试")
+    parser.add_argument('--sizes', default=DEFAULT_SIZES, help="逗号分隔的语料大小，例如 1K,1M,50M")
+    parser.add_argument('--cases', help="逗号分隔的用例名称，默认运行全部")
+    parser.add_argument('--repeat', type=int, default=3, help="每个用例的计时次数")
+    parser.add_argument('--no-limits', action='store_true', help="忽略各用例的大小上限")
+    parser.add_argument('--output', help="把结果写入文件（默认输出到标准输出）")
+    parser.add_argument('--save-baseline', help="把结果保存为基准文件")
+    parser.add_argument('--baseline', help="与基准文件比较，有退化时退出码为1")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="允许的相对增长，默认0.25")
+    parser.add_argument('--min-delta-ms', type=float, default=2.0, help="计为退化的最小耗时增量（毫秒）")
+    args = parser.parse_args()
+
+    sizes = [parse_size(size) for size in args.sizes.split(',') if size.strip()]
+    case_names = {name.strip() for name in args.cases.split(',')} if args.cases else None
+    report = run(sizes, case_names, args.repeat, args.no_limits)
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.tolerance, args.min_delta_ms)
+        report['regressions'] = regressions
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text)
+    else:
+        print(text)
+    if args.save_baseline:
+        with open(args.save_baseline, 'w', encoding='utf-8') as f:
+            f.write(text)
+
+    for regression in regressions:
+        print(f"退化: {regression['case']} {regression['size']} {regression['metric']} "
+              f"{regression['baseline']} -> {regression['current']}", file=sys.stderr)
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+"""
+空白字符绘制帧耗时基准测试
+
+在一个以tab缩进为主的大文件（默认10000行）中按滚轮步长滚动，分别统计不显示空白字符、
+原生绘制（QTextOption.ShowTabsAndSpaces）和 Python 叠加绘制三种方式下每帧的绘制耗时。
+
+用法:
+    QT_QPA_PLATFORM=offscreen python benchmarks/bench_whitespace_render.py --lines 10000 --frames 200 --step 3
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PySide6.QtWidgets import QApplication
+
+
+def make_indented_sql(lines):
+    """生成以tab和空格缩进、空白字符密集的示例SQL"""
+    rows = (
+        "SELECT\tt.id,\tt.name,    t.value\n",
+        "\t\tFROM  table_{0}  t\n",
+        "\t\t\tWHERE t.id = {0}    AND  t.flag = 'Y'  -- comment\n",
+        "\t    ORDER BY\tt.id\n",
+    )
+    return ''.join(rows[i % len(rows)].format(i) for i in range(lines))
+
+
+def percentile(values, fraction):
+    """返回排序后指定分位的值"""
+    ordered = sorted(values)
+    index = min(int(len(ordered) * fraction), len(ordered) - 1)
+    return ordered[index]
+
+
+def measure(app, editor, frames, step):
+    """
+    每帧滚动 step 行并同步重绘，记录每帧耗时
+
+    Returns:
+        dict: 帧耗时统计（毫秒）
+    """
+    scroll_bar = editor.verticalScrollBar()
+    scroll_bar.setValue(0)
+    app.processEvents()
+
+    timings = []
+    for i in range(frames):
+        scroll_bar.setValue((i * step) % max(1, scroll_bar.maximum()))
+        start = time.perf_counter()
+        editor.viewport().repaint()
+        timings.append((time.perf_counter() - start) * 1000)
+    return {
+        'p50_ms': round(statistics.median(timings), 3),
+        'p95_ms': round(percentile(timings, 0.95), 3),
+        'max_ms': round(max(timings), 3),
+        'mean_ms': round(statistics.mean(timings), 3),
+    }
+
+
+def run(lines, frames, step):
+    """
+    执行基准测试
+
+    Returns:
+        dict: 各显示方式的帧耗时统计
+    """
+    app = QApplication.instance() or QApplication(sys.argv)
+
+    from CodeEditor import CodeEditor
+    from SQLHighlighter import SQLHighlighter
+
+    editor = CodeEditor()
+    editor.resize(1000, 700)
+    editor.setPlainText(make_indented_sql(lines))
+    highlighter = SQLHighlighter(editor.document())
+    editor.show()
+    app.processEvents()
+
+    results = {'lines': lines, 'frames': frames, 'step': step}
+    modes = (
+        ('hidden', False, CodeEditor.WHITESPACE_MODE_NATIVE),
+        ('native', True, CodeEditor.WHITESPACE_MODE_NATIVE),
+        ('overlay', True, CodeEditor.WHITESPACE_MODE_OVERLAY),
+    )
+    for name, show, mode in modes:
+        editor.set_whitespace_mode(mode)
+        editor.set_show_whitespace(show)
+        # 先完整滚动一遍，排除首次排版和高亮的开销
+        measure(app, editor, frames, step)
+        results[name] = measure(app, editor, frames, step)
+
+    editor.close()
+    del highlighter
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="空白字符绘制帧耗时基准测试")
+    parser.add_argument('--lines', type=int, default=10000, help="文件行数")
+    parser.add_argument('--frames', type=int, default=200, help="每种方式绘制的帧数")
+    parser.add_argument('--step', type=int, default=3, help="每帧滚动的行数，逐页滚动时可设为视口行数")
+    args = parser.parse_args()
+    print(json.dumps(run(args.lines, args.frames, args.step), ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,12 +1,41 @@
-from SQLFormatterApp import SQLFormatterApp
-from PySide6.QtWidgets import QApplication
+import StartupTiming
+import os
 import sys
 
 def main():
+    # 正则表达式沙箱的工作进程以 spawn 方式启动，打包后的程序需要先交给 freeze_support 处理；
+    # 直接运行脚本时不需要，也就不必在启动时导入 multiprocessing
+    if getattr(sys, 'frozen', False):
+        import multiprocessing
+        multiprocessing.freeze_support()
+    # 已有实例在运行时把文件交给它打开，本进程不导入 Qt 直接退出
+    from SingleInstance import send_to_running_instance
+    file_paths = [os.path.abspath(arg) for arg in sys.argv[1:] if os.path.isfile(arg)]
+    if send_to_running_instance(file_paths):
+        return
+    StartupTiming.mark("检查已运行的实例")
+    # 界面模块在这里才导入，工作进程重新导入本模块时不必加载 Qt
+    from PySide6.QtWidgets import QApplication
+    StartupTiming.mark("导入 Qt")
+    from SQLFormatterApp import SQLFormatterApp
+    StartupTiming.mark("导入主窗口模块")
     app = QApplication(sys.argv)
+    app.setApplicationName("SQLFormatterApp")  # 决定会话等数据文件的存放目录
+    StartupTiming.mark("创建 QApplication")
+    from InstanceServer import InstanceServer
+    instance_server = InstanceServer(app)
+    if not instance_server.listen(file_paths) and instance_server.forwarded:
+        # 另一个同时启动的进程抢先开始了监听，文件已经交给它
+        return
+    StartupTiming.mark("监听其他实例的请求")
     window = SQLFormatterApp()
+    instance_server.files_received.connect(window.open_forwarded_files)
+    if file_paths:
+        window.open_files(file_paths)
+    StartupTiming.mark("创建主窗口")
     window.show()
+    StartupTiming.mark("显示主窗口")
     sys.exit(app.exec())
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()